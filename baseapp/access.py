@@ -0,0 +1,133 @@
+# access.py
+# Xác thực + phân quyền dùng chung cho mọi URL của baseapp:
+# - CachedModelBackend: User kèm UserProfile (role) nằm trong cache -> request đã đăng nhập không tốn truy vấn
+#   User/UserProfile nào (trước đây: 1 truy vấn User + 1 truy vấn UserProfile mỗi request).
+#   Lưu User/UserProfile (signals.py) hoặc ghi hàng loạt (forget_users) thì xoá cache của tài khoản đó.
+#   Bản cache có cả mật khẩu đã băm (kiểm tra phiên đăng nhập sau khi đổi mật khẩu) -> cache phải dùng chung giữa
+#   các worker, nếu không worker khác vẫn nhận phiên cũ/tài khoản đã khoá đến khi hết hạn. LocMemCache chỉ được
+#   chấp nhận khi AUTH_USER_CACHE_LOCAL = True (chạy 1 process: runserver, test), ngược lại báo lỗi cấu hình.
+#   ModelBackend đứng sau trong AUTHENTICATION_BACKENDS chỉ để đọc phiên đăng nhập cũ (ghi backend ModelBackend);
+#   sai mật khẩu thì CachedModelBackend dừng luôn, không để ModelBackend băm mật khẩu lần 2.
+# - Quyền truy cập khai báo ngay trong baseapp/urls.py: public / login_only / admin_only / admin_api;
+#   view không phải tự kiểm tra role. tests.py kiểm tra mọi URL đều đã khai báo quyền.
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache, caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from django.http import JsonResponse
+from django.shortcuts import redirect
+
+ADMIN = 'admin'
+STUDENT = 'student'
+HOME_URLS = {ADMIN: 'admin_home', STUDENT: 'student_home'}
+
+
+def _user_key(user_id):
+    return f"auth_user:{user_id}"
+
+
+def user_cache_timeout():
+    return getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 60 * 15)
+
+
+def forget_user(user_id):
+    cache.delete(_user_key(user_id))
+
+
+def forget_users(user_ids):
+    """Xoá cache sau khi ghi hàng loạt (bulk_update không phát signal)"""
+    cache.delete_many([_user_key(user_id) for user_id in user_ids])
+
+
+class CachedModelBackend(ModelBackend):
+    """ModelBackend đọc User (kèm userprofile) từ cache; hết cache thì 1 truy vấn JOIN"""
+
+    def __init__(self):
+        super().__init__()
+        if isinstance(caches['default'], LocMemCache) and not getattr(settings, 'AUTH_USER_CACHE_LOCAL', False):
+            raise ImproperlyConfigured(
+                "CachedModelBackend cần cache 'default' dùng chung giữa các worker (vd. Redis); LocMemCache chỉ "
+                "dùng khi chạy 1 process (đặt AUTH_USER_CACHE_LOCAL = True)")
+
+    def authenticate(self, request, username=None, password=None, **kwargs):
+        # Như ModelBackend.authenticate nhưng lấy luôn UserProfile (trang đăng nhập cần role để chuyển hướng)
+        UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return None
+        try:
+            user = UserModel._default_manager.select_related('userprofile').get(
+                **{UserModel.USERNAME_FIELD: username})
+        except UserModel.DoesNotExist:
+            UserModel().set_password(password)   # Chạy hasher như khi có tài khoản (chống dò tài khoản theo thời gian)
+            raise PermissionDenied
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        raise PermissionDenied   # authenticate() dừng ở đây, các backend sau không kiểm tra lại
+
+    def get_user(self, user_id):
+        key = _user_key(user_id)
+        user = cache.get(key)
+        if user is None:
+            UserModel = get_user_model()
+            user = UserModel._default_manager.select_related('userprofile').filter(pk=user_id).first()
+            if user is None:
+                return None
+            cache.set(key, user, user_cache_timeout())
+        return user if self.user_can_authenticate(user) else None
+
+
+def user_role(user):
+    """'admin' / 'student' / None (chưa đăng nhập hoặc chưa có UserProfile) - không truy vấn với user từ cache"""
+    if not user.is_authenticated:
+        return None
+    try:
+        return user.userprofile.role
+    except user._meta.model.userprofile.RelatedObjectDoesNotExist:
+        return None
+
+
+def home_url(user):
+    return HOME_URLS.get(user_role(user), 'student_home')
+
+
+# ===== Quyền truy cập từng URL =====
+def _mark(view_func, roles):
+    view_func.access = roles
+    return view_func
+
+
+def public(view_func):
+    """Không cần đăng nhập (trang đăng nhập, /metrics tự kiểm tra token)"""
+    return _mark(view_func, None)
+
+
+def role_required(*roles, api=False):
+    """
+    Chưa đăng nhập -> trang đăng nhập (kèm ?next=); đã đăng nhập nhưng sai role -> trang chủ của role đó.
+    api=True (view AJAX trả JSON): cả 2 trường hợp trả 403 JSON. Không truyền role: chỉ cần đăng nhập
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            allowed = request.user.is_authenticated and (not roles or user_role(request.user) in roles)
+            if allowed:
+                return view_func(request, *args, **kwargs)
+            if api:
+                return JsonResponse({'error': 'Forbidden'}, status=403)
+            if not request.user.is_authenticated:
+                return redirect_to_login(request.get_full_path())
+            return redirect(home_url(request.user))
+        return _mark(wrapper, roles)
+    return decorator
+
+
+login_only = role_required()
+admin_only = role_required(ADMIN)
+admin_api = role_required(ADMIN, api=True)
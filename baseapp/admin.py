@@ -1,4 +1,5 @@
 from django.contrib import admin
+from . import search
 from .models import Subject, Question, Choice
 
 class ChoiceInline(admin.TabularInline):
@@ -8,9 +9,13 @@ class ChoiceInline(admin.TabularInline):
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     list_display = ("id", "subject", "short_text")
-    search_fields = ("text", "subject__code", "subject__name")
+    search_fields = ("text",)   # Tìm qua index toàn văn (baseapp/search.py), không quét icontains
+    list_filter = ("subject",)
     inlines = [ChoiceInline]
 
+    def get_search_results(self, request, queryset, search_term):
+        return search.filter_questions(queryset, search_term), False
+
     def short_text(self, obj): return obj.text[:80]
 
 admin.site.register(Subject)
@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class BaseappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'baseapp'
+
+    def ready(self):
+        from . import signals  # noqa: F401 - đăng ký signal cập nhật bộ đếm
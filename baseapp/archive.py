@@ -0,0 +1,219 @@
+# archive.py
+# - export_exam_jsonl: sao lưu toàn bộ dữ liệu đề ra file trước khi xoá
+# - archive_exam: lưu trữ lạnh bài làm của đề đã đóng vào ExamAnswerArchive (mảng byte nén)
+import gzip
+import json
+import os
+import struct
+import zlib
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from django.contrib.auth.models import User
+
+from . import sharding
+from .models import (Exam, ExamItem, ExamChoice, StudentExamSession, StudentAnswer,
+                     StudentAnswerLog, ExamAnswerArchive)
+
+ARCHIVE_MAGIC = b'EXA1'
+_HEADER = struct.Struct('<4sII')   # magic, số câu, số phiên thi
+ARCHIVE_CACHE_TIMEOUT = 60 * 60
+
+
+class ArchiveError(Exception):
+    pass
+
+
+def archive_dir():
+    path = getattr(settings, 'EXAM_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'archive'))
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _dt(value):
+    return value.isoformat() if value else None
+
+
+def _chunks(iterable, size):
+    chunk = []
+    for row in iterable:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def export_exam_jsonl(exam_id, chunk_size=2000):
+    """
+    Sao lưu toàn bộ dữ liệu của đề thi ra file .jsonl.gz trước khi xoá (mỗi dòng 1 bản ghi).
+    Đọc theo lô bằng iterator() nên bộ nhớ không phụ thuộc số bài làm.
+    """
+    exam = Exam.objects.select_related('subject').get(id=exam_id)
+    stamp = timezone.now().strftime('%Y%m%d%H%M%S')
+    path = os.path.join(archive_dir(), f"exam_{exam.id}_{stamp}.jsonl.gz")
+
+    with gzip.open(path, 'wt', encoding='utf-8') as out:
+        def write(kind, **data):
+            out.write(json.dumps({'type': kind, **data}, ensure_ascii=False) + '\n')
+
+        write('exam', id=exam.id, code=exam.code, subject=exam.subject.code,
+              duration_minutes=exam.duration_minutes, question_count=exam.question_count,
+              created_at=_dt(exam.created_at), start_time=_dt(exam.start_time), end_time=_dt(exam.end_time))
+        for row in ExamItem.objects.filter(exam_id=exam_id).order_by('order').values(
+                'id', 'question_id', 'order', 'mix_choices').iterator(chunk_size=chunk_size):
+            write('item', **row)
+        for row in ExamChoice.objects.filter(item__exam_id=exam_id).order_by('id').values(
+                'id', 'item_id', 'label', 'text', 'is_correct').iterator(chunk_size=chunk_size):
+            write('choice', **row)
+        rows = sharding.sessions(exam_id).filter(exam_id=exam_id).order_by('id').values(
+            'id', 'student_id', 'start_time', 'end_time', 'is_submitted', 'score', 'total_marks')
+        for chunk in _chunks(rows.iterator(chunk_size=chunk_size), chunk_size):
+            # Tài khoản ở primary, phiên thi có thể ở shard -> tra tên đăng nhập theo lô
+            usernames = dict(User.objects.filter(id__in={row['student_id'] for row in chunk})
+                             .values_list('id', 'username'))
+            for row in chunk:
+                row['student__username'] = usernames.get(row['student_id'])
+                row['start_time'], row['end_time'] = _dt(row['start_time']), _dt(row['end_time'])
+                write('session', **row)
+        for row in sharding.answers(exam_id).filter(session__exam_id=exam_id).order_by('id').values(
+                'session_id', 'exam_item_id', 'selected_choice_id', 'answered_at').iterator(chunk_size=chunk_size):
+            row['answered_at'] = _dt(row['answered_at'])
+            write('answer', **row)
+        from .grading import get_exam_paper, decode_vector
+        vectors = (sharding.sessions(exam_id).filter(exam_id=exam_id, answer_vector__isnull=False)
+                   .order_by('id').values_list('id', 'answer_vector').iterator(chunk_size=chunk_size))
+        if exam.archived_at:
+            vectors = iter_vectors(exam_id)
+        for session_id, vector in vectors:
+            for item_id, choice_id in decode_vector(get_exam_paper(exam_id), bytes(vector)).items():
+                write('answer', session_id=session_id, exam_item_id=item_id,
+                      selected_choice_id=choice_id, answered_at=None)
+    return path
+
+
+# ===== LƯU TRỮ LẠNH =====
+def pack_vectors(item_count, vectors):
+    """
+    {session_id: bytes} -> payload nén zlib:
+      header (magic, item_count, n) | n session_id uint64 tăng dần | n mảng item_count byte
+    """
+    ids = sorted(vectors)
+    body = bytearray(_HEADER.pack(ARCHIVE_MAGIC, item_count, len(ids)))
+    body += struct.pack(f'<{len(ids)}Q', *ids)
+    for session_id in ids:
+        body += vectors[session_id][:item_count].ljust(item_count, b'\0')
+    return zlib.compress(bytes(body), 6)
+
+
+def unpack_vectors(payload):
+    """payload -> (item_count, tuple session_id, dữ liệu thô đã giải nén)"""
+    raw = zlib.decompress(bytes(payload))
+    magic, item_count, n = _HEADER.unpack_from(raw, 0)
+    if magic != ARCHIVE_MAGIC:
+        raise ValueError("Dữ liệu lưu trữ không hợp lệ")
+    ids = struct.unpack_from(f'<{n}Q', raw, _HEADER.size)
+    return item_count, ids, raw
+
+
+def _vector_at(item_count, ids, raw, index):
+    offset = _HEADER.size + 8 * len(ids) + index * item_count
+    return raw[offset:offset + item_count]
+
+
+def _load_archive(exam_id):
+    key = f"exam_archive:{exam_id}"
+    unpacked = cache.get(key)
+    if unpacked is None:
+        payload = ExamAnswerArchive.objects.filter(exam_id=exam_id).values_list('payload', flat=True).first()
+        if payload is None:
+            return None
+        unpacked = unpack_vectors(payload)
+        cache.set(key, unpacked, ARCHIVE_CACHE_TIMEOUT)
+    return unpacked
+
+
+def read_vector(exam_id, session_id):
+    """Mảng đáp án của 1 phiên thi trong kho lưu trữ (tìm nhị phân theo session_id), None nếu không có"""
+    unpacked = _load_archive(exam_id)
+    if unpacked is None:
+        return None
+    item_count, ids, raw = unpacked
+    index = bisect_left(ids, session_id)
+    if index == len(ids) or ids[index] != session_id:
+        return None
+    return _vector_at(item_count, ids, raw, index)
+
+
+def iter_vectors(exam_id):
+    """Duyệt (session_id, mảng đáp án) của đề đã lưu trữ"""
+    unpacked = _load_archive(exam_id)
+    if unpacked is None:
+        return
+    item_count, ids, raw = unpacked
+    for index, session_id in enumerate(ids):
+        yield session_id, _vector_at(item_count, ids, raw, index)
+
+
+def archive_exam(exam, chunk_size=2000):
+    """
+    Chuyển bài làm của một đề đã đóng sang kho lưu trữ:
+      1. chốt điểm các phiên chưa nộp đã hết giờ (expires_at đã qua); đề chưa có/chưa tới giờ kết thúc
+         hoặc còn phiên chưa hết giờ -> ArchiveError, không thay đổi gì
+      2. đóng gói câu trả lời thành mảng byte/phiên, ghi ExamAnswerArchive, đánh dấu exam.archived_at
+      3. xoá StudentAnswer/StudentAnswerLog của đề theo lô, bỏ result_snapshot và answer_vector
+         (kết quả đọc lại từ kho lưu trữ)
+    Điểm số vẫn nằm trong StudentExamSession nên vẫn truy vấn/thống kê được.
+    """
+    from .grading import get_exam_paper, encode_vector, decode_vector, submit_session
+    from .purge import delete_in_chunks
+
+    now = timezone.now()
+    if exam.end_time is None or exam.end_time > now:
+        raise ArchiveError(f"Đề {exam.code} chưa kết thúc (end_time), không lưu trữ được")
+    sessions = sharding.sessions(exam.id).filter(exam=exam)
+    unsubmitted = sessions.filter(is_submitted=False)
+    # Chỉ chốt phiên đã qua expires_at; còn phiên chưa tới giờ thì để lần chạy sau
+    if unsubmitted.filter(expires_at__gt=now).exists():
+        raise ArchiveError(f"Đề {exam.code} còn phiên thi chưa hết giờ, không lưu trữ được")
+    for session in sharding.with_exam(unsubmitted, 'exam'):
+        submit_session(session)
+
+    paper = get_exam_paper(exam.id)
+    selected = {sid: {} for sid in sessions.values_list('id', flat=True)}
+    if exam.archived_at:  # Lưu trữ lần 2 (ví dụ nhập thêm kết quả) -> gộp với dữ liệu cũ
+        for session_id, vector in iter_vectors(exam.id):
+            selected.setdefault(session_id, {}).update(decode_vector(paper, vector))
+    answers = (sharding.answers(exam.id).filter(session__exam=exam).order_by('session_id')
+               .values_list('session_id', 'exam_item_id', 'selected_choice_id'))
+    for session_id, item_id, choice_id in answers.iterator(chunk_size=chunk_size):
+        if choice_id is not None:
+            selected.setdefault(session_id, {})[item_id] = choice_id
+    in_vector = sessions.filter(answer_vector__isnull=False).values_list('id', 'answer_vector')
+    for session_id, vector in in_vector.iterator(chunk_size=chunk_size):
+        selected.setdefault(session_id, {}).update(decode_vector(paper, bytes(vector)))
+    vectors = {sid: encode_vector(paper, sel) for sid, sel in selected.items()}
+
+    with transaction.atomic():
+        ExamAnswerArchive.objects.update_or_create(exam=exam, defaults={
+            'item_count': len(paper['items']),
+            'session_count': len(vectors),
+            'payload': pack_vectors(len(paper['items']), vectors),
+        })
+        exam.archived_at = timezone.now()
+        Exam.objects.filter(id=exam.id).update(archived_at=exam.archived_at)
+    cache.delete(f"exam_archive:{exam.id}")
+
+    alias = sharding.write_alias(exam.id)
+    deleted = delete_in_chunks(StudentAnswer.objects.filter(session__exam=exam), chunk_size, alias)
+    StudentExamSession.objects.using(alias).filter(exam=exam).filter(
+        Q(result_snapshot__isnull=False) | Q(answer_vector__isnull=False)
+    ).update(result_snapshot=None, answer_vector=None)
+    delete_in_chunks(StudentAnswerLog.objects.filter(session__exam=exam), chunk_size, alias)
+    return {'sessions': len(vectors), 'answers': deleted}
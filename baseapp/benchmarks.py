@@ -0,0 +1,243 @@
+# benchmarks.py
+# Micro-benchmark các đường nóng (lệnh benchmark_hot_paths) trên dữ liệu sinh sẵn (synthetic.py):
+#   doc_to_stream / parse_template_docx - đọc file Template.docx N câu (có ảnh)
+#   import_persist                      - bước lưu của import docx (_save_imported_exam)
+#   exam_create                         - view tạo đề ngẫu nhiên từ ngân hàng M câu
+#   exam_submit                         - chấm + chốt bài (submit_session) cho cả ma trận phiên thi x câu trả lời
+#   exam_result                         - view xem kết quả (dựng template) của các phiên đã nộp
+# Mỗi ca chạy 1 lần khởi động có đo bộ nhớ đỉnh (tracemalloc, không tính giờ vì tracemalloc làm chậm),
+# rồi repeat lần đo thời gian; phần chuẩn bị dữ liệu của từng lần (setup) không tính giờ.
+# So với baseline (JSON): median chậm hơn hoặc bộ nhớ đỉnh lớn hơn quá threshold -> regression.
+# session_workload (lệnh benchmark_sessions): đếm truy vấn/request của luồng loadtest với từng SESSION_ENGINE.
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from contextlib import ExitStack
+from itertools import count
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection, connections
+from django.test import Client, RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+from . import loadtest, synthetic
+from .grading import get_exam_paper, submit_session
+from .models import UserProfile
+from .views import _doc_to_stream, _parse_template_docx, _save_imported_exam, exam_create, exam_result
+
+CASES = ('doc_to_stream', 'parse_template_docx', 'import_persist', 'exam_create', 'exam_submit', 'exam_result')
+DEFAULT_PARAMS = {
+    'questions': 200,         # Số câu trong file docx
+    'image_every': 5,         # Cứ 5 câu có 1 câu kèm ảnh
+    'bank': 2000,             # Số câu trong ngân hàng của môn
+    'exam_questions': 50,     # Số câu của đề (exam_create, ma trận bài làm)
+    'sessions': 500,          # Số phiên thi của ma trận bài làm
+    'results': 50,            # Số trang kết quả dựng mỗi lần đo
+    'repeat': 5,
+    'seed': 0,
+}
+MIN_DELTA_MS = 1.0            # Chênh lệch thời gian nhỏ hơn mức này coi là nhiễu
+MIN_DELTA_KB = 64
+
+
+class BenchmarkError(Exception):
+    pass
+
+
+def measure(run, setup=None, repeat=5):
+    """
+    Đo run(setup()): 1 lần khởi động đo bộ nhớ đỉnh + repeat lần đo thời gian.
+    Trả về {'min_ms', 'median_ms', 'max_ms', 'peak_kb', 'runs'}
+    """
+    setup = setup or (lambda: None)
+    arg = setup()
+    tracemalloc.start()
+    try:
+        run(arg)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    samples = []
+    for _ in range(repeat):
+        arg = setup()
+        start = time.perf_counter()
+        run(arg)
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        'min_ms': round(min(samples), 2),
+        'median_ms': round(statistics.median(samples), 2),
+        'max_ms': round(max(samples), 2),
+        'peak_kb': round(peak / 1024),
+        'runs': repeat,
+    }
+
+
+class Suite:
+    """Dữ liệu dùng chung cho các ca: môn + ngân hàng câu hỏi, file docx, học sinh, 1 đề đã nộp đủ bài"""
+
+    def __init__(self, params):
+        self.params = {**DEFAULT_PARAMS, **params}
+        self.rng = random.Random(self.params['seed'])
+        self.codes = count(1)
+        self.factory = RequestFactory()
+
+    def prepare(self):
+        p = self.params
+        self.subject = synthetic.seed_subject('BENCH', 'Benchmark')
+        self.bank = synthetic.seed_question_bank(self.subject, p['bank'], self.rng)
+        self.docx = synthetic.template_docx(p['questions'], self.rng, self.subject.code, image_every=p['image_every'])
+        self.parsed = _parse_template_docx(self.docx)[1]
+        self.admin = User.objects.create_user('bench_admin')
+        UserProfile.objects.create(user=self.admin, role='admin')
+        self.students = synthetic.seed_students(p['sessions'], 'bench12345', prefix='bench')
+        self.users = User.objects.in_bulk(list(self.students.values()))
+        # Đề đã nộp đủ bài cho exam_result
+        exam = self._exam()
+        self.submitted = synthetic.seed_sessions(exam, self.students.values(), self.rng)
+        for session in self.submitted:
+            submit_session(session)
+        self.submitted = self.submitted[:p['results']]
+
+    def _exam(self):
+        """Đề mới gồm exam_questions câu đầu của ngân hàng"""
+        code = f'BENCH_E{next(self.codes):04d}'
+        return synthetic.seed_exam(code, self.subject, self.bank[:self.params['exam_questions']])
+
+    # ===== Các ca =====
+    def doc_to_stream(self):
+        return measure(lambda _: _doc_to_stream(self.docx), repeat=self.params['repeat'])
+
+    def parse_template_docx(self):
+        return measure(lambda _: _parse_template_docx(self.docx), repeat=self.params['repeat'])
+
+    def import_persist(self):
+        return measure(
+            lambda code: _save_imported_exam(self.subject, code, 60, self.parsed),
+            lambda: f'BENCH_IMPORT{next(self.codes):04d}', self.params['repeat'])
+
+    def exam_create(self):
+        def setup():
+            request = self.factory.post('/', {
+                'code': f'C{next(self.codes):04d}', 'subject_id': self.subject.id, 'duration': 60,
+                'num_questions': self.params['exam_questions'],
+            })
+            request.user = self.admin
+            return request
+        return measure(lambda request: self._check(exam_create(request), 302, 'exam_create'),
+                       setup, self.params['repeat'])
+
+    def exam_submit(self):
+        def run(sessions):
+            for session in sessions:
+                submit_session(session)
+        return measure(run, lambda: synthetic.seed_sessions(self._exam(), self.students.values(), self.rng),
+                       self.params['repeat'])
+
+    def exam_result(self):
+        def run(_):
+            for session in self.submitted:
+                request = self.factory.get('/')
+                request.user = self.users[session.student_id]
+                self._check(exam_result(request, session.id), 200, 'exam_result')
+        return measure(run, repeat=self.params['repeat'])
+
+    @staticmethod
+    def _check(response, status, name):
+        if response.status_code != status:
+            raise BenchmarkError(f'{name} trả về {response.status_code}, cần {status}')
+
+
+def run_suite(params, cases=CASES, log=None):
+    """Chạy các ca trên DB hiện tại (dữ liệu sinh thêm vào DB). Trả về {ca: kết quả measure}"""
+    suite = Suite(params)
+    suite.prepare()
+    results = {}
+    for name in cases:
+        results[name] = getattr(suite, name)()
+        if log:
+            log(name, results[name])
+    return results
+
+
+def environment():
+    return {
+        'python': sys.version.split()[0],
+        'django': django.get_version(),
+        'db': connection.vendor,
+        'platform': platform.platform(),
+        'machine': platform.node(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Các regression so với baseline: [(ca, chỉ số, baseline, hiện tại, tỉ lệ tăng)].
+    Chỉ so các ca có trong cả 2 và khi chênh lệch vượt mức nhiễu
+    """
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get('results', {}).get(name)
+        if not before:
+            continue
+        for key, floor in (('median_ms', MIN_DELTA_MS), ('peak_kb', MIN_DELTA_KB)):
+            old, new = before.get(key), current[key]
+            if not old or new - old < floor:
+                continue
+            ratio = new / old - 1
+            if ratio > threshold:
+                regressions.append((name, key, old, new, ratio))
+    return regressions
+
+
+# ===== Truy vấn phiên đăng nhập theo SESSION_ENGINE =====
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+
+
+def session_workload(engine, exam, usernames, password, answers=10):
+    """
+    Luồng của 1 học sinh ảo trong loadtest (trang đăng nhập -> đăng nhập -> bắt đầu thi -> trang làm bài ->
+    lưu `answers` đáp án -> nộp bài) qua test Client với SESSION_ENGINE = engine, cho từng học sinh.
+    Trả về {endpoint: {'requests', 'queries', 'session_reads', 'session_writes'}} (tổng của mọi request)
+    """
+    totals = {name: {'requests': 0, 'queries': 0, 'session_reads': 0, 'session_writes': 0}
+              for name in loadtest.ENDPOINTS}
+    items = [(item['id'], [c['id'] for c in item['choices']]) for item in get_exam_paper(exam.id)['items']]
+    unique = {id(connections[alias]): connections[alias] for alias in connections}
+
+    def call(client, endpoint, method, url, data=None, status=200):
+        with ExitStack() as stack:
+            contexts = [stack.enter_context(CaptureQueriesContext(conn)) for conn in unique.values()]
+            response = getattr(client, method)(url, data or {})
+        if response.status_code != status:
+            raise BenchmarkError(f'{endpoint} ({engine}) trả về {response.status_code}, cần {status}')
+        sql = [q['sql'] for ctx in contexts for q in ctx.captured_queries]
+        session = [q for q in sql if 'django_session' in q]
+        total = totals[endpoint]
+        total['requests'] += 1
+        total['queries'] += len(sql)
+        total['session_reads'] += sum(1 for q in session if q.lstrip().upper().startswith('SELECT'))
+        total['session_writes'] += sum(1 for q in session if not q.lstrip().upper().startswith('SELECT'))
+        return response
+
+    with override_settings(SESSION_ENGINE=SESSION_ENGINES[engine]):
+        for username in usernames:
+            client = Client()   # Middleware (SessionMiddleware nạp engine lúc khởi tạo) dựng lại theo engine
+            call(client, 'login_page', 'get', reverse('login'))
+            call(client, 'login', 'post', reverse('login'), {'username': username, 'password': password}, 302)
+            location = call(client, 'exam_start', 'get', reverse('exam_start', args=[exam.id]), status=302).url
+            session_id = resolve(location).kwargs['session_id']
+            call(client, 'exam_taking', 'get', location)
+            for item_id, choices in items[:answers]:
+                call(client, 'save_answer', 'post', reverse('save_answer'),
+                     {'session_id': session_id, 'item_id': item_id, 'choice_id': choices[0]})
+            call(client, 'exam_submit', 'get', reverse('exam_submit', args=[session_id]), status=302)
+    return totals
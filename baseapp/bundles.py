@@ -0,0 +1,352 @@
+# bundles.py
+# Thi ở điểm thi không có mạng (máy chủ cục bộ):
+# 1. Trung tâm xuất gói đề (build_bundle): ZIP gồm exam.json (đề, câu hỏi, phương án theo đúng thứ tự/nhãn),
+#    ảnh đặt tên theo nội dung (images/<sha256>.ext, trùng nội dung -> 1 file) và manifest.json (sha256 từng file)
+# 2. Điểm thi cài gói đề (install_bundle), cho thi như bình thường rồi xuất kết quả (write_results):
+#    file .jsonl, dòng đầu là thông tin đề + mã băm đề, mỗi dòng sau là 1 bài làm {tài khoản, thời gian,
+#    đáp án {thứ tự câu: nhãn}} - không phụ thuộc id của DB điểm thi
+# 3. Trung tâm nạp kết quả của nhiều điểm thi (ingest_results): đọc từng file theo lô, chấm trong bộ nhớ
+#    theo đề đã cache, ghi cả lô bằng bulk_create (upsert) -> vài truy vấn/lô thay vì vài truy vấn/bài.
+#    Nạp lại cùng file cho kết quả như cũ (ghi đè theo học sinh + đề, đáp án của lô được ghi lại từ đầu).
+import hashlib
+import io
+import json
+import os
+import zipfile
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from django.db.models import DateTimeField, ExpressionWrapper, F
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import counters, sharding
+from .exports import chunk_choices
+from .grading import encode_vector, get_exam_paper, grade_answers
+from .models import (Choice, Exam, ExamChoice, ExamItem, ExamStatistics, Question, SessionDirectory,
+                     StudentAnswer, StudentExamSession, Subject)
+
+BUNDLE_FORMAT = 'exam-bundle/1'
+RESULTS_FORMAT = 'exam-results/1'
+INGEST_CHUNK_SIZE = 1000
+
+SESSION_FIELDS = ['end_time', 'expires_at', 'is_submitted', 'score', 'total_marks',
+                  'result_snapshot', 'answer_vector']
+
+
+class BundleError(Exception):
+    """Gói đề/file kết quả hỏng, sai checksum hoặc không khớp đề trên máy chủ"""
+
+
+def _canonical(data):
+    return json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':')).encode()
+
+
+def _sha256(blob):
+    return hashlib.sha256(blob).hexdigest()
+
+
+# ===== Gói đề =====
+def exam_document(exam):
+    """
+    Nội dung đề (exam.json) và ảnh {tên trong gói: bytes}. Chỉ gồm phần quyết định cách chấm
+    (không có id, thời gian mở đề...) nên cùng 1 đề cho cùng 1 mã băm ở trung tâm và điểm thi.
+    """
+    items = (ExamItem.objects.filter(exam=exam).select_related('question')
+             .prefetch_related('choices').order_by('order'))
+    images, by_name = {}, {}
+    document = {
+        'code': exam.code,
+        'subject': {'code': exam.subject.code, 'name': exam.subject.name},
+        'duration_minutes': exam.duration_minutes,
+        'items': [],
+    }
+    for item in items:
+        q = item.question
+        image = ''
+        if q.image:
+            if q.image.name not in by_name:
+                with default_storage.open(q.image.name, 'rb') as f:
+                    blob = f.read()
+                path = f"images/{_sha256(blob)}{os.path.splitext(q.image.name)[1].lower()}"
+                images[path] = blob
+                by_name[q.image.name] = path
+            image = by_name[q.image.name]
+        document['items'].append({
+            'order': item.order,
+            'mix_choices': item.mix_choices,
+            'text': q.text,
+            'level': q.level,
+            'unit': q.unit,
+            'mark': q.mark,
+            'image': image,
+            'choices': [{'label': c.label, 'text': c.text, 'is_correct': c.is_correct}
+                        for c in sorted(item.choices.all(), key=lambda c: c.label)],
+        })
+    return document, images
+
+
+def document_digest(document):
+    """Mã băm phần quyết định cách chấm (mã đề + câu hỏi/phương án) - không gồm tên môn, thời lượng"""
+    return _sha256(_canonical({'code': document['code'], 'items': document['items']}))
+
+
+def exam_digest(exam):
+    """Mã băm của đề trên DB hiện tại (so với mã băm trong file kết quả)"""
+    return document_digest(exam_document(exam)[0])
+
+
+def build_bundle(exam):
+    """File ZIP (bytes) của gói đề"""
+    document, images = exam_document(exam)
+    files = {'exam.json': _canonical(document), **images}
+    manifest = {
+        'format': BUNDLE_FORMAT,
+        'exam': exam.code,
+        'created_at': timezone.now().isoformat(),
+        'files': {name: {'sha256': _sha256(blob), 'size': len(blob)} for name, blob in files.items()},
+    }
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('manifest.json', json.dumps(manifest, ensure_ascii=False, indent=2))
+        for name, blob in files.items():
+            # Ảnh đã nén sẵn -> lưu nguyên
+            archive.writestr(name, blob, zipfile.ZIP_DEFLATED if name.endswith('.json') else zipfile.ZIP_STORED)
+    return buffer.getvalue()
+
+
+def read_bundle(fileobj):
+    """Đọc và kiểm tra gói đề (đủ file, đúng sha256). Trả về (document, {tên ảnh: bytes})"""
+    try:
+        archive = zipfile.ZipFile(fileobj)
+        manifest = json.loads(archive.read('manifest.json'))
+    except (zipfile.BadZipFile, KeyError, ValueError) as e:
+        raise BundleError(f"Gói đề không hợp lệ: {e}")
+    if manifest.get('format') != BUNDLE_FORMAT:
+        raise BundleError(f"Định dạng gói đề không hỗ trợ: {manifest.get('format')}")
+    blobs = {}
+    for name, meta in manifest['files'].items():
+        try:
+            blob = archive.read(name)
+        except KeyError:
+            raise BundleError(f"Thiếu file {name} trong gói đề")
+        if len(blob) != meta['size'] or _sha256(blob) != meta['sha256']:
+            raise BundleError(f"Sai checksum: {name}")
+        blobs[name] = blob
+    if 'exam.json' not in blobs:
+        raise BundleError("Thiếu exam.json trong gói đề")
+    return json.loads(blobs.pop('exam.json')), blobs
+
+
+def install_bundle(document, images):
+    """
+    Tạo đề của gói trên máy chủ điểm thi (môn học dùng lại theo mã, câu hỏi tạo mới, giữ nguyên thứ tự câu/nhãn).
+    Đề đã cài cùng nội dung -> trả về đề cũ; trùng mã đề nhưng khác nội dung -> BundleError.
+    Trả về (exam, created)
+    """
+    existing = Exam.objects.select_related('subject').filter(code=document['code']).first()
+    if existing is not None:
+        if exam_digest(existing) != document_digest(document):
+            raise BundleError(f"Mã đề {document['code']} đã có trên máy chủ với nội dung khác")
+        return existing, False
+
+    # Ảnh đặt tên theo nội dung -> cài lại gói khác dùng chung ảnh không ghi thêm file
+    stored = {}
+    for path, blob in images.items():
+        name = f"bundle_{os.path.basename(path)}"
+        if not default_storage.exists(name):
+            name = default_storage.save(name, ContentFile(blob))
+        stored[path] = name
+
+    with transaction.atomic():
+        # Subject/Exam/Question tạo từng dòng -> signals.py cộng bộ đếm trang chủ
+        subject, _ = Subject.objects.get_or_create(
+            code=document['subject']['code'], defaults={'name': document['subject']['name']})
+        exam = Exam.objects.create(code=document['code'], subject=subject,
+                                   duration_minutes=document['duration_minutes'],
+                                   question_count=len(document['items']))
+        for entry in document['items']:
+            question = Question.objects.create(subject=subject, text=entry['text'], level=entry['level'],
+                                               unit=entry['unit'], mark=entry['mark'],
+                                               image=stored.get(entry['image']) or None)
+            item = ExamItem.objects.create(exam=exam, question=question, order=entry['order'],
+                                           mix_choices=entry['mix_choices'])
+            Choice.objects.bulk_create([Choice(question=question, **c) for c in entry['choices']])
+            ExamChoice.objects.bulk_create([ExamChoice(item=item, **c) for c in entry['choices']])
+    return exam, True
+
+
+# ===== Kết quả điểm thi =====
+def write_results(exam, out, centre, chunk_size=INGEST_CHUNK_SIZE):
+    """Ghi bài làm của đề ra file .jsonl (out mở ở chế độ text). Trả về số bài làm"""
+    paper = get_exam_paper(exam.id)
+    labels_of = {choice['id']: (str(item['order']), choice['label'])
+                 for item in paper['items'] for choice in item['choices']}
+    out.write(json.dumps({'format': RESULTS_FORMAT, 'centre': centre, 'exam': exam.code,
+                          'exam_sha256': exam_digest(exam), 'exported_at': timezone.now().isoformat()},
+                         ensure_ascii=False) + '\n')
+    sessions = (sharding.sessions(exam.id).filter(exam=exam).order_by('id')
+                .values_list('id', 'student_id', 'start_time', 'end_time', 'is_submitted', 'answer_vector')
+                .iterator(chunk_size=chunk_size))
+    count = 0
+    while chunk := list(islice(sessions, chunk_size)):
+        usernames = dict(User.objects.filter(id__in={row[1] for row in chunk}).values_list('id', 'username'))
+        selected = chunk_choices(exam, paper, chunk)
+        for sid, student_id, started, ended, submitted, _ in chunk:
+            labels = dict(labels_of[choice_id] for choice_id in selected.get(sid, {}).values()
+                          if choice_id in labels_of)
+            out.write(json.dumps({
+                'student': usernames.get(student_id, ''),
+                'start_time': started.isoformat() if started else None,
+                'end_time': ended.isoformat() if ended else None,
+                'is_submitted': submitted,
+                'answers': labels,
+            }, ensure_ascii=False) + '\n')
+            count += 1
+    return count
+
+
+class IngestReport:
+    """Số liệu của 1 lần nạp kết quả"""
+
+    def __init__(self):
+        self.files = 0
+        self.sessions = 0
+        self.unknown_students = []
+        self.invalid_answers = 0
+        self.exams = set()
+
+    def __str__(self):
+        return (f"{self.files} file, {self.sessions} bài làm, {len(self.exams)} đề, "
+                f"{len(self.unknown_students)} tài khoản không tồn tại, {self.invalid_answers} đáp án không hợp lệ")
+
+
+def ingest_results(paths, chunk_size=INGEST_CHUNK_SIZE, force=False):
+    """
+    Nạp các file kết quả của điểm thi. Mọi bài làm được coi là đã nộp (điểm thi đã đóng),
+    bài làm của điểm thi ghi đè bài làm cùng học sinh + đề đang có. Xong thì tính lại thống kê các đề.
+    force: bỏ qua kiểm tra mã băm đề (đề trên trung tâm đã bị sửa sau khi xuất gói).
+    """
+    report = IngestReport()
+    # Kiểm tra dòng đầu của mọi file trước khi ghi -> file sai không làm nạp dở dang
+    digests = {}
+    headers = [(path, _check_header(path, force, digests)) for path in paths]
+    for path, exam in headers:
+        paper = get_exam_paper(exam.id)
+        with open(path, encoding='utf-8') as f:
+            f.readline()
+            records = (json.loads(line) for line in f if line.strip())
+            while chunk := list(islice(records, chunk_size)):
+                _ingest_chunk(exam, paper, chunk, report)
+        report.files += 1
+        report.exams.add(exam)
+
+    for exam in report.exams:
+        ExamStatistics.rebuild(exam)
+    counters.reconcile([counters.ACTIVE_ATTEMPTS])
+    return report
+
+
+def _check_header(path, force, digests):
+    with open(path, encoding='utf-8') as f:
+        try:
+            header = json.loads(f.readline() or 'null')
+        except ValueError:
+            header = None
+    if not isinstance(header, dict) or header.get('format') != RESULTS_FORMAT:
+        raise BundleError(f"{path}: không phải file kết quả điểm thi")
+    exam = Exam.objects.visible().select_related('subject').filter(code=header['exam']).first()
+    if exam is None:
+        raise BundleError(f"{path}: không có đề {header['exam']}")
+    if exam.archived_at:
+        raise BundleError(f"{path}: đề {exam.code} đã lưu trữ, không nạp thêm bài làm")
+    if not force and exam.id not in digests:
+        digests[exam.id] = exam_digest(exam)
+    if not force and digests[exam.id] != header.get('exam_sha256'):
+        raise BundleError(f"{path}: đề {exam.code} trên máy chủ khác với đề điểm thi đã dùng")
+    return exam
+
+
+def _ingest_chunk(exam, paper, chunk, report):
+    users = dict(User.objects.filter(username__in={r['student'] for r in chunk}).values_list('username', 'id'))
+    choice_ids = {
+        (str(item['order']), choice['label']): (item['id'], choice['id'])
+        for item in paper['items'] for choice in item['choices']
+    }
+    vector_mode = getattr(settings, 'EXAM_ANSWER_STORAGE', 'rows') == 'vector'
+    now = timezone.now()
+
+    sessions, selections = {}, {}
+    for record in chunk:
+        student_id = users.get(record['student'])
+        if student_id is None:
+            report.unknown_students.append(record['student'])
+            continue
+        selected = {}
+        for order, label in record['answers'].items():
+            pair = choice_ids.get((order, label))
+            if pair is None:
+                report.invalid_answers += 1
+                continue
+            selected[pair[0]] = pair[1]
+        earned, total, snapshot = grade_answers(paper, selected)
+        start = parse_datetime(record['start_time']) if record['start_time'] else now
+        end = parse_datetime(record['end_time']) if record['end_time'] else now
+        # Học sinh trùng trong lô (2 điểm thi cùng 1 tài khoản) -> dòng sau thắng
+        sessions[student_id] = StudentExamSession(
+            student_id=student_id, exam_id=exam.id, start_time=start, end_time=end,
+            expires_at=start + timezone.timedelta(minutes=exam.duration_minutes), is_submitted=True,
+            score=earned, total_marks=total, result_snapshot=snapshot,
+            answer_vector=encode_vector(paper, selected) if vector_mode else None,
+        )
+        selections[student_id] = selected
+    if not sessions:
+        return
+
+    alias = sharding.write_alias(exam.id)
+    objs = list(sessions.values())
+    if sharding.enabled():
+        # Cấp id toàn cục trong SessionDirectory trước, phiên trên shard dùng đúng id đó
+        SessionDirectory.objects.bulk_create(
+            [SessionDirectory(student_id=sid, exam_id=exam.id, shard=alias) for sid in sessions],
+            ignore_conflicts=True)
+        ids = dict(SessionDirectory.objects.filter(exam_id=exam.id, student_id__in=sessions)
+                   .values_list('student_id', 'id'))
+        for obj in objs:
+            obj.id = ids[obj.student_id]
+
+    manager = StudentExamSession.objects.using(alias)
+    # MySQL: ON DUPLICATE KEY UPDATE không chỉ định cột unique
+    target = ['student', 'exam'] if connections[alias].features.supports_update_conflicts_with_target else None
+    with transaction.atomic(using=alias):
+        manager.bulk_create(objs, update_conflicts=True, unique_fields=target, update_fields=SESSION_FIELDS)
+        ids = dict(manager.filter(exam_id=exam.id, student_id__in=sessions).values_list('student_id', 'id'))
+        # start_time là auto_now_add nên bulk_create ghi = now -> tính lại từ expires_at trong 1 câu UPDATE
+        manager.filter(id__in=ids.values()).update(start_time=ExpressionWrapper(
+            F('expires_at') - timezone.timedelta(minutes=exam.duration_minutes), output_field=DateTimeField()))
+        StudentAnswer.objects.using(alias).filter(session_id__in=ids.values()).delete()
+        if not vector_mode:
+            insert_answers(alias, [
+                (ids[student_id], item_id, choice_id)
+                for student_id, selected in selections.items() for item_id, choice_id in selected.items()
+            ])
+    report.sessions += len(objs)
+
+
+def insert_answers(alias, rows):
+    """
+    INSERT thô bằng executemany (mysqlclient gộp thành INSERT nhiều dòng): lô vài chục nghìn câu trả lời,
+    bulk_create tốn phần lớn thời gian chuẩn bị từng giá trị qua ORM.
+    """
+    conn = connections[alias]
+    meta = StudentAnswer._meta
+    columns = ', '.join(conn.ops.quote_name(meta.get_field(name).column)
+                        for name in ('session', 'exam_item', 'selected_choice', 'answered_at'))
+    answered_at = conn.ops.adapt_datetimefield_value(timezone.now())
+    with conn.cursor() as cursor:
+        cursor.executemany(f"INSERT INTO {conn.ops.quote_name(meta.db_table)} ({columns}) VALUES (%s, %s, %s, %s)",
+                           [row + (answered_at,) for row in rows])
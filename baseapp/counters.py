@@ -0,0 +1,51 @@
+# counters.py
+from django.db import transaction, IntegrityError
+from django.db.models import F
+
+from . import sharding
+from .models import SiteCounter, Subject, Question, Exam
+
+SUBJECTS = 'subjects'
+QUESTIONS = 'questions'
+EXAMS = 'exams'
+ACTIVE_ATTEMPTS = 'active_attempts'
+
+# Giá trị thật của từng bộ đếm - dùng khi đối soát
+SOURCES = {
+    SUBJECTS: lambda: Subject.objects.count(),
+    QUESTIONS: lambda: Question.objects.count(),
+    EXAMS: lambda: Exam.objects.visible().count(),
+    ACTIVE_ATTEMPTS: lambda: sharding.count_unsubmitted(),
+}
+
+
+def incr(name, delta=1):
+    """Cộng dồn bộ đếm bằng UPDATE nguyên tử; tạo dòng nếu chưa có"""
+    if not delta:
+        return
+    if SiteCounter.objects.filter(name=name).update(value=F('value') + delta):
+        return
+    try:
+        with transaction.atomic():
+            SiteCounter.objects.create(name=name, value=SOURCES[name]())
+    except IntegrityError:
+        SiteCounter.objects.filter(name=name).update(value=F('value') + delta)
+
+
+def get_counters():
+    """Tất cả bộ đếm trong 1 truy vấn; bộ đếm nào chưa có thì tính lại một lần"""
+    values = dict(SiteCounter.objects.values_list('name', 'value'))
+    missing = [name for name in SOURCES if name not in values]
+    if missing:
+        values.update(reconcile(missing))
+    return values
+
+
+def reconcile(names=None):
+    """Đếm lại từ bảng gốc và ghi đè giá trị bộ đếm"""
+    result = {}
+    for name in names or SOURCES:
+        value = SOURCES[name]()
+        SiteCounter.objects.update_or_create(name=name, defaults={'value': value})
+        result[name] = value
+    return result
@@ -0,0 +1,204 @@
+# exports.py
+# Xuất bảng điểm CSV / XLSX dạng stream (StreamingHttpResponse): phiên thi đọc theo lô bằng .iterator(chunk_size),
+# mỗi lô tra tài khoản/MSSV (và câu trả lời) bằng 1-2 truy vấn rồi ghi ra ngay -> bộ nhớ không phụ thuộc
+# số bài làm, trình duyệt nhận byte đầu tiên ngay sau lô đầu tiên. Đọc từ replica nếu có (xem routers.py).
+import csv
+import re
+import zipfile
+from itertools import islice
+from xml.sax.saxutils import escape, quoteattr
+
+from django.contrib.auth.models import User
+from django.utils import timezone
+
+from . import sharding
+from .grading import decode_vector, get_exam_paper
+from .routers import read_from_replica
+
+EXPORT_CHUNK_SIZE = 2000
+FLUSH_BYTES = 64 * 1024   # Gom dòng thành từng đoạn ~64KB trước khi gửi
+
+RESULT_HEADER = ['Mã đề', 'Môn học', 'Tài khoản', 'MSSV', 'Điểm', 'Tổng điểm', 'Tỉ lệ (%)',
+                 'Bắt đầu', 'Nộp bài', 'Đã nộp']
+
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+def result_rows(exams, with_choices=False, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Dòng tiêu đề + 1 dòng/phiên thi của các đề (theo thứ tự exams, cần select_related('subject')).
+    with_choices: thêm 1 cột/câu (nhãn phương án đã chọn) - chỉ dùng khi xuất 1 đề.
+    """
+    with read_from_replica():
+        paper = get_exam_paper(exams[0].id) if with_choices else None
+        header = list(RESULT_HEADER)
+        if paper:
+            header += [f"Câu {item['order']}" for item in paper['items']]
+        yield header
+        for exam in exams:
+            yield from _exam_rows(exam, paper, chunk_size)
+
+
+def _exam_rows(exam, paper, chunk_size):
+    fields = ['id', 'student_id', 'score', 'total_marks', 'start_time', 'end_time', 'is_submitted']
+    if paper:
+        fields.append('answer_vector')
+    sessions = (sharding.sessions(exam.id).filter(exam_id=exam.id).order_by('id')
+                .values_list(*fields).iterator(chunk_size=chunk_size))
+    while chunk := list(islice(sessions, chunk_size)):
+        # Tài khoản ở primary, phiên thi có thể ở shard -> tra theo lô thay cho JOIN
+        students = {uid: (username, student_id) for uid, username, student_id in User.objects.filter(
+            id__in={row[1] for row in chunk}).values_list('id', 'username', 'userprofile__student_id')}
+        selected = chunk_choices(exam, paper, chunk) if paper else {}
+        for sid, student_id, score, total, started, ended, submitted, *_ in chunk:
+            username, code = students.get(student_id, ('', ''))
+            row = [exam.code, exam.subject.code, username, code or '', score, total,
+                   round(score / total * 100, 2) if submitted and total else None,
+                   _local(started), _local(ended), submitted]
+            if paper:
+                answers = selected.get(sid, {})
+                row += [_label(item, answers.get(item['id'])) for item in paper['items']]
+            yield row
+
+
+def chunk_choices(exam, paper, chunk):
+    """{session_id: {exam_item_id: choice_id}} của 1 lô phiên thi: kho lưu trữ, mảng đáp án hoặc StudentAnswer"""
+    if exam.archived_at:
+        from .archive import read_vector
+        vectors = {row[0]: read_vector(exam.id, row[0]) for row in chunk}
+        return {sid: decode_vector(paper, vector) for sid, vector in vectors.items() if vector}
+    selected = {row[0]: decode_vector(paper, bytes(row[-1])) for row in chunk if row[-1] is not None}
+    row_ids = [row[0] for row in chunk if row[-1] is None]
+    if row_ids:
+        answers = (sharding.answers(exam.id).filter(session_id__in=row_ids)
+                   .values_list('session_id', 'exam_item_id', 'selected_choice_id'))
+        for sid, item_id, choice_id in answers:
+            selected.setdefault(sid, {})[item_id] = choice_id
+    return selected
+
+
+def _label(item, choice_id):
+    for choice in item['choices']:
+        if choice['id'] == choice_id:
+            return choice['label']
+    return ''
+
+
+def _local(value):
+    return timezone.localtime(value).strftime('%Y-%m-%d %H:%M:%S') if value else ''
+
+
+# ===== CSV =====
+class _Echo:
+    """File giả cho csv.writer: writerow trả về chuỗi đã định dạng thay vì ghi"""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    buffer = ['\ufeff']   # BOM để Excel đọc đúng UTF-8
+    size = 0
+    for row in rows:
+        line = writer.writerow(['' if value is None else value for value in row])
+        buffer.append(line)
+        size += len(line)
+        if size >= FLUSH_BYTES:
+            yield ''.join(buffer)
+            buffer, size = [], 0
+    yield ''.join(buffer)
+
+
+# ===== XLSX =====
+# Ghi thẳng SpreadsheetML vào file zip đang stream (zipfile hỗ trợ ghi vào luồng không seek được),
+# chuỗi ghi inline trong ô -> không cần bảng sharedStrings giữ toàn bộ nội dung trong bộ nhớ.
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" '
+        'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="xl/workbook.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument"/>'
+        '</Relationships>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Target="worksheets/sheet1.xml" '
+        'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet"/>'
+        '</Relationships>'
+    ),
+}
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name={name} sheetId="1" r:id="rId1"/></sheets></workbook>'
+)
+_SHEET_HEAD = ('<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+               '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>')
+_SHEET_TAIL = '</sheetData></worksheet>'
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+class ZipStream:
+    """Đích ghi của ZipFile: giữ byte chưa gửi, không seek được (zipfile ghi data descriptor sau mỗi file)"""
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.offset = 0
+
+    def write(self, data):
+        self.buffer += data
+        self.offset += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.offset
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+def _cell(value):
+    if value is None or value == '':
+        return '<c/>'
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f'<c><v>{value}</v></c>'
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_XML_INVALID.sub("", str(value)))}</t></is></c>'
+
+
+def stream_xlsx(rows, sheet_name='Kết quả'):
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in _XLSX_PARTS.items():
+            archive.writestr(name, content)
+        archive.writestr('xl/workbook.xml', _WORKBOOK.format(name=quoteattr(sheet_name[:31])))
+        yield stream.take()
+        with archive.open('xl/worksheets/sheet1.xml', 'w') as sheet:
+            sheet.write(_SHEET_HEAD.encode())
+            for number, row in enumerate(rows, start=1):
+                sheet.write(f'<row r="{number}">{"".join(_cell(value) for value in row)}</row>'.encode())
+                if len(stream.buffer) >= FLUSH_BYTES:
+                    yield stream.take()
+            sheet.write(_SHEET_TAIL.encode())
+    yield stream.take()
@@ -0,0 +1,209 @@
+# grading.py
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from . import counters, metrics, proctoring, sharding
+from .models import ExamItem, ExamStatistics, StudentExamSession, StudentAnswerLog
+
+PAPER_CACHE_TIMEOUT = 60 * 60 * 24  # Sửa câu hỏi thì xoá cache (signals.py) -> cache 1 ngày
+
+
+def _paper_key(exam_id):
+    return f"exam_paper:{exam_id}"
+
+
+def get_exam_paper(exam_id):
+    """
+    Nội dung đề thi (câu hỏi + phương án) dạng dict, cache theo exam_id.
+    Cache miss: 2 truy vấn (items + question, choices); cache hit: 0 truy vấn.
+    """
+    paper = cache.get(_paper_key(exam_id))
+    if paper is not None:
+        return paper
+
+    items = (ExamItem.objects.filter(exam_id=exam_id)
+             .select_related('question').prefetch_related('choices').order_by('order'))
+    paper = {'exam_id': exam_id, 'total_marks': 0.0, 'items': []}
+    for item in items:
+        q = item.question
+        choices = [
+            {'id': c.id, 'label': c.label, 'text': c.text, 'is_correct': c.is_correct}
+            for c in sorted(item.choices.all(), key=lambda c: c.label)
+        ]
+        paper['items'].append({
+            'id': item.id,
+            'order': item.order,
+            'question_id': q.id,
+            'text': q.text,
+            'image_url': q.image.url if q.image else '',
+            'mark': q.mark,
+            'choices': choices,
+            'correct_choice_ids': [c['id'] for c in choices if c['is_correct']],
+        })
+        paper['total_marks'] += q.mark
+    cache.set(_paper_key(exam_id), paper, PAPER_CACHE_TIMEOUT)
+    return paper
+
+
+def invalidate_exam_paper(exam_id):
+    cache.delete(_paper_key(exam_id))
+
+
+def invalidate_question_papers(question_id):
+    """Xoá đề đã dựng của mọi đề có câu hỏi này (sau khi sửa nội dung/điểm/ảnh câu hỏi)"""
+    exam_ids = ExamItem.objects.filter(question_id=question_id).values_list('exam_id', flat=True).distinct()
+    cache.delete_many([_paper_key(exam_id) for exam_id in exam_ids])
+
+
+def grade_answers(paper, selected):
+    """
+    Chấm điểm theo đề đã cache.
+    selected: {exam_item_id: selected_choice_id}
+    Trả về (earned, total, snapshot) - snapshot: [[item_id, choice_id|None, điểm đạt], ...] theo thứ tự câu
+    """
+    earned = 0.0
+    snapshot = []
+    for item in paper['items']:
+        choice_id = selected.get(item['id'])
+        mark = item['mark'] if choice_id in item['correct_choice_ids'] else 0
+        earned += mark
+        snapshot.append([item['id'], choice_id, mark])
+    return earned, paper['total_marks'], snapshot
+
+
+def encode_vector(paper, selected):
+    """
+    {exam_item_id: choice_id} -> mảng byte, 1 byte/câu theo thứ tự câu trong đề:
+    0 = bỏ trống, k = phương án thứ k (theo nhãn A, B, C...)
+    """
+    vector = bytearray(len(paper['items']))
+    for pos, item in enumerate(paper['items']):
+        choice_id = selected.get(item['id'])
+        if choice_id is None:
+            continue
+        for k, choice in enumerate(item['choices'], start=1):
+            if choice['id'] == choice_id:
+                vector[pos] = k
+                break
+    return bytes(vector)
+
+
+def decode_vector(paper, vector):
+    """Mảng byte -> {exam_item_id: choice_id}"""
+    selected = {}
+    for pos, item in enumerate(paper['items'][:len(vector)]):
+        k = vector[pos]
+        if 0 < k <= len(item['choices']):
+            selected[item['id']] = item['choices'][k - 1]['id']
+    return selected
+
+
+def locate_choice(paper, item_id, choice_id):
+    """(vị trí câu, chỉ số phương án) của item/choice trong đề; choice_id rỗng -> chỉ số 0. None nếu không thuộc đề"""
+    for pos, item in enumerate(paper['items']):
+        if item['id'] != item_id:
+            continue
+        if choice_id is None:
+            return pos, 0
+        for k, choice in enumerate(item['choices'], start=1):
+            if choice['id'] == choice_id:
+                return pos, k
+        return None
+    return None
+
+
+def load_selected(session, paper=None):
+    """Câu trả lời của phiên thi {exam_item_id: choice_id}: từ kho lưu trữ, mảng đáp án hoặc bảng StudentAnswer"""
+    if session.exam.archived_at:
+        from .archive import read_vector
+        vector = read_vector(session.exam_id, session.id)
+        return decode_vector(paper or get_exam_paper(session.exam_id), vector) if vector else {}
+    if session.answer_vector is not None:
+        return decode_vector(paper or get_exam_paper(session.exam_id), bytes(session.answer_vector))
+    return dict(session.answers.values_list('exam_item_id', 'selected_choice_id'))
+
+
+def save_vector_answer(session, paper, position, choice_index, retries=3):
+    """
+    Ghi 1 byte vào mảng đáp án bằng UPDATE so sánh-và-đổi trên đúng 1 dòng
+    (WHERE answer_vector = giá trị cũ) - không khoá, thử lại nếu có lần lưu khác chen vào.
+    """
+    sessions = StudentExamSession.objects.using(sharding.write_alias(session.exam_id))
+    vector = bytes(session.answer_vector)
+    for _ in range(retries):
+        new = bytearray(vector.ljust(len(paper['items']), b'\0'))
+        new[position] = choice_index
+        new = bytes(new)
+        if new == vector or sessions.filter(
+                id=session.id, is_submitted=False, answer_vector=vector).update(answer_vector=new):
+            session.answer_vector = new
+            break
+        vector = sessions.filter(id=session.id).values_list('answer_vector', flat=True).first()
+        if vector is None:
+            return False
+        vector = bytes(vector)
+    else:
+        return False
+    if getattr(settings, 'EXAM_ANSWER_AUDIT_LOG', False):
+        StudentAnswerLog.objects.using(sessions.db).create(
+            session_id=session.id, position=position, choice_index=choice_index)
+    return True
+
+
+def grade_session(session):
+    """Chấm một phiên thi: 1 truy vấn lấy câu trả lời (+ đề nếu chưa cache)"""
+    paper = get_exam_paper(session.exam_id)
+    return grade_answers(paper, load_selected(session, paper))
+
+
+def build_results(paper, snapshot):
+    """Ghép snapshot với đề thành danh sách kết quả từng câu (gồm cả câu bỏ trống)"""
+    by_item = {row[0]: row for row in snapshot}
+    results = []
+    for number, item in enumerate(paper['items'], start=1):
+        _, choice_id, mark = by_item.get(item['id'], (item['id'], None, 0))
+        choices = item['choices']
+        selected = next((c for c in choices if c['id'] == choice_id), None)
+        correct = next((c for c in choices if c['is_correct']), None)
+        results.append({
+            'number': number,
+            'question': item,
+            'choices': choices,
+            'selected': selected,
+            'correct': correct,
+            'is_correct': bool(selected and selected['is_correct']),
+            'is_skipped': selected is None,
+            'marks': mark,
+        })
+    return results
+
+
+def submit_session(session):
+    """
+    Chấm và chốt bài làm. Chỉ cập nhật nếu phiên chưa nộp (UPDATE có điều kiện)
+    để bấm nộp 2 lần không cộng thống kê 2 lần. Trả về True nếu lần gọi này đã nộp bài.
+    Khi chia shard, thống kê/bộ đếm trên primary không chung transaction với shard
+    (lệch thì đối soát bằng rebuild_exam_stats / reconcile_counters).
+    """
+    earned_marks, total_marks, snapshot = grade_session(session)
+    session.end_time = timezone.now()
+    session.is_submitted = True
+    session.score = earned_marks
+    session.total_marks = total_marks
+    session.result_snapshot = snapshot
+    alias = sharding.write_alias(session.exam_id)
+    with transaction.atomic(using=alias):
+        submitted = StudentExamSession.objects.using(alias).filter(id=session.id, is_submitted=False).update(
+            end_time=session.end_time, is_submitted=True,
+            score=session.score, total_marks=session.total_marks,
+            result_snapshot=snapshot
+        )
+        if submitted:
+            ExamStatistics.record(session.exam_id, session.get_percentage())
+            counters.incr(counters.ACTIVE_ATTEMPTS, -1)
+    if submitted:
+        proctoring.session_submitted(session)
+        metrics.inc(metrics.SUBMISSIONS)
+    return bool(submitted)
@@ -0,0 +1,171 @@
+# loadtest.py
+# Giả lập buổi thi trên server đang chạy (lệnh loadtest_exam): mỗi học sinh ảo là 1 thread với cookie riêng,
+# đi đúng luồng của trình duyệt: trang đăng nhập -> đăng nhập -> bắt đầu thi -> trang làm bài -> lưu đáp án
+# từng câu (nghỉ giữa các lần theo phân phối mũ, trung bình think_time giây) -> chờ hết giờ -> nộp bài.
+# Học sinh vào thi rải đều trong ramp_up giây, nộp bài cùng lúc khi hết giờ (như chuông hết giờ thật).
+# Kết quả theo từng endpoint: số request, lỗi, request/giây, độ trễ p50/p90/p95/p99 (ms) - dạng dict/JSON.
+import http.client
+import http.cookiejar
+import math
+import random
+import re
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ENDPOINTS = ('login_page', 'login', 'exam_start', 'exam_taking', 'save_answer', 'exam_submit')
+REQUEST_TIMEOUT = 30
+_SESSION_URL = re.compile(r'/student/exam/session/(\d+)/')
+
+
+class _NoRedirect(urllib.request.HTTPErrorProcessor):
+    """Trả về response 3xx/4xx/5xx nguyên vẹn: đo riêng từng request, không tự đi theo redirect"""
+
+    def http_response(self, request, response):
+        return response
+
+    https_response = http_response
+
+
+class Recorder:
+    """Độ trễ và lỗi theo endpoint, dùng chung cho mọi thread"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = {name: [] for name in ENDPOINTS}
+        self.errors = {name: 0 for name in ENDPOINTS}
+        self.statuses = {name: {} for name in ENDPOINTS}
+
+    def record(self, endpoint, seconds, status, ok):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] = self.statuses[endpoint].get(status, 0) + 1
+            if not ok:
+                self.errors[endpoint] += 1
+
+    def report(self, wall_seconds):
+        endpoints = {}
+        for name in ENDPOINTS:
+            samples = sorted(self.latencies[name])
+            count = len(samples)
+            endpoints[name] = {
+                'count': count,
+                'errors': self.errors[name],
+                'error_rate': round(self.errors[name] / count, 4) if count else 0.0,
+                'throughput_rps': round(count / wall_seconds, 2) if wall_seconds else 0.0,
+                'latency_ms': {
+                    'mean': round(sum(samples) / count * 1000, 2) if count else None,
+                    **{f'p{q}': percentile(samples, q) for q in (50, 90, 95, 99)},
+                    'max': round(samples[-1] * 1000, 2) if count else None,
+                },
+                'statuses': {str(status): n for status, n in sorted(self.statuses[name].items(), key=str)},
+            }
+        total = sum(e['count'] for e in endpoints.values())
+        errors = sum(e['errors'] for e in endpoints.values())
+        return {
+            'requests': total,
+            'errors': errors,
+            'error_rate': round(errors / total, 4) if total else 0.0,
+            'throughput_rps': round(total / wall_seconds, 2) if wall_seconds else 0.0,
+            'endpoints': endpoints,
+        }
+
+
+def percentile(samples, q):
+    """Phân vị theo thứ hạng gần nhất (ms) của danh sách đã sắp xếp"""
+    if not samples:
+        return None
+    rank = min(len(samples), max(1, math.ceil(q / 100 * len(samples)))) - 1
+    return round(samples[rank] * 1000, 2)
+
+
+class VirtualStudent:
+
+    def __init__(self, base_url, username, password, recorder):
+        self.base_url = base_url.rstrip('/')
+        self.username = username
+        self.password = password
+        self.recorder = recorder
+        self.cookies = http.cookiejar.CookieJar()
+        self.opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(self.cookies), _NoRedirect())
+
+    def _csrf(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, endpoint, path, data=None, headers=None, expect=(200,)):
+        """Gửi 1 request, ghi độ trễ; trả về (status, Location, body) - lỗi kết nối: status 0"""
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, headers=headers or {})
+        start = time.perf_counter()
+        try:
+            with self.opener.open(req, timeout=REQUEST_TIMEOUT) as response:
+                status, location, content = response.status, response.headers.get('Location', ''), response.read()
+        except (urllib.error.URLError, http.client.HTTPException, OSError):
+            status, location, content = 0, '', b''
+        self.recorder.record(endpoint, time.perf_counter() - start, status, status in expect)
+        return status, location, content
+
+    def run(self, exam_id, items, start_at, deadline, think_time, submit_spread, rng):
+        """items: [(item_id, [choice_id...])] của đề"""
+        time.sleep(max(0.0, start_at - time.monotonic()))
+        self.request('login_page', '/')
+        status, _, _ = self.request('login', '/', {
+            'username': self.username, 'password': self.password, 'csrfmiddlewaretoken': self._csrf(),
+        }, expect=(302,))
+        if status != 302:   # Sai mật khẩu: trang đăng nhập trả về 200
+            return False
+        status, location, _ = self.request('exam_start', f'/student/exam/{exam_id}/start/', expect=(302,))
+        match = _SESSION_URL.search(location)
+        if not match:
+            return False
+        session_id = match.group(1)
+        self.request('exam_taking', f'/student/exam/session/{session_id}/')
+
+        # Trả lời lần lượt các câu theo thứ tự ngẫu nhiên, thỉnh thoảng đổi ý ở câu đã làm
+        order = list(items)
+        rng.shuffle(order)
+        for item_id, choices in order:
+            wait = rng.expovariate(1 / think_time) if think_time > 0 else 0
+            if time.monotonic() + wait >= deadline:
+                break
+            time.sleep(wait)
+            for _ in range(2 if rng.random() < 0.1 else 1):
+                self.request('save_answer', '/ajax/save-answer/', {
+                    'session_id': session_id, 'item_id': item_id, 'choice_id': rng.choice(choices),
+                }, headers={'X-CSRFToken': self._csrf(), 'X-Requested-With': 'XMLHttpRequest'})
+
+        # Chuông hết giờ: mọi học sinh nộp trong vòng submit_spread giây
+        time.sleep(max(0.0, deadline - time.monotonic()) + rng.uniform(0, submit_spread))
+        self.request('exam_submit', f'/student/exam/session/{session_id}/submit/', expect=(302,))
+        return True
+
+
+def run_load(base_url, exam_id, items, usernames, password, duration, think_time=5.0, ramp_up=30.0,
+             submit_spread=2.0, concurrency=None, seed=0):
+    """
+    Chạy buổi thi giả lập, trả về báo cáo (dict). items: [(item_id, [choice_id...])];
+    duration: số giây làm bài tính từ lúc học sinh cuối cùng vào thi.
+    """
+    recorder = Recorder()
+    rng = random.Random(seed)
+    started = time.monotonic()
+    deadline = started + ramp_up + duration
+    students = [(VirtualStudent(base_url, username, password, recorder), started + rng.uniform(0, ramp_up),
+                 random.Random(rng.random())) for username in usernames]
+    threading.stack_size(512 * 1024)   # Hàng nghìn thread chủ yếu ngủ/chờ mạng
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency or len(students)) as pool:
+            results = list(pool.map(
+                lambda s: s[0].run(exam_id, items, s[1], deadline, think_time, submit_spread, s[2]), students))
+    finally:
+        threading.stack_size(0)
+    report = recorder.report(time.monotonic() - started)
+    report['students'] = len(students)
+    report['completed'] = sum(1 for ok in results if ok)
+    return report
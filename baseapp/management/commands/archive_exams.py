@@ -0,0 +1,42 @@
+# management/commands/archive_exams.py
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from baseapp.archive import ArchiveError, archive_exam
+from baseapp.models import Exam
+
+#python manage.py archive_exams --closed-days 14
+#python manage.py archive_exams --exam 12 --exam 13
+
+class Command(BaseCommand):
+    help = 'Chuyển bài làm của các đề đã đóng từ StudentAnswer sang kho lưu trữ nén (ExamAnswerArchive)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, action='append', default=[], help='ID đề thi cần lưu trữ')
+        parser.add_argument('--closed-days', type=int, default=7,
+                            help='Lưu trữ các đề đã kết thúc (end_time) ít nhất N ngày (mặc định 7)')
+        parser.add_argument('--dry-run', action='store_true', help='Chỉ liệt kê đề sẽ lưu trữ')
+
+    def handle(self, *args, **options):
+        exams = Exam.objects.visible()
+        if options['exam']:
+            # Chỉ định đề cụ thể vẫn phải là đề đã kết thúc
+            open_exams = exams.filter(id__in=options['exam']).exclude(end_time__lte=timezone.now())
+            for exam in open_exams.order_by('id'):
+                self.stderr.write(f'{exam.code}: đề chưa kết thúc (end_time {exam.end_time}), bỏ qua')
+            exams = exams.filter(id__in=options['exam'], end_time__lte=timezone.now())
+        else:
+            closed_before = timezone.now() - timezone.timedelta(days=options['closed_days'])
+            exams = exams.filter(end_time__lte=closed_before, archived_at__isnull=True)
+
+        for exam in exams.order_by('id'):
+            if options['dry_run']:
+                self.stdout.write(f'{exam.code} (kết thúc {exam.end_time})')
+                continue
+            try:
+                result = archive_exam(exam)
+            except ArchiveError as e:
+                self.stderr.write(str(e))
+                continue
+            self.stdout.write(f"{exam.code}: {result['sessions']} phiên thi, đã chuyển {result['answers']} câu trả lời")
+
+        self.stdout.write(self.style.SUCCESS('Hoàn tất lưu trữ'))
@@ -0,0 +1,131 @@
+# management/commands/benchmark_db_connections.py
+import copy
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.db.utils import OperationalError
+from exammanagement.db_backends import get_pool
+
+#python manage.py benchmark_db_connections --threads 50 --requests 100 --pool-size 10
+#python manage.py benchmark_db_connections --settings=exammanagement.settings_test --connect-latency 5
+
+# Backend gốc <-> backend có pool
+POOLED_ENGINES = {
+    'django.db.backends.mysql': 'exammanagement.db_backends.mysql',
+    'django.db.backends.sqlite3': 'exammanagement.db_backends.sqlite3',
+}
+PLAIN_ENGINES = {pooled: plain for plain, pooled in POOLED_ENGINES.items()}
+MODES = ('direct', 'persistent', 'pooled')
+
+
+class Command(BaseCommand):
+    help = ('Đo số connection mở/giây và độ trễ p95 của 1 vòng request (mở/mượn connection, truy vấn, đóng/trả) '
+            'ở 3 chế độ: direct (CONN_MAX_AGE=0), persistent (CONN_MAX_AGE>0), pooled (pool connection)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Alias DB dùng làm cấu hình gốc')
+        parser.add_argument('--mode', choices=MODES, action='append', default=[], help='Chế độ cần đo (mặc định cả 3)')
+        parser.add_argument('--threads', type=int, default=20, help='Số thread chạy song song (số request đồng thời)')
+        parser.add_argument('--requests', type=int, default=100, help='Số request mỗi thread')
+        parser.add_argument('--pool-size', type=int, default=10, help='POOL MAX_SIZE ở chế độ pooled')
+        parser.add_argument('--pool-timeout', type=float, default=10, help='POOL TIMEOUT (giây) ở chế độ pooled')
+        parser.add_argument('--connect-latency', type=float, default=0,
+                            help='Giả lập thời gian bắt tay TCP + xác thực (ms) mỗi lần mở connection thật, '
+                                 'dùng khi đo trên SQLite thay cho MySQL')
+
+    def handle(self, *args, **options):
+        base = connections.settings[options['database']]
+        self.stdout.write(f"DB gốc: {base['ENGINE']} {base['NAME']} | {options['threads']} thread x "
+                          f"{options['requests']} request | giả lập mở connection {options['connect_latency']} ms")
+        for mode in options['mode'] or MODES:
+            alias = self._register(base, mode, options)
+            result = self._run(alias, mode, options)
+            self.stdout.write(
+                f"{mode:<10} {result['rps']:>8.0f} req/s | mở {result['opened']:>5} connection "
+                f"({result['opened_per_sec']:.0f}/s) | p50 {result['p50']:.2f} ms | p95 {result['p95']:.2f} ms | "
+                f"lỗi {result['errors']}" + (f" | pool {result['pool']}" if 'pool' in result else '')
+            )
+        self.stdout.write(self.style.SUCCESS('Hoàn tất benchmark'))
+
+    def _register(self, base, mode, options):
+        """Khai báo alias tạm bench_<mode> từ cấu hình gốc"""
+        config = copy.deepcopy(base)
+        plain = PLAIN_ENGINES.get(config['ENGINE'], config['ENGINE'])
+        config['ENGINE'] = plain
+        config['CONN_MAX_AGE'] = 0
+        config['CONN_HEALTH_CHECKS'] = False
+        config.pop('POOL', None)
+        if mode == 'persistent':
+            config['CONN_MAX_AGE'] = 600
+            config['CONN_HEALTH_CHECKS'] = True
+        elif mode == 'pooled':
+            config['ENGINE'] = POOLED_ENGINES[plain]
+            config['POOL'] = {'MAX_SIZE': options['pool_size'], 'TIMEOUT': options['pool_timeout']}
+        alias = f'bench_{mode}'
+        connections.settings[alias] = config
+        return alias
+
+    def _run(self, alias, mode, options):
+        latencies, errors, opened = [], [0], [0]
+        lock = threading.Lock()
+        delay = options['connect_latency'] / 1000
+
+        def open_slowly(open_connection):
+            def wrapper(*args, **kwargs):
+                with lock:
+                    opened[0] += 1
+                if delay:
+                    time.sleep(delay)
+                return open_connection(*args, **kwargs)
+            return wrapper
+
+        def worker():
+            conn = connections[alias]
+            # Đếm/giả lập đúng lần mở connection thật (chế độ pooled: chỉ khi pool phải mở thêm)
+            if mode == 'pooled':
+                conn._open_connection = open_slowly(conn._open_connection)
+            else:
+                conn.get_new_connection = open_slowly(conn.get_new_connection)
+            mine = []
+            for _ in range(options['requests']):
+                started = time.perf_counter()
+                try:
+                    # Giống 1 request: request_started/request_finished đều gọi close_if_unusable_or_obsolete
+                    conn.close_if_unusable_or_obsolete()
+                    with conn.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                        cursor.fetchone()
+                    conn.close_if_unusable_or_obsolete()
+                except OperationalError:
+                    with lock:
+                        errors[0] += 1
+                    continue
+                mine.append((time.perf_counter() - started) * 1000)
+            conn.close()
+            with lock:
+                latencies.extend(mine)
+
+        threads = [threading.Thread(target=worker) for _ in range(options['threads'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        result = {
+            'rps': len(latencies) / elapsed,
+            'opened': opened[0],
+            'opened_per_sec': opened[0] / elapsed,
+            'p50': latencies[len(latencies) // 2] if latencies else 0,
+            'p95': latencies[int(len(latencies) * 0.95)] if latencies else 0,
+            'errors': errors[0],
+        }
+        if mode == 'pooled':
+            pool = get_pool(alias, connections.settings[alias])
+            result['pool'] = pool.stats
+            pool.close_all()
+        return result
@@ -0,0 +1,101 @@
+# management/commands/benchmark_hot_paths.py
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from django.utils import timezone
+from baseapp import benchmarks
+
+#python manage.py benchmark_hot_paths --save-baseline
+#python manage.py benchmark_hot_paths --threshold 0.15
+#python manage.py benchmark_hot_paths --settings=exammanagement.settings_test --case parse_template_docx --questions 500
+
+class Command(BaseCommand):
+    help = ('Micro-benchmark parser docx, import, tạo đề, chấm bài và trang kết quả trên dữ liệu sinh sẵn '
+            '(DB test riêng, không đụng dữ liệu thật); ghi baseline JSON và báo regression vượt ngưỡng')
+
+    def add_arguments(self, parser):
+        defaults = benchmarks.DEFAULT_PARAMS
+        parser.add_argument('--case', choices=benchmarks.CASES, action='append', default=[],
+                            help='Ca cần đo (mặc định tất cả)')
+        parser.add_argument('--questions', type=int, default=defaults['questions'], help='Số câu trong file docx')
+        parser.add_argument('--image-every', type=int, default=defaults['image_every'],
+                            help='Cứ N câu có 1 câu kèm ảnh (0 = không ảnh)')
+        parser.add_argument('--bank', type=int, default=defaults['bank'], help='Số câu trong ngân hàng')
+        parser.add_argument('--exam-questions', type=int, default=defaults['exam_questions'], help='Số câu của đề')
+        parser.add_argument('--sessions', type=int, default=defaults['sessions'], help='Số phiên thi được chấm')
+        parser.add_argument('--results', type=int, default=defaults['results'],
+                            help='Số trang kết quả dựng mỗi lần đo')
+        parser.add_argument('--repeat', type=int, default=defaults['repeat'], help='Số lần đo mỗi ca')
+        parser.add_argument('--seed', type=int, default=defaults['seed'])
+        parser.add_argument('--baseline', default=os.path.join(settings.BASE_DIR, 'benchmark_baseline.json'),
+                            help='File baseline JSON')
+        parser.add_argument('--save-baseline', action='store_true', help='Ghi kết quả lần này làm baseline')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Tỉ lệ chậm hơn/tốn bộ nhớ hơn baseline bị coi là regression (0.2 = 20%%)')
+        parser.add_argument('--output', help='Ghi kết quả JSON ra file')
+        parser.add_argument('--keepdb', action='store_true', help='Giữ DB test giữa các lần chạy (chỉ dữ liệu mới)')
+
+    def handle(self, *args, **options):
+        params = {key: options[key] for key in benchmarks.DEFAULT_PARAMS}
+        if min(params['questions'], params['bank'], params['sessions'], params['repeat']) < 1:
+            raise CommandError('--questions, --bank, --sessions và --repeat phải >= 1')
+        if params['exam_questions'] > params['bank']:
+            raise CommandError('--exam-questions không được lớn hơn --bank')
+        cases = options['case'] or benchmarks.CASES
+
+        # DB test riêng như khi chạy test (test_<tên DB>, replica là MIRROR); cache/ảnh/số liệu cũng tách riêng
+        with tempfile.TemporaryDirectory(prefix='exammanagement-bench-') as media, override_settings(
+                DEBUG=False, MEDIA_ROOT=media, METRICS_DIR=None, AUTH_USER_CACHE_LOCAL=True,
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}):
+            old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'],
+                                         aliases=set(connections), serialized_aliases=set())
+            try:
+                self.stdout.write(f"{'ca':<22}{'min':>10}{'median':>10}{'max':>10}{'peak':>12}")
+                results = benchmarks.run_suite(params, cases, log=self._log)
+                environment = benchmarks.environment()
+            finally:
+                teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+
+        report = {'recorded_at': timezone.now().isoformat(), 'params': params, 'environment': environment,
+                  'results': results}
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+
+        regressions = self._compare(report, options)
+        if options['save_baseline']:
+            with open(options['baseline'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Đã ghi baseline {options['baseline']}"))
+        elif regressions:
+            raise CommandError(f'{len(regressions)} regression vượt ngưỡng {options["threshold"]:.0%}')
+
+    def _log(self, name, result):
+        self.stdout.write(f"{name:<22}{result['min_ms']:>8.1f}ms{result['median_ms']:>8.1f}ms"
+                          f"{result['max_ms']:>8.1f}ms{result['peak_kb']:>9} KB")
+
+    def _compare(self, report, options):
+        try:
+            with open(options['baseline'], encoding='utf-8') as f:
+                baseline = json.load(f)
+        except FileNotFoundError:
+            if not options['save_baseline']:
+                self.stdout.write(f"Chưa có baseline {options['baseline']} (chạy lại với --save-baseline)")
+            return []
+        if baseline.get('params') != report['params']:
+            self.stdout.write(self.style.WARNING('Baseline đo với tham số khác -> không so sánh'))
+            return []
+        if baseline.get('environment') != report['environment']:
+            self.stdout.write(self.style.WARNING('Baseline đo trên môi trường khác (máy/phiên bản/DB), '
+                                                 'so sánh chỉ mang tính tham khảo'))
+        regressions = benchmarks.compare(report['results'], baseline, options['threshold'])
+        for name, key, old, new, ratio in regressions:
+            self.stdout.write(self.style.ERROR(f'REGRESSION {name} {key}: {old} -> {new} (+{ratio:.0%})'))
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(f"Không có regression so với baseline {baseline['recorded_at']}"))
+        return regressions
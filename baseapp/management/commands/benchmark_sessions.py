@@ -0,0 +1,74 @@
+# management/commands/benchmark_sessions.py
+import random
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from baseapp import benchmarks, loadtest, synthetic
+
+#python manage.py benchmark_sessions
+#python manage.py benchmark_sessions --students 50 --answers 40 --engine db --engine cached_db
+
+class Command(BaseCommand):
+    help = ('Đếm truy vấn DB mỗi request (tổng và truy vấn django_session) của luồng loadtest_exam với từng '
+            'SESSION_ENGINE (db / cached_db / signed_cookies), trên DB test riêng')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--engine', choices=benchmarks.SESSION_ENGINES, action='append', default=[],
+                            help='Session engine cần đo (mặc định tất cả)')
+        parser.add_argument('--students', type=int, default=20, help='Số học sinh ảo mỗi engine')
+        parser.add_argument('--answers', type=int, default=20, help='Số lần lưu đáp án mỗi học sinh')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        if min(options['students'], options['answers']) < 1:
+            raise CommandError('--students và --answers phải >= 1')
+        engines = options['engine'] or list(benchmarks.SESSION_ENGINES)
+        rng = random.Random(options['seed'])
+
+        # Băm mật khẩu MD5 cho nhanh (không ảnh hưởng số truy vấn); cache riêng, trống lúc bắt đầu
+        with tempfile.TemporaryDirectory(prefix='exammanagement-bench-') as media, override_settings(
+                DEBUG=False, ALLOWED_HOSTS=['testserver'], MEDIA_ROOT=media, METRICS_DIR=None,
+                PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], AUTH_USER_CACHE_LOCAL=True,
+                CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                    'LOCATION': 'bench'},
+                        'sessions': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                                     'LOCATION': 'bench-sessions'}}):
+            old_config = setup_databases(verbosity=0, interactive=False, aliases=set(connections),
+                                         serialized_aliases=set())
+            try:
+                subject = synthetic.seed_subject('BENCH', 'Benchmark')
+                bank = synthetic.seed_question_bank(subject, options['answers'], rng)
+                usernames = sorted(synthetic.seed_students(options['students'], 'bench12345', prefix='bench'))
+                results = {}
+                for engine in engines:
+                    exam = synthetic.seed_exam(f'BENCH_{engine.upper()}', subject, bank)
+                    results[engine] = benchmarks.session_workload(engine, exam, usernames, 'bench12345',
+                                                                  options['answers'])
+            finally:
+                teardown_databases(old_config, verbosity=0)
+        self._report(engines, results)
+
+    def _report(self, engines, results):
+        """Bảng trung bình truy vấn/request: tổng (đọc phiên + ghi phiên) theo endpoint x engine"""
+        self.stdout.write(f"{'endpoint':<14}" + ''.join(f'{engine:>24}' for engine in engines))
+        for endpoint in loadtest.ENDPOINTS + ('total',):
+            cells = []
+            for engine in engines:
+                rows = results[engine].values() if endpoint == 'total' else [results[engine][endpoint]]
+                requests = sum(row['requests'] for row in rows)
+                per = {key: sum(row[key] for row in rows) / requests
+                       for key in ('queries', 'session_reads', 'session_writes')}
+                cells.append(f"{per['queries']:.2f} ({per['session_reads']:.2f}r+{per['session_writes']:.2f}w)")
+            self.stdout.write(f'{endpoint:<14}' + ''.join(f'{cell:>24}' for cell in cells))
+        if 'db' in engines:
+            db = self._per_request(results['db'])
+            for engine in engines:
+                if engine != 'db':
+                    saved = db - self._per_request(results[engine])
+                    self.stdout.write(self.style.SUCCESS(f'{engine}: ít hơn db {saved:.2f} truy vấn/request'))
+
+    @staticmethod
+    def _per_request(totals):
+        return sum(row['queries'] for row in totals.values()) / sum(row['requests'] for row in totals.values())
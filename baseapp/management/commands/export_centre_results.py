@@ -0,0 +1,24 @@
+# management/commands/export_centre_results.py
+from django.core.management.base import BaseCommand, CommandError
+from baseapp import bundles
+from baseapp.models import Exam
+
+#python manage.py export_centre_results --exam-code K01 --centre HN01
+#python manage.py export_centre_results --exam-code K01 --centre HN01 --output ketqua_HN01_K01.jsonl
+
+class Command(BaseCommand):
+    help = 'Xuất bài làm của 1 đề trên máy chủ điểm thi ra file .jsonl để nạp về trung tâm'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam-code', required=True, help='Mã đề')
+        parser.add_argument('--centre', required=True, help='Mã điểm thi (ghi vào file để đối chiếu)')
+        parser.add_argument('--output', help='File đầu ra (mặc định ketqua_<điểm thi>_<mã đề>.jsonl)')
+
+    def handle(self, *args, **options):
+        exam = Exam.objects.visible().select_related('subject').filter(code=options['exam_code']).first()
+        if exam is None:
+            raise CommandError(f"Không có đề thi {options['exam_code']}")
+        output = options['output'] or f"ketqua_{options['centre']}_{exam.code}.jsonl"
+        with open(output, 'w', encoding='utf-8') as f:
+            count = bundles.write_results(exam, f, options['centre'])
+        self.stdout.write(self.style.SUCCESS(f'Đã xuất {count} bài làm của đề {exam.code} vào {output}'))
@@ -0,0 +1,23 @@
+# management/commands/export_exam_bundle.py
+from django.core.management.base import BaseCommand, CommandError
+from baseapp import bundles
+from baseapp.models import Exam
+
+#python manage.py export_exam_bundle --exam 12
+#python manage.py export_exam_bundle --exam 12 --output goi_de_K01.zip
+
+class Command(BaseCommand):
+    help = 'Xuất gói đề (đề, câu hỏi, phương án, ảnh + checksum) để cài lên máy chủ điểm thi không có mạng'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, required=True, help='ID đề thi')
+        parser.add_argument('--output', help='File ZIP đầu ra (mặc định goi_de_<mã đề>.zip)')
+
+    def handle(self, *args, **options):
+        exam = Exam.objects.visible().select_related('subject').filter(id=options['exam']).first()
+        if exam is None:
+            raise CommandError(f"Không có đề thi id={options['exam']}")
+        output = options['output'] or f'goi_de_{exam.code}.zip'
+        with open(output, 'wb') as f:
+            f.write(bundles.build_bundle(exam))
+        self.stdout.write(self.style.SUCCESS(f'Đã xuất gói đề {exam.code} vào {output}'))
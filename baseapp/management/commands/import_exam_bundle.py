@@ -0,0 +1,24 @@
+# management/commands/import_exam_bundle.py
+from django.core.management.base import BaseCommand, CommandError
+from baseapp import bundles
+
+#python manage.py import_exam_bundle goi_de_K01.zip
+
+class Command(BaseCommand):
+    help = 'Cài gói đề lên máy chủ điểm thi (kiểm tra checksum, giữ nguyên thứ tự câu và nhãn phương án)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('bundle', help='File ZIP gói đề')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['bundle'], 'rb') as f:
+                document, images = bundles.read_bundle(f)
+            exam, created = bundles.install_bundle(document, images)
+        except (OSError, bundles.BundleError) as e:
+            raise CommandError(str(e))
+        if created:
+            self.stdout.write(self.style.SUCCESS(
+                f'Đã cài đề {exam.code} (id={exam.id}, {exam.question_count} câu, {len(images)} ảnh)'))
+        else:
+            self.stdout.write(f'Đề {exam.code} đã có trên máy chủ (id={exam.id}), không cài lại')
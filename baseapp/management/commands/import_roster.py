@@ -0,0 +1,40 @@
+# management/commands/import_roster.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from baseapp import roster
+
+#python manage.py import_roster danh_sach_K68.xlsx
+#python manage.py import_roster danh_sach_K68.csv --workers 8 --reset-passwords
+
+class Command(BaseCommand):
+    help = ('Nhập danh sách học sinh từ file CSV/XLSX (cột MSSV, họ tên, mật khẩu ban đầu): băm mật khẩu song song '
+            'trên mọi nhân CPU, tạo tài khoản theo lô; MSSV đã có thì cập nhật họ tên')
+
+    def add_arguments(self, parser):
+        parser.add_argument('file', help='File .csv (UTF-8) hoặc .xlsx, dòng đầu là tiêu đề')
+        parser.add_argument('--workers', type=int, help='Số process băm mật khẩu (mặc định = số nhân CPU)')
+        parser.add_argument('--batch-size', type=int, default=roster.ROSTER_BATCH_SIZE, help='Số học sinh mỗi lô ghi')
+        parser.add_argument('--reset-passwords', action='store_true',
+                            help='Đặt lại mật khẩu ban đầu cho cả học sinh đã có tài khoản')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['file'], 'rb') as f:
+                records = roster.read_roster(f.read(), options['file'])
+        except (OSError, roster.RosterError) as e:
+            raise CommandError(str(e))
+
+        started = time.monotonic()
+        with roster.hash_pool(options['workers']) as pool:
+            report = roster.import_roster(
+                records, pool, reset_passwords=options['reset_passwords'], batch_size=options['batch_size'],
+                progress=lambda done, total: self.stdout.write(
+                    f'[{time.monotonic() - started:7.1f}s] {done}/{total} học sinh'))
+
+        for number, reason in report.errors:
+            self.stderr.write(f'Dòng {number}: {reason}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Tạo mới {report.created}, cập nhật {report.updated} tài khoản'
+            + (f', đặt lại {report.passwords_reset} mật khẩu' if options['reset_passwords'] else '')
+            + (f', bỏ qua {len(report.errors)} dòng lỗi' if report.errors else '')))
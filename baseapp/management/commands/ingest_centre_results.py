@@ -0,0 +1,30 @@
+# management/commands/ingest_centre_results.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from baseapp import bundles
+
+#python manage.py ingest_centre_results ketqua_HN01_K01.jsonl ketqua_HP02_K01.jsonl
+#python manage.py ingest_centre_results ketqua/*.jsonl --chunk-size 2000
+
+class Command(BaseCommand):
+    help = 'Nạp kết quả thi của các điểm thi (file .jsonl) vào hệ thống: chấm lại, ghi theo lô, chạy lại được'
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+', help='Các file kết quả')
+        parser.add_argument('--chunk-size', type=int, default=bundles.INGEST_CHUNK_SIZE, help='Số bài làm mỗi lô')
+        parser.add_argument('--force', action='store_true',
+                            help='Bỏ qua kiểm tra đề trên máy chủ trùng với đề điểm thi đã dùng')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            report = bundles.ingest_results(options['files'], chunk_size=options['chunk_size'],
+                                            force=options['force'])
+        except (OSError, ValueError, bundles.BundleError) as e:
+            raise CommandError(str(e))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(f'Đã nạp {report} trong {elapsed:.1f} giây'))
+        if report.unknown_students:
+            self.stdout.write(self.style.WARNING(
+                'Tài khoản không tồn tại: ' + ', '.join(sorted(set(report.unknown_students))[:50])))
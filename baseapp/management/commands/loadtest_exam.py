@@ -0,0 +1,87 @@
+# management/commands/loadtest_exam.py
+import json
+import math
+import random
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from baseapp import counters, loadtest, synthetic
+from baseapp.grading import get_exam_paper
+from baseapp.models import Question
+from baseapp.purge import purge_exam
+
+#python manage.py runserver --noreload  (hoặc gunicorn, cùng DB với lệnh này)
+#python manage.py loadtest_exam --students 500 --duration 300 --think-time 5 --output run_v1.json --label v1
+#python manage.py loadtest_exam --base-url http://10.0.0.5:8000 --students 3000 --ramp-up 60 --concurrency 3000
+
+class Command(BaseCommand):
+    help = ('Giả lập buổi thi: tạo đề + học sinh rồi cho N học sinh ảo đăng nhập, làm bài, lưu đáp án '
+            'và nộp bài đồng thời trên server đang chạy; báo cáo độ trễ/lỗi theo endpoint dạng JSON')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help='Địa chỉ server đang chạy')
+        parser.add_argument('--students', type=int, default=200, help='Số học sinh ảo')
+        parser.add_argument('--questions', type=int, default=40, help='Số câu của đề')
+        parser.add_argument('--duration', type=float, default=120, help='Số giây làm bài sau khi vào thi hết')
+        parser.add_argument('--ramp-up', type=float, default=30, help='Học sinh vào thi rải đều trong số giây này')
+        parser.add_argument('--think-time', type=float, default=5, help='Thời gian nghĩ trung bình mỗi câu (giây)')
+        parser.add_argument('--concurrency', type=int, help='Số thread tối đa (mặc định = số học sinh)')
+        parser.add_argument('--password', default='loadtest123', help='Mật khẩu chung của học sinh ảo')
+        parser.add_argument('--seed', type=int, default=1, help='Seed sinh đề và hành vi học sinh')
+        parser.add_argument('--label', default='', help='Nhãn của lần chạy (vd. phiên bản) ghi vào báo cáo')
+        parser.add_argument('--output', help='Ghi báo cáo JSON ra file (mặc định in ra màn hình)')
+        parser.add_argument('--keep-data', action='store_true', help='Giữ lại đề và bài làm sau khi chạy')
+
+    def handle(self, *args, **options):
+        if options['students'] < 1 or options['questions'] < 1:
+            raise CommandError('--students và --questions phải >= 1')
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+
+        subject = synthetic.seed_subject('LOADTEST', 'Chạy thử tải')
+        bank = synthetic.seed_question_bank(subject, options['questions'], rng)
+        minutes = math.ceil((options['ramp_up'] + options['duration']) / 60) + 5   # Không hết giờ giữa chừng
+        exam = synthetic.seed_exam(f"LOADTEST_{now:%m%d%H%M%S}", subject, bank, duration_minutes=minutes)
+        usernames = list(synthetic.seed_students(options['students'], options['password'], prefix='loadtest_'))
+        paper = get_exam_paper(exam.id)
+        items = [(item['id'], [c['id'] for c in item['choices']]) for item in paper['items']]
+        self.stderr.write(f"Đề {exam.code}: {len(items)} câu, {len(usernames)} học sinh -> {options['base_url']}")
+
+        try:
+            report = loadtest.run_load(
+                options['base_url'], exam.id, items, usernames, options['password'], options['duration'],
+                think_time=options['think_time'], ramp_up=options['ramp_up'],
+                concurrency=options['concurrency'], seed=options['seed'],
+            )
+        finally:
+            if not options['keep_data']:
+                exam.deleted_at = timezone.now()
+                exam.save(update_fields=['deleted_at'])
+                purge_exam(exam.id)
+                Question.objects.filter(id__in=[q.id for q, _ in bank]).delete()
+                counters.reconcile()
+
+        report = {
+            'label': options['label'],
+            'started_at': now.isoformat(),
+            'base_url': options['base_url'],
+            'exam': exam.code,
+            'config': {key: options[key] for key in
+                       ('students', 'questions', 'duration', 'ramp_up', 'think_time', 'concurrency', 'seed')},
+            **report,
+        }
+        text = json.dumps(report, ensure_ascii=False, indent=2)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                f.write(text)
+        else:
+            self.stdout.write(text)
+
+        for name, data in report['endpoints'].items():
+            latency = data['latency_ms']
+            self.stderr.write(f"{name:<12} {data['count']:>7} req  {data['throughput_rps']:>8} rps  "
+                              f"lỗi {data['error_rate']:.2%}  p50 {latency['p50']} ms  "
+                              f"p95 {latency['p95']} ms  p99 {latency['p99']} ms")
+        style = self.style.SUCCESS if not report['errors'] else self.style.WARNING
+        self.stderr.write(style(f"{report['completed']}/{report['students']} học sinh nộp bài, "
+                                f"{report['requests']} request, lỗi {report['error_rate']:.2%}"))
@@ -0,0 +1,20 @@
+# management/commands/purge_deleted_exams.py
+from django.core.management.base import BaseCommand
+from baseapp.models import Exam
+from baseapp.purge import purge_exam, CHUNK_SIZE
+
+#python manage.py purge_deleted_exams   (chạy định kỳ bằng cron)
+
+class Command(BaseCommand):
+    help = 'Xoá hẳn các đề thi đã bấm xoá (deleted_at) theo lô nhỏ - tiếp tục các lần xoá nền bị gián đoạn'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help='Số bản ghi mỗi lệnh DELETE')
+
+    def handle(self, *args, **options):
+        pending = Exam.objects.filter(deleted_at__isnull=False).values_list('id', 'code', 'archive_on_delete')
+        for exam_id, code, archive in list(pending):
+            counts = purge_exam(exam_id, archive=archive, chunk_size=options['chunk_size'])
+            self.stdout.write(f'{code}: ' + ', '.join(f'{k}={v}' for k, v in counts.items()))
+
+        self.stdout.write(self.style.SUCCESS('Đã xoá xong các đề thi chờ xoá'))
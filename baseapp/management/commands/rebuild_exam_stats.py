@@ -0,0 +1,22 @@
+# management/commands/rebuild_exam_stats.py
+from django.core.management.base import BaseCommand
+from baseapp.models import Exam, ExamStatistics
+
+#python manage.py rebuild_exam_stats [exam_id ...]
+
+class Command(BaseCommand):
+    help = 'Tính lại thống kê điểm (trung bình, histogram, tỷ lệ đạt) cho các đề thi'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_ids', nargs='*', type=int, help='ID đề thi (bỏ trống = tất cả)')
+
+    def handle(self, *args, **options):
+        exams = Exam.objects.all()
+        if options['exam_ids']:
+            exams = exams.filter(id__in=options['exam_ids'])
+
+        for exam in exams.iterator():
+            stats = ExamStatistics.rebuild(exam)
+            self.stdout.write(f'{exam.code}: {stats.submitted_count} bài nộp, TB {stats.mean_percentage:.1f}%')
+
+        self.stdout.write(self.style.SUCCESS('Đã cập nhật thống kê đề thi'))
@@ -0,0 +1,26 @@
+# management/commands/rebuild_question_search.py
+from django.core.management.base import BaseCommand
+from django.db import connections, transaction
+from baseapp import search
+from baseapp.models import Question
+
+#python manage.py rebuild_question_search
+#python manage.py rebuild_question_search --reindex    (sau khi đổi innodb_ft_min_token_size / bị lệch index FTS5)
+
+class Command(BaseCommand):
+    help = ('Tính lại nội dung tìm kiếm (không dấu) của câu hỏi ghi ngoài Django; '
+            '--reindex: xoá và tạo lại index toàn văn (FULLTEXT/FTS5)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='Alias DB chứa ngân hàng câu hỏi')
+        parser.add_argument('--reindex', action='store_true', help='Tạo lại index toàn văn')
+
+    def handle(self, *args, **options):
+        changed = search.refresh_search_text(Question.objects.using(options['database']))
+        self.stdout.write(f'Đã cập nhật nội dung tìm kiếm của {changed} câu hỏi')
+        if options['reindex']:
+            connection = connections[options['database']]
+            with transaction.atomic(using=options['database']):
+                search.drop_index(connection)
+                search.install_index(connection)
+            self.stdout.write(self.style.SUCCESS(f'Đã tạo lại index tìm kiếm ({search.backend(connection)})'))
@@ -0,0 +1,13 @@
+# management/commands/reconcile_counters.py
+from django.core.management.base import BaseCommand
+from baseapp import counters
+
+#python manage.py reconcile_counters
+
+class Command(BaseCommand):
+    help = 'Đếm lại các bộ đếm của trang quản trị (môn học, câu hỏi, đề thi, lượt đang thi)'
+
+    def handle(self, *args, **options):
+        for name, value in counters.reconcile().items():
+            self.stdout.write(f'{name}: {value}')
+        self.stdout.write(self.style.SUCCESS('Đã đối soát bộ đếm'))
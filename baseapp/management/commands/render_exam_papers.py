@@ -0,0 +1,35 @@
+# management/commands/render_exam_papers.py
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from baseapp import papers
+from baseapp.models import Exam
+
+#python manage.py render_exam_papers --exam 12 --variants 50 --output de_in.zip
+#python manage.py render_exam_papers --exam 12 --variants 50 --print-copy
+
+class Command(BaseCommand):
+    help = 'Dựng đề in (các mã đề .docx theo bố cục Template.docx + đáp án) ra file ZIP'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', type=int, required=True, help='ID đề thi')
+        parser.add_argument('--variants', type=int, default=1, help=f'Số mã đề (tối đa {papers.MAX_VARIANTS})')
+        parser.add_argument('--print-copy', action='store_true', help='Bản phát cho thí sinh: bỏ các dòng đáp án')
+        parser.add_argument('--output', help='File ZIP đầu ra (mặc định de_in_<mã đề>.zip)')
+
+    def handle(self, *args, **options):
+        exam = Exam.objects.visible().select_related('subject').filter(id=options['exam']).first()
+        if exam is None:
+            raise CommandError(f"Không có đề thi id={options['exam']}")
+        variants = min(max(options['variants'], 1), papers.MAX_VARIANTS)
+        output = options['output'] or f'de_in_{exam.code}.zip'
+
+        started = time.perf_counter()
+        job = papers.prepare_job(exam, print_copy=options['print_copy'])
+        with open(output, 'wb') as f:
+            for chunk in papers.stream_papers_zip(job, variants):
+                f.write(chunk)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Đã dựng {variants} mã đề ({len(job["questions"])} câu) vào {output} trong {elapsed:.1f} giây'
+        ))
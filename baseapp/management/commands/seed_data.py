@@ -0,0 +1,84 @@
+# management/commands/seed_data.py
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from baseapp import counters, synthetic
+from baseapp.models import Exam
+
+#python manage.py seed_data                       (mặc định: 20 môn, 100k câu, 2000 đề, 50k học sinh, 200k bài làm)
+#python manage.py seed_data --questions 2000 --exams 50 --students 1000 --sessions-per-exam 200 --prefix demo
+#python manage.py seed_data --settings=exammanagement.settings_test --exams 5000 --sessions-per-exam 400 --seed 7
+
+class Command(BaseCommand):
+    help = ('Sinh dữ liệu giả cỡ production (môn, ngân hàng câu hỏi, đề, học sinh, bài làm) bằng bulk_create theo lô; '
+            'cùng --seed cho cùng dữ liệu. Học sinh <prefix>00001..., mật khẩu chung --password')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--subjects', type=int, default=20, help='Số môn học')
+        parser.add_argument('--questions', type=int, default=100000, help='Tổng số câu hỏi (chia đều các môn)')
+        parser.add_argument('--exams', type=int, default=2000, help='Số đề thi (chia đều các môn)')
+        parser.add_argument('--exam-questions', type=int, default=40, help='Số câu mỗi đề')
+        parser.add_argument('--students', type=int, default=50000, help='Số tài khoản học sinh')
+        parser.add_argument('--sessions-per-exam', type=int, default=100, help='Số bài làm mỗi đề')
+        parser.add_argument('--answered', type=float, default=0.9, help='Tỉ lệ câu được trả lời trong mỗi bài làm')
+        parser.add_argument('--days', type=int, default=180, help='Đề thi rải đều trong số ngày gần đây')
+        parser.add_argument('--password', default='student123', help='Mật khẩu chung của học sinh')
+        parser.add_argument('--prefix', default='seed', help='Tiền tố tài khoản, mã môn, mã đề')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        subjects, exams = options['subjects'], options['exams']
+        per_subject = options['questions'] // max(subjects, 1)
+        if min(subjects, exams, options['students']) < 1 or options['sessions_per_exam'] < 0:
+            raise CommandError('--subjects, --exams, --students phải >= 1, --sessions-per-exam >= 0')
+        if per_subject < options['exam_questions']:
+            raise CommandError(f'Mỗi môn chỉ có {per_subject} câu, không đủ {options["exam_questions"]} câu/đề')
+        if options['sessions_per_exam'] > options['students']:
+            raise CommandError('--sessions-per-exam không được lớn hơn --students')
+        code = options['prefix'].upper()
+        if Exam.objects.filter(code__startswith=f'{code}_').exists():
+            raise CommandError(f"Đã có đề {code}_... (đã seed trước đó) - dùng --prefix khác")
+
+        rng = random.Random(options['seed'])
+        now = timezone.now()
+        started = time.monotonic()
+
+        banks = []
+        for n in range(1, subjects + 1):
+            subject = synthetic.seed_subject(f'{code}{n:03d}', f'Môn {n} ({options["prefix"]})')
+            banks.append((subject, synthetic.seed_question_bank(subject, per_subject, rng)))
+        self._step(started, f'{subjects} môn, {per_subject * subjects} câu hỏi')
+
+        students = synthetic.seed_students(options['students'], options['password'], prefix=options['prefix'])
+        student_ids = [students[name] for name in sorted(students)]
+        self._step(started, f'{len(student_ids)} học sinh')
+
+        sessions = 0
+        for n in range(1, exams + 1):
+            subject, bank = banks[(n - 1) % subjects]
+            start = now - timezone.timedelta(days=rng.uniform(0, options['days']))
+            window = timezone.timedelta(hours=rng.choice((2, 4, 24)))
+            exam = synthetic.seed_exam(
+                f'{code}_{n:06d}', subject, rng.sample(bank, options['exam_questions']),
+                duration_minutes=rng.choice((15, 30, 45, 60, 90)), start_time=start, end_time=start + window,
+            )
+            # Đề đã đóng: bài đã nộp trong khung giờ thi; đề đang mở: học sinh vừa bắt đầu, còn giờ làm bài
+            finished = exam.end_time <= now
+            first = start if finished else max(start, now - timezone.timedelta(minutes=exam.duration_minutes))
+            spread = ((exam.end_time if finished else now) - first).total_seconds()
+            sessions += len(synthetic.seed_sessions(
+                exam, rng.sample(student_ids, options['sessions_per_exam']), rng, answered=options['answered'],
+                started_at=first, spread=spread, submitted=finished))
+            if n % 100 == 0 or n == exams:
+                self._step(started, f'{n}/{exams} đề, {sessions} bài làm')
+
+        counters.reconcile()   # Thống kê đề đã tính lại trong seed_sessions
+        self._step(started, 'bộ đếm')
+        self.stdout.write(self.style.SUCCESS(
+            f"Hoàn tất: tài khoản {options['prefix']}00001..{options['prefix']}{options['students']:05d} "
+            f"/ mật khẩu {options['password']}"))
+
+    def _step(self, started, message):
+        self.stdout.write(f'[{time.monotonic() - started:7.1f}s] {message}')
@@ -0,0 +1,305 @@
+# metrics.py
+# Số liệu vận hành cho Prometheus (GET /metrics, định dạng text 0.0.4):
+# - Histogram thời gian xử lý các đường nóng (lưu đáp án, nộp bài, bắt đầu thi, import đề) và bộ đếm
+# - Mỗi process ghi vào file riêng METRICS_DIR/metrics_<pid>.db qua mmap (1 process ghi 1 file -> không khoá
+#   giữa các process, mỗi lần ghi chỉ là cộng 1 số double); /metrics cộng dồn file của mọi worker.
+#   Gauge (connection đang mượn/đang chờ trong pool) chỉ tính các process còn sống.
+# - Không đặt METRICS_DIR: số liệu chỉ nằm trong bộ nhớ process (runserver 1 process)
+# Xoá thư mục METRICS_DIR mỗi lần khởi động server (vd. gunicorn on_starting) để số đếm bắt đầu lại từ 0.
+# Truy vấn Prometheus:
+#   p95 lưu đáp án:  histogram_quantile(0.95, sum by (le) (rate(exam_save_answer_seconds_bucket[1m])))
+#   bài nộp/giây:    rate(exam_submissions_total[1m])
+import glob
+import hashlib
+import hmac
+import mmap
+import os
+import struct
+import threading
+import time
+from functools import wraps
+
+from django.conf import settings
+
+from . import access
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+IMPORT_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+SAVE_ANSWER = 'exam_save_answer_seconds'
+SUBMIT = 'exam_submit_seconds'
+START = 'exam_start_seconds'
+IMPORT_DOCX = 'import_docx_seconds'
+SAVE_ANSWER_ERRORS = 'exam_save_answer_errors_total'
+SUBMISSIONS = 'exam_submissions_total'
+IMPORTED_QUESTIONS = 'import_docx_questions_total'
+
+_HEADER = struct.Struct('16s')   # Mã bố cục: file của bản triển khai khác (đổi danh sách số liệu) bị bỏ qua
+_SLOT = struct.Struct('d')
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.offset = 0
+
+    @property
+    def size(self):
+        return 1
+
+    def samples(self, values):
+        yield self.name, '', values[self.offset]
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+
+class Histogram(Metric):
+    """Lưu số lần theo từng khoảng (không cộng dồn) + tổng; cộng dồn khi xuất"""
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, buckets):
+        super().__init__(name, help_text)
+        self.buckets = tuple(buckets)
+
+    @property
+    def size(self):
+        return len(self.buckets) + 2   # các khoảng, +Inf, sum
+
+    def slot_for(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                return self.offset + i
+        return self.offset + len(self.buckets)
+
+    def samples(self, values):
+        cumulative = 0
+        for i, bound in enumerate(self.buckets + (float('inf'),)):
+            cumulative += values[self.offset + i]
+            le = '+Inf' if bound == float('inf') else repr(float(bound))
+            yield f'{self.name}_bucket', f'le="{le}"', cumulative
+        yield f'{self.name}_sum', '', values[self.offset + len(self.buckets) + 1]
+        yield f'{self.name}_count', '', cumulative
+
+
+class PoolMetric(Metric):
+    """1 giá trị/alias DB, ghi đè (không cộng) từ pool của process; kind 'gauge' chỉ cộng process còn sống"""
+
+    def __init__(self, name, help_text, kind, read):
+        super().__init__(name, help_text)
+        self.kind = kind
+        self.read = read
+        self.aliases = []
+
+    @property
+    def size(self):
+        return len(self.aliases)
+
+    def samples(self, values):
+        for i, alias in enumerate(self.aliases):
+            yield self.name, f'alias="{alias}"', values[self.offset + i]
+
+
+METRICS = (
+    Histogram(SAVE_ANSWER, 'Thời gian lưu đáp án (autosave)', LATENCY_BUCKETS),
+    Histogram(SUBMIT, 'Thời gian nộp bài', LATENCY_BUCKETS),
+    Histogram(START, 'Thời gian bắt đầu làm bài', LATENCY_BUCKETS),
+    Histogram(IMPORT_DOCX, 'Thời gian import đề từ file docx', IMPORT_BUCKETS),
+    Counter(SAVE_ANSWER_ERRORS, 'Số lần lưu đáp án bị từ chối/lỗi'),
+    Counter(SUBMISSIONS, 'Số bài đã nộp (cả tự nộp khi hết giờ)'),
+    Counter(IMPORTED_QUESTIONS, 'Số câu hỏi đã import'),
+    PoolMetric('db_pool_connections_in_use', 'Connection đang được mượn', 'gauge',
+               lambda pool: pool.usage()[0]),
+    PoolMetric('db_pool_connections_idle', 'Connection nằm chờ trong pool', 'gauge',
+               lambda pool: pool.usage()[1]),
+    PoolMetric('db_pool_waits_total', 'Số lần phải chờ vì hết connection', 'counter',
+               lambda pool: pool.stats['waited']),
+    PoolMetric('db_pool_timeouts_total', 'Số lần chờ connection quá hạn', 'counter',
+               lambda pool: pool.stats['timeouts']),
+)
+_BY_NAME = {metric.name: metric for metric in METRICS}
+
+_layout = None
+_store = None
+_store_lock = threading.Lock()
+
+
+def _get_layout():
+    """Gán vị trí cho từng số liệu (giống nhau ở mọi process cùng cấu hình). Trả về (số ô, mã bố cục)"""
+    global _layout
+    if _layout is None:
+        offset = 0
+        for metric in METRICS:
+            if isinstance(metric, PoolMetric):
+                metric.aliases = sorted(settings.DATABASES)
+            metric.offset = offset
+            offset += metric.size
+        signature = ';'.join(f'{m.name}:{m.size}' for m in METRICS)
+        _layout = offset, hashlib.sha256(signature.encode()).digest()[:_HEADER.size]
+    return _layout
+
+
+def metrics_dir():
+    return getattr(settings, 'METRICS_DIR', None)
+
+
+class _Store:
+    """Các ô số liệu của process hiện tại: mmap file riêng (METRICS_DIR) hoặc bytearray"""
+
+    def __init__(self):
+        size, digest = _get_layout()
+        self.pid = os.getpid()
+        self.size = size
+        length = _HEADER.size + size * _SLOT.size
+        directory = metrics_dir()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            with open(os.path.join(directory, f'metrics_{self.pid}.db'), 'w+b') as f:
+                f.truncate(length)
+                self.buffer = mmap.mmap(f.fileno(), length)
+        else:
+            self.buffer = bytearray(length)
+        _HEADER.pack_into(self.buffer, 0, digest)
+        self.lock = threading.Lock()
+
+    def add(self, slot, value):
+        position = _HEADER.size + slot * _SLOT.size
+        with self.lock:
+            _SLOT.pack_into(self.buffer, position, _SLOT.unpack_from(self.buffer, position)[0] + value)
+
+    def set(self, slot, value):
+        _SLOT.pack_into(self.buffer, _HEADER.size + slot * _SLOT.size, value)
+
+    def values(self):
+        return list(struct.unpack_from(f'{self.size}d', self.buffer, _HEADER.size))
+
+
+def _get_store():
+    global _store
+    store = _store
+    if store is None or store.pid != os.getpid():   # Process con sau fork ghi file của chính nó
+        with _store_lock:
+            if _store is None or _store.pid != os.getpid():
+                _store = _Store()
+            store = _store
+    return store
+
+
+# ===== Ghi =====
+def inc(name, amount=1):
+    store = _get_store()
+    store.add(_BY_NAME[name].offset, amount)
+
+
+def observe(name, seconds):
+    store = _get_store()
+    metric = _BY_NAME[name]
+    store.add(metric.slot_for(seconds), 1)
+    store.add(metric.offset + len(metric.buckets) + 1, seconds)
+
+
+def timed(name, errors=None, method=None):
+    """
+    Decorator cho view: đo thời gian vào histogram name (chỉ request có method này nếu truyền vào);
+    response >= 400 thì cộng bộ đếm errors
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            if method and request.method != method:
+                return view_func(request, *args, **kwargs)
+            start = time.perf_counter()
+            response = view_func(request, *args, **kwargs)
+            observe(name, time.perf_counter() - start)
+            if errors and response.status_code >= 400:
+                inc(errors)
+            record_pools()
+            return response
+        return wrapper
+    return decorator
+
+
+def record_pools():
+    """Ghi trạng thái pool connection (exammanagement/db_backends) của process vào file số liệu"""
+    from exammanagement.db_backends import pools
+    current = {pool.alias: pool for pool in pools()}
+    if not current:
+        return
+    store = _get_store()
+    for metric in METRICS:
+        if isinstance(metric, PoolMetric):
+            for i, alias in enumerate(metric.aliases):
+                if alias in current:
+                    store.set(metric.offset + i, metric.read(current[alias]))
+
+
+# ===== Đọc =====
+def _alive(pid):
+    if os.name == 'nt':   # os.kill trên Windows là dừng process
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def collect():
+    """Giá trị cộng dồn của mọi process: [(metric, [giá trị từng ô])]"""
+    size, digest = _get_layout()
+    record_pools()
+    store = _get_store()
+    totals = store.values()
+    live = list(totals)
+    directory = metrics_dir()
+    if directory:
+        for path in glob.glob(os.path.join(directory, 'metrics_*.db')):
+            try:
+                pid = int(os.path.basename(path)[len('metrics_'):-len('.db')])
+                with open(path, 'rb') as f:
+                    blob = f.read()
+            except (ValueError, OSError):
+                continue
+            if pid == store.pid or len(blob) != _HEADER.size + size * _SLOT.size or blob[:_HEADER.size] != digest:
+                continue
+            values = struct.unpack_from(f'{size}d', blob, _HEADER.size)
+            alive = _alive(pid)
+            for i, value in enumerate(values):
+                totals[i] += value
+                if alive:
+                    live[i] += value
+    return [(metric, live if metric.kind == 'gauge' else totals) for metric in METRICS]
+
+
+def _format(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render(extra=()):
+    """Văn bản định dạng Prometheus; extra: [(tên, kiểu, mô tả, giá trị)] đo lúc scrape"""
+    lines = []
+    for metric, values in collect():
+        lines.append(f'# HELP {metric.name} {metric.help}')
+        lines.append(f'# TYPE {metric.name} {metric.kind}')
+        for sample, labels, value in metric.samples(values):
+            lines.append(f'{sample}{{{labels}}} {_format(value)}' if labels else f'{sample} {_format(value)}')
+    for name, kind, help_text, value in extra:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}', f'{name} {_format(value)}']
+    return '\n'.join(lines) + '\n'
+
+
+def authorized(request):
+    """Máy scrape gửi 'Authorization: Bearer <METRICS_TOKEN>'; người xem trực tiếp cần tài khoản admin"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if token and header.startswith('Bearer ') and hmac.compare_digest(header[len('Bearer '):], token):
+        return True
+    return access.user_role(request.user) == access.ADMIN
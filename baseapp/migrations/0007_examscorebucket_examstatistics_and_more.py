@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('baseapp', '0006_alter_exam_is_active'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExamScoreBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.PositiveSmallIntegerField()),
+                ('count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExamStatistics',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('submitted_count', models.PositiveIntegerField(default=0)),
+                ('pass_count', models.PositiveIntegerField(default=0)),
+                ('sum_percentage', models.FloatField(default=0)),
+                ('sum_sq_percentage', models.FloatField(default=0)),
+                ('min_percentage', models.FloatField(blank=True, null=True)),
+                ('max_percentage', models.FloatField(blank=True, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='studentexamsession',
+            index=models.Index(fields=['exam', 'is_submitted', 'score'], name='session_exam_score_idx'),
+        ),
+        migrations.AddField(
+            model_name='examscorebucket',
+            name='exam',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='score_buckets', to='baseapp.exam'),
+        ),
+        migrations.AddField(
+            model_name='examstatistics',
+            name='exam',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='statistics', to='baseapp.exam'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='examscorebucket',
+            unique_together={('exam', 'bucket')},
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('baseapp', '0007_examscorebucket_examstatistics_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentexamsession',
+            name='result_snapshot',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
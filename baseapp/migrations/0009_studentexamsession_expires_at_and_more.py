@@ -0,0 +1,46 @@
+# Generated by Django 5.2.18 on 2026-10-19 14:57
+
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def fill_expires_at(apps, schema_editor):
+    """Điền expires_at cho các phiên thi cũ = start_time + thời lượng đề"""
+    StudentExamSession = apps.get_model('baseapp', 'StudentExamSession')
+    sessions = StudentExamSession.objects.filter(expires_at__isnull=True).select_related('exam')
+    batch = []
+    for session in sessions.iterator(chunk_size=2000):
+        session.expires_at = session.start_time + timedelta(minutes=session.exam.duration_minutes)
+        batch.append(session)
+        if len(batch) >= 2000:
+            StudentExamSession.objects.bulk_update(batch, ['expires_at'])
+            batch = []
+    if batch:
+        StudentExamSession.objects.bulk_update(batch, ['expires_at'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('baseapp', '0008_studentexamsession_result_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentexamsession',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_expires_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='exam',
+            index=models.Index(fields=['is_active', 'start_time', 'end_time'], name='exam_availability_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='studentexamsession',
+            index=models.Index(fields=['student', 'is_submitted', 'end_time'], name='session_student_history_idx'),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('baseapp', '0010_sitecounter_exam_exam_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='archive_on_delete',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='exam',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-19 15:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('baseapp', '0013_studentexamsession_answer_vector_studentanswerlog'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='examchoice',
+            index=models.Index(fields=['item', 'is_correct'], name='examchoice_item_correct_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='examitem',
+            index=models.Index(fields=['exam', 'order'], name='examitem_exam_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['subject', 'unit', 'level'], name='question_subject_unit_idx'),
+        ),
+    ]
@@ -0,0 +1,86 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:17
+
+import unicodedata
+
+from django.db import migrations, models
+
+# Bản sao cố định của baseapp/search.py lúc tạo migration (fold + DDL index toàn văn):
+# migration không import code hiện hành để đổi/sửa search.py, Question sau này không làm hỏng migrate DB mới.
+FTS_TABLE = 'baseapp_question_fts'
+FULLTEXT_INDEX = 'question_search_ft'
+
+
+def fold(text):
+    text = unicodedata.normalize('NFD', (text or '').replace('đ', 'd').replace('Đ', 'D'))
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    return ' '.join(text.lower().split())
+
+
+def install_index(connection, table):
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {table} ADD FULLTEXT INDEX {FULLTEXT_INDEX} (search_text)')
+        return
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if not cursor.fetchone()[0]:
+            return   # SQLite không có FTS5 -> tìm bằng LIKE
+        cursor.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                       f"search_text, content='{table}', content_rowid='id')")
+        cursor.execute(f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN "
+                       f"INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text); END")
+        cursor.execute(f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN "
+                       f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) "
+                       f"VALUES ('delete', old.id, old.search_text); END")
+        cursor.execute(f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF search_text ON {table} BEGIN "
+                       f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) "
+                       f"VALUES ('delete', old.id, old.search_text); "
+                       f"INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text); END")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_index(connection, table):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(f'ALTER TABLE {table} DROP INDEX {FULLTEXT_INDEX}')
+        elif connection.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def fill_search_text(apps, schema_editor):
+    """Điền search_text cho câu hỏi cũ rồi tạo index toàn văn (FTS5 / FULLTEXT)"""
+    Question = apps.get_model('baseapp', 'Question')
+    batch = []
+    for question in Question.objects.only('id', 'text').iterator(chunk_size=2000):
+        question.search_text = fold(question.text)
+        batch.append(question)
+        if len(batch) >= 2000:
+            Question.objects.bulk_update(batch, ['search_text'])
+            batch = []
+    if batch:
+        Question.objects.bulk_update(batch, ['search_text'])
+    install_index(schema_editor.connection, Question._meta.db_table)
+
+
+def remove_index(apps, schema_editor):
+    drop_index(schema_editor.connection, apps.get_model('baseapp', 'Question')._meta.db_table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('baseapp', '0016_examaccesstoken'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.RunPython(fill_search_text, remove_index, hints={'model_name': 'question'}),
+    ]
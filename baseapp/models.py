@@ -47,9 +47,11 @@
 #     is_correct = models.BooleanField(default=False)
 
 # models.py
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models.functions import Coalesce, Greatest, Least
 from django.contrib.auth.models import User
 from django.utils import timezone
+from . import sharding
 
 class Subject(models.Model):
     name = models.CharField(max_length=200)
@@ -63,8 +65,23 @@ class Question(models.Model):
     image = models.ImageField(upload_to='', blank=True, null=True)
     mark = models.FloatField(default=1.0)
     unit = models.CharField(max_length=120, blank=True)
+    # Nội dung đã bỏ dấu, viết thường cho tìm kiếm toàn văn (baseapp/search.py), tự tính lại khi save()
+    search_text = models.TextField(blank=True, default='', editable=False)
+    class Meta:
+        indexes = [
+            # Ngân hàng câu hỏi: lọc theo môn -> chương -> mức độ
+            models.Index(fields=['subject', 'unit', 'level'], name='question_subject_unit_idx'),
+        ]
     def __str__(self): return self.text[:60]
 
+    def save(self, *args, **kwargs):
+        from .search import fold
+        self.search_text = fold(self.text)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'text' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'search_text'}
+        super().save(*args, **kwargs)
+
 class Choice(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='choices')
     label = models.CharField(max_length=1)  # A-D
@@ -73,6 +90,20 @@ class Choice(models.Model):
     class Meta:
         unique_together = [('question', 'label')]
 
+class ExamQuerySet(models.QuerySet):
+    def visible(self):
+        """Bỏ các đề đã bấm xoá (đang chờ xoá nền)"""
+        return self.filter(deleted_at__isnull=True)
+    
+    def available(self, now=None):
+        """Các đề đang mở (cùng điều kiện với Exam.is_available_now, lọc trong DB)"""
+        now = now or timezone.now()
+        return self.filter(
+            models.Q(start_time__isnull=True) | models.Q(start_time__lte=now),
+            models.Q(end_time__isnull=True) | models.Q(end_time__gte=now),
+            is_active=True, deleted_at__isnull=True,
+        )
+
 class Exam(models.Model):
     code = models.CharField(max_length=20, unique=True)   # mã đề
     subject = models.ForeignKey('Subject', on_delete=models.CASCADE, related_name='exams')
@@ -85,10 +116,25 @@ class Exam(models.Model):
     end_time = models.DateTimeField(null=True, blank=True)    # Thời điểm kết thúc thi
     is_active = models.BooleanField(default=True)            # Kích hoạt đề thi
     
+    # Xoá nền: đề bị ẩn ngay khi bấm xoá, dữ liệu được xoá dần theo lô (baseapp/purge.py)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    archive_on_delete = models.BooleanField(default=False)   # Sao lưu ra file trước khi xoá
+    # Lưu trữ lạnh: bài làm đã chuyển sang ExamAnswerArchive, bảng StudentAnswer không còn dữ liệu của đề
+    archived_at = models.DateTimeField(null=True, blank=True)
+    
+    objects = ExamQuerySet.as_manager()
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['is_active', 'start_time', 'end_time'], name='exam_availability_idx'),
+            # Danh sách đề thi trang quản trị: keyset theo (created_at, id)
+            models.Index(fields=['created_at', 'id'], name='exam_created_idx'),
+        ]
+    
     def is_available_now(self):
         """Kiểm tra đề thi có thể làm bây giờ không"""
         now = timezone.now()
-        if not self.is_active:
+        if not self.is_active or self.deleted_at:
             return False
         if self.start_time and now < self.start_time:
             return False
@@ -103,26 +149,66 @@ class ExamItem(models.Model):
     question = models.ForeignKey('Question', on_delete=models.PROTECT)
     order = models.PositiveIntegerField()
     mix_choices = models.BooleanField(default=False)
+    class Meta:
+        indexes = [
+            # Đề thi luôn đọc câu hỏi theo thứ tự (exam_id, order)
+            models.Index(fields=['exam', 'order'], name='examitem_exam_order_idx'),
+        ]
 
 class ExamChoice(models.Model):
     item = models.ForeignKey(ExamItem, on_delete=models.CASCADE, related_name='choices')
     label = models.CharField(max_length=1)
     text = models.TextField()
     is_correct = models.BooleanField(default=False)
+    class Meta:
+        indexes = [
+            # Tra đáp án đúng của câu (chấm điểm, xem kết quả)
+            models.Index(fields=['item', 'is_correct'], name='examchoice_item_correct_idx'),
+        ]
 
 # NEW: Models cho chức năng thi
+class StudentExamSessionQuerySet(models.QuerySet):
+    def running(self, now=None):
+        """Phiên chưa nộp và còn thời gian (cùng điều kiện với is_time_up, lọc trong DB)"""
+        now = now or timezone.now()
+        return self.filter(
+            models.Q(exam__end_time__isnull=True) | models.Q(exam__end_time__gt=now),
+            is_submitted=False, expires_at__gt=now, exam__deleted_at__isnull=True,
+        )
+
 class StudentExamSession(models.Model):
     """Phiên thi của học sinh"""
-    student = models.ForeignKey(User, on_delete=models.CASCADE)
-    exam = models.ForeignKey(Exam, on_delete=models.CASCADE)
+    # Không tạo ràng buộc FK trong DB: khi chia shard (baseapp/sharding.py) bảng này nằm khác DB với User/Exam
+    student = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False)
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, db_constraint=False)
     start_time = models.DateTimeField(auto_now_add=True)  # Thời điểm bắt đầu làm bài
     end_time = models.DateTimeField(null=True, blank=True)  # Thời điểm nộp bài
+    expires_at = models.DateTimeField(null=True, blank=True)  # Hết giờ làm bài = bắt đầu + thời lượng đề
     is_submitted = models.BooleanField(default=False)
     score = models.FloatField(null=True, blank=True)  # Điểm số
     total_marks = models.FloatField(null=True, blank=True)  # Tổng điểm tối đa
+    # Kết quả từng câu lúc nộp bài: [[exam_item_id, selected_choice_id|null, điểm đạt], ...]
+    result_snapshot = models.JSONField(null=True, blank=True)
+    # Chế độ lưu gọn (EXAM_ANSWER_STORAGE = 'vector'): 1 byte/câu theo thứ tự câu,
+    # 0 = bỏ trống, k = phương án thứ k theo nhãn. NULL = phiên lưu từng dòng StudentAnswer.
+    answer_vector = models.BinaryField(null=True, blank=True)
     
     class Meta:
         unique_together = [('student', 'exam')]  # Mỗi học sinh chỉ làm 1 lần/đề
+        indexes = [
+            # Xếp hạng trong đề: đếm số bài có điểm cao hơn theo index
+            models.Index(fields=['exam', 'is_submitted', 'score'], name='session_exam_score_idx'),
+            # Trang chủ học sinh: phiên đang thi + lịch sử phân trang theo (end_time, id)
+            models.Index(fields=['student', 'is_submitted', 'end_time'], name='session_student_history_idx'),
+        ]
+    
+    objects = StudentExamSessionQuerySet.as_manager()
+    
+    def get_percentage(self):
+        """Tỷ lệ điểm (0-100)"""
+        if not self.total_marks:
+            return 0
+        return round((self.score or 0) / self.total_marks * 100, 1)
     
     def get_remaining_time(self):
         """Tính thời gian còn lại (giây)"""
@@ -130,7 +216,7 @@ class StudentExamSession(models.Model):
             return 0
         
         now = timezone.now()
-        exam_deadline = self.start_time + timezone.timedelta(minutes=self.exam.duration_minutes)
+        exam_deadline = self.expires_at or (self.start_time + timezone.timedelta(minutes=self.exam.duration_minutes))
         
         # Kiểm tra deadline của kỳ thi
         if self.exam.end_time and self.exam.end_time < exam_deadline:
@@ -149,16 +235,202 @@ class StudentExamSession(models.Model):
         """Kiểm tra đã hết giờ chưa"""
         return self.get_remaining_time() <= 0
 
+class ExamStatistics(models.Model):
+    """Thống kê điểm của đề thi - cập nhật dần mỗi lần nộp bài, không cần quét lại các phiên thi"""
+    HISTOGRAM_BUCKETS = 10   # 10 khoảng, mỗi khoảng 10%
+    PASS_PERCENTAGE = 50     # Đạt khi >= 50% số điểm
+    
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, related_name='statistics')
+    submitted_count = models.PositiveIntegerField(default=0)
+    pass_count = models.PositiveIntegerField(default=0)
+    # Moment tích luỹ theo tỷ lệ điểm (%): tổng và tổng bình phương
+    sum_percentage = models.FloatField(default=0)
+    sum_sq_percentage = models.FloatField(default=0)
+    min_percentage = models.FloatField(null=True, blank=True)
+    max_percentage = models.FloatField(null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    @classmethod
+    def bucket_of(cls, percentage):
+        """Chỉ số khoảng histogram của một tỷ lệ điểm (100% thuộc khoảng cuối)"""
+        return min(int(percentage // (100 / cls.HISTOGRAM_BUCKETS)), cls.HISTOGRAM_BUCKETS - 1)
+    
+    @classmethod
+    def record(cls, exam_id, percentage):
+        """Cộng dồn một bài nộp vào thống kê bằng UPDATE nguyên tử (không đọc lại bảng)"""
+        percentage = max(0.0, min(100.0, float(percentage)))
+        passed = 1 if percentage >= cls.PASS_PERCENTAGE else 0
+        stats = cls.objects.filter(exam_id=exam_id)
+        updated = stats.update(
+            submitted_count=models.F('submitted_count') + 1,
+            pass_count=models.F('pass_count') + passed,
+            sum_percentage=models.F('sum_percentage') + percentage,
+            sum_sq_percentage=models.F('sum_sq_percentage') + percentage * percentage,
+            min_percentage=Coalesce(Least('min_percentage', models.Value(percentage)), models.Value(percentage)),
+            max_percentage=Coalesce(Greatest('max_percentage', models.Value(percentage)), models.Value(percentage)),
+            updated_at=timezone.now(),
+        )
+        if not updated:
+            try:
+                with transaction.atomic():
+                    cls.objects.create(
+                        exam_id=exam_id, submitted_count=1, pass_count=passed,
+                        sum_percentage=percentage, sum_sq_percentage=percentage * percentage,
+                        min_percentage=percentage, max_percentage=percentage,
+                    )
+            except IntegrityError:
+                # Phiên khác vừa tạo dòng thống kê -> cộng dồn lại
+                return cls.record(exam_id, percentage)
+        
+        bucket = cls.bucket_of(percentage)
+        if not ExamScoreBucket.objects.filter(exam_id=exam_id, bucket=bucket).update(count=models.F('count') + 1):
+            try:
+                with transaction.atomic():
+                    ExamScoreBucket.objects.create(exam_id=exam_id, bucket=bucket, count=1)
+            except IntegrityError:
+                ExamScoreBucket.objects.filter(exam_id=exam_id, bucket=bucket).update(count=models.F('count') + 1)
+    
+    @classmethod
+    def rebuild(cls, exam):
+        """Tính lại toàn bộ thống kê từ các phiên đã nộp (dùng cho lệnh đối soát)"""
+        with transaction.atomic():
+            cls.objects.filter(exam=exam).delete()
+            ExamScoreBucket.objects.filter(exam=exam).delete()
+            sessions = sharding.sessions(exam.id).filter(exam=exam, is_submitted=True)
+            stats = cls(exam=exam)
+            buckets = [0] * cls.HISTOGRAM_BUCKETS
+            for score, total in sessions.values_list('score', 'total_marks').iterator(chunk_size=2000):
+                pct = max(0.0, min(100.0, (score or 0) / total * 100)) if total else 0.0
+                stats.submitted_count += 1
+                stats.pass_count += 1 if pct >= cls.PASS_PERCENTAGE else 0
+                stats.sum_percentage += pct
+                stats.sum_sq_percentage += pct * pct
+                stats.min_percentage = pct if stats.min_percentage is None else min(stats.min_percentage, pct)
+                stats.max_percentage = pct if stats.max_percentage is None else max(stats.max_percentage, pct)
+                buckets[cls.bucket_of(pct)] += 1
+            if stats.submitted_count:
+                stats.save()
+                ExamScoreBucket.objects.bulk_create([
+                    ExamScoreBucket(exam=exam, bucket=i, count=c) for i, c in enumerate(buckets) if c
+                ])
+        return stats
+    
+    @property
+    def mean_percentage(self):
+        return self.sum_percentage / self.submitted_count if self.submitted_count else 0
+    
+    @property
+    def stddev_percentage(self):
+        if self.submitted_count < 2:
+            return 0
+        n = self.submitted_count
+        var = (self.sum_sq_percentage - self.sum_percentage ** 2 / n) / (n - 1)
+        return max(var, 0) ** 0.5
+    
+    @property
+    def pass_rate(self):
+        return round(self.pass_count / self.submitted_count * 100, 1) if self.submitted_count else 0
+    
+    def get_histogram(self):
+        """Danh sách số bài theo từng khoảng 10%"""
+        counts = [0] * self.HISTOGRAM_BUCKETS
+        for bucket, count in ExamScoreBucket.objects.filter(exam_id=self.exam_id).values_list('bucket', 'count'):
+            counts[bucket] = count
+        return counts
+    
+    def median_percentage(self, histogram=None):
+        """Trung vị ước lượng bằng nội suy tuyến tính trong khoảng histogram"""
+        histogram = histogram if histogram is not None else self.get_histogram()
+        n = sum(histogram)
+        if not n:
+            return 0
+        width = 100 / self.HISTOGRAM_BUCKETS
+        half, seen = n / 2, 0
+        for i, count in enumerate(histogram):
+            if count and seen + count >= half:
+                return round(i * width + (half - seen) / count * width, 1)
+            seen += count
+        return 100
+    
+    def rank_of(self, session):
+        """Thứ hạng của phiên thi trong đề: 1 + số bài có điểm cao hơn (đếm theo index)"""
+        higher = sharding.sessions(self.exam_id).filter(
+            exam_id=self.exam_id, is_submitted=True, score__gt=session.score or 0
+        ).count()
+        return higher + 1
+
+class ExamScoreBucket(models.Model):
+    """Một khoảng histogram điểm của đề thi"""
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='score_buckets')
+    bucket = models.PositiveSmallIntegerField()
+    count = models.PositiveIntegerField(default=0)
+    
+    class Meta:
+        unique_together = [('exam', 'bucket')]
+
 class StudentAnswer(models.Model):
     """Câu trả lời của học sinh"""
     session = models.ForeignKey(StudentExamSession, on_delete=models.CASCADE, related_name='answers')
-    exam_item = models.ForeignKey(ExamItem, on_delete=models.CASCADE)
-    selected_choice = models.ForeignKey(ExamChoice, on_delete=models.CASCADE, null=True, blank=True)
+    exam_item = models.ForeignKey(ExamItem, on_delete=models.CASCADE, db_constraint=False)
+    selected_choice = models.ForeignKey(ExamChoice, on_delete=models.CASCADE, null=True, blank=True,
+                                        db_constraint=False)
     answered_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         unique_together = [('session', 'exam_item')]
 
+class ExamAnswerArchive(models.Model):
+    """
+    Bài làm của đề đã đóng, đóng gói gọn (baseapp/archive.py):
+    mỗi phiên thi 1 mảng byte, 1 byte/câu theo thứ tự ExamItem.order (0 = bỏ trống, k = phương án thứ k theo nhãn)
+    """
+    exam = models.OneToOneField(Exam, on_delete=models.CASCADE, related_name='answer_archive')
+    item_count = models.PositiveIntegerField()
+    session_count = models.PositiveIntegerField()
+    payload = models.BinaryField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+class SiteCounter(models.Model):
+    """Bộ đếm tổng hợp cho trang quản trị (cập nhật qua signal/luồng ghi, đối soát bằng reconcile_counters)"""
+    name = models.CharField(max_length=50, primary_key=True)
+    value = models.BigIntegerField(default=0)
+    
+    def __str__(self): return f"{self.name} = {self.value}"
+
+class StudentAnswerLog(models.Model):
+    """Nhật ký chọn đáp án (chỉ ghi thêm) cho phiên lưu dạng mảng - bật bằng EXAM_ANSWER_AUDIT_LOG"""
+    session = models.ForeignKey(StudentExamSession, on_delete=models.CASCADE, related_name='answer_log')
+    position = models.PositiveSmallIntegerField()      # Vị trí câu trong mảng (0 = câu đầu tiên)
+    choice_index = models.PositiveSmallIntegerField()  # 0 = bỏ chọn, k = phương án thứ k
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class SessionDirectory(models.Model):
+    """
+    Danh bạ phiên thi trên primary, chỉ dùng khi chia shard (EXAM_SHARDS):
+    cấp id phiên thi toàn cục, giữ ràng buộc 1 học sinh/1 đề và cho biết phiên nằm ở shard nào
+    """
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='+')
+    shard = models.CharField(max_length=50)
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        unique_together = [('student', 'exam')]
+
+class ExamAccessToken(models.Model):
+    """
+    Mã vào thi dùng 1 lần của 1 học sinh cho 1 đề (baseapp/tokens.py): giám thị cấp trước, học sinh nhập mã/quét QR
+    là đăng nhập và vào thẳng đề, không băm mật khẩu. Mã = id + HMAC(id), không lưu trong DB; hết hạn lúc exam.end_time
+    """
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='access_tokens')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField(auto_now_add=True)
+    used_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        unique_together = [('exam', 'student')]
+
 # NEW: Profile để phân biệt admin/student
 class UserProfile(models.Model):
     ROLE_CHOICES = [
@@ -0,0 +1,290 @@
+# papers.py
+# Dựng đề in (phòng thi giấy): mỗi mã đề in là 1 file .docx đúng bố cục Template.docx
+# (header Subject/Number of Quiz/..., mỗi câu 1 bảng 2 cột QN= / a. b. c. d. / ANSWER / MARK / UNIT / MIX CHOICES)
+# nên import lại được bằng _parse_template_docx; kèm đáp án từng mã đề (answer_keys.csv), gói trong 1 file ZIP stream.
+# - Khung .docx (styles, settings...) dựng 1 lần; mỗi câu hỏi/phương án dựng sẵn thành đoạn XML,
+#   mỗi mã đề chỉ ghép chuỗi theo thứ tự đã trộn -> không dùng python-docx cho từng mã đề
+# - Ảnh đọc 1 lần, trùng nội dung thì dùng chung 1 part (word/media/<sha256>.ext)
+# - Nhiều mã đề: ghép ở 1 process pool dùng chung cho cả process web (PAPER_RENDER_WORKERS process, tạo lần đầu cần,
+#   khởi động kiểu spawn - không fork worker WSGI đang chạy nhiều thread, giữ connection DB); nhiều request xuất
+#   đề cùng lúc xếp hàng trong pool. File ZIP gửi dần theo thứ tự mã đề
+import csv
+import hashlib
+import io
+import multiprocessing
+import os
+import random
+import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from xml.sax.saxutils import escape
+
+import django
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.utils import timezone
+
+from .exports import ZipStream
+from .models import ExamItem
+
+MAX_VARIANTS = 100
+PARALLEL_MIN_VARIANTS = 4          # Ít mã đề hơn thì dựng ngay trong process hiện tại
+PARALLEL_CHUNK = 4                 # Số mã đề mỗi tác vụ gửi sang pool (job gửi kèm từng tác vụ)
+IMAGE_MAX_WIDTH_EMU = 4572000      # Ảnh rộng tối đa 12,7 cm (1 cm = 360000 EMU)
+PIXEL_EMU = 9525                   # 1 pixel (96 dpi)
+LABELS = 'abcdefghijklmnopqrstuvwxyz'
+
+IMAGE_TYPES = {'.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg', '.gif': 'image/gif',
+               '.bmp': 'image/bmp', '.webp': 'image/webp'}
+_IMAGE_REL = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships/image'
+
+
+# ===== Chuẩn bị (process chính, 1 lần cho mọi mã đề) =====
+def load_exam_source(exam):
+    """Câu hỏi của đề theo thứ tự: [{text, mark, unit, mix, image, choices: [(text, is_correct)]}] - 2 truy vấn"""
+    items = (ExamItem.objects.filter(exam=exam).select_related('question')
+             .prefetch_related('choices').order_by('order'))
+    source = []
+    for item in items:
+        q = item.question
+        source.append({
+            'text': q.text,
+            'mark': q.mark,
+            'unit': q.unit,
+            'mix': item.mix_choices,
+            'image': q.image.name if q.image else '',
+            'choices': [(c.text, c.is_correct) for c in sorted(item.choices.all(), key=lambda c: c.label)],
+        })
+    return source
+
+
+def _skeleton():
+    """Các part cố định của 1 file .docx trống (python-docx) + phần đầu/cuối của document.xml"""
+    from docx import Document
+    buffer = io.BytesIO()
+    Document().save(buffer)
+    with zipfile.ZipFile(buffer) as docx:
+        parts = {name: docx.read(name) for name in docx.namelist() if name != 'docProps/thumbnail.jpeg'}
+    document = parts.pop('word/document.xml').decode()
+    body = document.index('<w:body>') + len('<w:body>')
+    sect = document.index('<w:sectPr')
+    parts['_rels/.rels'] = re.sub(rb'<Relationship [^>]*Target="docProps/thumbnail.jpeg"/>', b'', parts['_rels/.rels'])
+    return parts, document[:body], document[sect:]
+
+
+def _image_parts(source, images=None):
+    """
+    Ảnh của các câu: trùng nội dung -> 1 part. Trả về ({đường dẫn ảnh: (rId, cx, cy)}, [(rId, part, bytes)]).
+    images: {tên: bytes} thay cho đọc từ storage (dữ liệu sinh sẵn)
+    """
+    from PIL import Image
+    refs, media, by_hash = {}, [], {}
+    for name in {q['image'] for q in source if q['image']}:
+        if images is not None:
+            blob = images[name]
+        else:
+            try:
+                with default_storage.open(name, 'rb') as f:
+                    blob = f.read()
+            except OSError:
+                continue   # Mất file ảnh -> vẫn in câu hỏi, không có ảnh
+        ext = os.path.splitext(name)[1].lower()
+        if ext not in IMAGE_TYPES:
+            continue
+        digest = hashlib.sha256(blob).hexdigest()
+        if digest not in by_hash:
+            with Image.open(io.BytesIO(blob)) as img:
+                cx, cy = img.width * PIXEL_EMU, img.height * PIXEL_EMU
+            if cx > IMAGE_MAX_WIDTH_EMU:
+                cx, cy = IMAGE_MAX_WIDTH_EMU, cy * IMAGE_MAX_WIDTH_EMU // cx
+            by_hash[digest] = (f'rIdImg{len(by_hash) + 1}', cx, cy)
+            media.append((by_hash[digest][0], f'word/media/{digest[:16]}{ext}', blob))
+        refs[name] = by_hash[digest]
+    return refs, media
+
+
+def _with_images(parts, media):
+    """Thêm part ảnh, khai báo kiểu file và relationship vào khung"""
+    parts = dict(parts)
+    exts = {os.path.splitext(name)[1] for _, name, _ in media}
+    types = ''.join(f'<Default Extension="{ext[1:]}" ContentType="{IMAGE_TYPES[ext]}"/>'
+                    for ext in sorted(exts) if f'Extension="{ext[1:]}"'.encode() not in parts['[Content_Types].xml'])
+    parts['[Content_Types].xml'] = parts['[Content_Types].xml'].replace(b'<Default ', types.encode() + b'<Default ', 1)
+    rels = ''.join(f'<Relationship Id="{rid}" Type="{_IMAGE_REL}" Target="{name[len("word/"):]}"/>'
+                   for rid, name, _ in media)
+    parts['word/_rels/document.xml.rels'] = parts['word/_rels/document.xml.rels'].replace(
+        b'</Relationships>', rels.encode() + b'</Relationships>')
+    parts.update((name, blob) for _, name, blob in media)
+    return parts
+
+
+def _paragraphs(text):
+    return ''.join(f'<w:p><w:r><w:t xml:space="preserve">{escape(line)}</w:t></w:r></w:p>'
+                   for line in (text or '').split('\n')) or '<w:p/>'
+
+
+def _drawing(rid, cx, cy, number):
+    return (
+        f'<w:p><w:r><w:drawing><wp:inline distT="0" distB="0" distL="0" distR="0">'
+        f'<wp:extent cx="{cx}" cy="{cy}"/><wp:docPr id="{number}" name="Picture {number}"/>'
+        f'<a:graphic xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main">'
+        f'<a:graphicData uri="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+        f'<pic:pic xmlns:pic="http://schemas.openxmlformats.org/drawingml/2006/picture">'
+        f'<pic:nvPicPr><pic:cNvPr id="{number}" name="image{number}"/><pic:cNvPicPr/></pic:nvPicPr>'
+        f'<pic:blipFill><a:blip r:embed="{rid}"/><a:stretch><a:fillRect/></a:stretch></pic:blipFill>'
+        f'<pic:spPr><a:xfrm><a:off x="0" y="0"/><a:ext cx="{cx}" cy="{cy}"/></a:xfrm>'
+        f'<a:prstGeom prst="rect"><a:avLst/></a:prstGeom></pic:spPr></pic:pic>'
+        f'</a:graphicData></a:graphic></wp:inline></w:drawing></w:r></w:p>'
+    )
+
+
+def _row(left, right_xml):
+    return (f'<w:tr><w:tc><w:tcPr><w:tcW w:w="1800" w:type="dxa"/></w:tcPr>{_paragraphs(left)}</w:tc>'
+            f'<w:tc><w:tcPr><w:tcW w:w="6840" w:type="dxa"/></w:tcPr>{right_xml}</w:tc></w:tr>')
+
+
+def prepare_job(exam, lecturer='', print_copy=False):
+    """Dữ liệu dùng chung cho mọi mã đề (gửi sang mỗi worker đúng 1 lần)"""
+    return build_job(load_exam_source(exam), exam.subject.code, exam.code, exam.id, lecturer, print_copy)
+
+
+def build_job(source, subject_code, code, exam_id, lecturer='', print_copy=False, images=None):
+    """Như prepare_job nhưng từ danh sách câu hỏi dạng load_exam_source (vd. đề sinh sẵn cho benchmark)"""
+    image_refs, media = _image_parts(source, images)
+    parts, head, tail = _skeleton()
+    parts = _with_images(parts, media)
+
+    questions = []
+    for number, q in enumerate(source, start=1):
+        stem = _paragraphs(q['text'])
+        if q['image'] in image_refs:
+            stem += _drawing(*image_refs[q['image']], number)
+        questions.append({
+            'stem': stem,
+            'choices': [_paragraphs(text) for text, _ in q['choices']],
+            'correct': [i for i, (_, ok) in enumerate(q['choices']) if ok],
+            'tail': '' if print_copy else (
+                _row('MARK:', _paragraphs(f"{q['mark']:g}")) + _row('UNIT:', _paragraphs(q['unit']))
+                + _row('MIX CHOICES:', _paragraphs('Yes' if q['mix'] else 'No'))
+            ),
+            'mix': q['mix'],
+        })
+    header = {
+        'Subject': subject_code,
+        'Number of Quiz': len(source),
+        'Lecturer': lecturer or '-',
+        'Date': timezone.localdate().strftime('%d-%m-%Y'),
+    }
+    return {'parts': parts, 'head': head, 'tail': tail, 'header': header, 'questions': questions,
+            'code': code, 'exam_id': exam_id, 'print_copy': print_copy}
+
+
+# ===== Dựng từng mã đề (chạy trong worker) =====
+def variant_plan(job, variant):
+    """Thứ tự câu và phương án của mã đề (cố định theo exam_id + số mã đề). Mã đề 1 giữ nguyên thứ tự gốc"""
+    order = [(i, list(range(len(q['choices'])))) for i, q in enumerate(job['questions'])]
+    if variant > 1:
+        rng = random.Random(f"{job['exam_id']}:{variant}")
+        rng.shuffle(order)
+        for i, choice_order in order:
+            if job['questions'][i]['mix']:
+                rng.shuffle(choice_order)
+    return order
+
+
+def render_variant(variant, job):
+    """-> (tên file, nội dung .docx, đáp án ['B', 'A', ...])"""
+    plan = variant_plan(job, variant)
+    code = f"{job['code']}-V{variant:02d}"
+    body = [_paragraphs(f'{key}: {value}') for key, value in job['header'].items()]
+    body.append(_paragraphs(f'Topic code: {code}'))
+    answers = []
+    for number, (i, choice_order) in enumerate(plan, start=1):
+        q = job['questions'][i]
+        rows = [_row(f'QN={number}', q['stem'])]
+        for pos, k in enumerate(choice_order):
+            rows.append(_row(f'{LABELS[pos]}.', q['choices'][k]))
+        answer = next((LABELS[pos].upper() for pos, k in enumerate(choice_order) if k in q['correct']), '')
+        answers.append(answer)
+        if not job['print_copy']:
+            rows.append(_row('ANSWER:', _paragraphs(answer)))
+        body.append('<w:tbl><w:tblPr><w:tblStyle w:val="TableGrid"/><w:tblW w:w="8640" w:type="dxa"/></w:tblPr>'
+                    '<w:tblGrid><w:gridCol w:w="1800"/><w:gridCol w:w="6840"/></w:tblGrid>'
+                    + ''.join(rows) + q['tail'] + '</w:tbl><w:p/>')
+    document = job['head'] + ''.join(body) + job['tail']
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=1) as docx:
+        docx.writestr('word/document.xml', document)
+        for name, data in job['parts'].items():
+            stored = name.startswith('word/media/')   # Ảnh đã nén sẵn
+            docx.writestr(name, data, zipfile.ZIP_STORED if stored else zipfile.ZIP_DEFLATED)
+    return f'{code}.docx', buffer.getvalue(), answers
+
+
+def render_variants(job, variants):
+    """Tác vụ của pool: dựng liên tiếp các mã đề"""
+    return [render_variant(variant, job) for variant in variants]
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _executor():
+    """Process pool dùng chung, tạo lần đầu cần. Worker spawn chạy django.setup() trước khi nhận tác vụ"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            workers = getattr(settings, 'PAPER_RENDER_WORKERS', None) or os.cpu_count()
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+                                        initializer=django.setup)
+        return _pool
+
+
+def _discard(pool):
+    """Pool hỏng (worker bị kill) -> bỏ, lần sau tạo pool mới"""
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _rendered(job, variants):
+    """Các mã đề theo thứ tự 1..variants; nhiều mã đề thì dựng song song ở process pool"""
+    numbers = list(range(1, variants + 1))
+    if variants < PARALLEL_MIN_VARIANTS:
+        for variant in numbers:
+            yield render_variant(variant, job)
+        return
+    pool = _executor()
+    futures = []
+    try:
+        for start in range(0, variants, PARALLEL_CHUNK):
+            futures.append(pool.submit(render_variants, job, numbers[start:start + PARALLEL_CHUNK]))
+        for future in futures:
+            yield from future.result()
+    except BrokenProcessPool:
+        _discard(pool)
+        raise
+    finally:
+        for future in futures:   # Client ngắt giữa chừng -> bỏ các tác vụ chưa chạy
+            future.cancel()
+
+
+def stream_papers_zip(job, variants):
+    """File ZIP gồm các mã đề .docx và answer_keys.csv, gửi dần từng mã đề"""
+    keys = io.StringIO()
+    writer = csv.writer(keys)
+    writer.writerow(['Mã đề', 'Câu', 'Đáp án'])
+    stream = ZipStream()
+    with zipfile.ZipFile(stream, 'w', zipfile.ZIP_STORED) as archive:
+        for filename, content, answers in _rendered(job, variants):
+            archive.writestr(filename, content)   # .docx đã nén, lưu nguyên
+            writer.writerows((filename[:-len('.docx')], n, a) for n, a in enumerate(answers, start=1))
+            yield stream.take()
+        archive.writestr('answer_keys.csv', '\ufeff' + keys.getvalue(), zipfile.ZIP_DEFLATED)
+    yield stream.take()
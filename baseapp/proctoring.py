@@ -0,0 +1,129 @@
+# proctoring.py
+# Số liệu giám sát phòng thi, cộng dồn trong cache tại exam_start / save_answer / exam_submit.
+# Màn hình giám sát chỉ đọc cache nên không quét StudentExamSession/StudentAnswer mỗi lần cập nhật.
+# Cần cache dùng chung giữa các worker (Redis/Memcached) khi chạy nhiều process.
+import time
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils import timezone
+
+from . import sharding
+
+KEY_TTL = 60 * 60 * 12        # Giữ số liệu 12 giờ sau lần cập nhật cuối
+ROSTER_TTL = 60               # Danh sách thí sinh đang thi: đọc lại DB tối đa 1 lần/phút
+SAVE_WINDOW_MINUTES = 10      # Số phút gần nhất hiển thị lượt lưu đáp án
+IDLE_SECONDS = 5 * 60         # Không lưu đáp án quá 5 phút -> cảnh báo
+
+
+def _key(exam_id, name):
+    return f"proctor:{exam_id}:{name}"
+
+
+def _seen_key(session_id):
+    return f"proctor:seen:{session_id}"
+
+
+def _incr(key, delta=1):
+    cache.add(key, 0, KEY_TTL)
+    try:
+        return cache.incr(key, delta)
+    except ValueError:  # key vừa bị xoá/hết hạn giữa add và incr
+        cache.set(key, delta, KEY_TTL)
+        return delta
+
+
+def _minute(ts=None):
+    return int((ts or time.time()) // 60)
+
+
+def _counts_cached(exam_id):
+    """Bộ đếm đã có trong cache chưa; chưa có thì đếm từ DB (đã gồm thay đổi vừa ghi)"""
+    if cache.get(_key(exam_id, 'submitted')) is not None:
+        return True
+    _seed_counts(exam_id)
+    return False
+
+
+def session_started(session):
+    cache.set(_seen_key(session.id), time.time(), KEY_TTL)
+    cache.delete(_key(session.exam_id, 'roster'))
+
+
+def answer_saved(session):
+    now = time.time()
+    _incr(_key(session.exam_id, f'saves:{_minute(now)}'))
+    cache.set(_seen_key(session.id), now, KEY_TTL)
+
+
+def session_submitted(session):
+    if _counts_cached(session.exam_id):
+        _incr(_key(session.exam_id, 'submitted'))
+    cache.delete(_seen_key(session.id))
+    cache.delete(_key(session.exam_id, 'roster'))
+
+
+def _seed_counts(exam_id):
+    """Cache trống (khởi động lại, bị đẩy ra) -> đếm lại một lần từ DB"""
+    submitted = sharding.sessions(exam_id).filter(exam_id=exam_id, is_submitted=True).count()
+    cache.set(_key(exam_id, 'submitted'), submitted, KEY_TTL)
+    return submitted
+
+
+def _roster(exam_id):
+    """
+    Thí sinh đang thi (chưa nộp, chưa hết giờ): [(session_id, username, student_id, expires_at_ts)].
+    Phiên bỏ dở không nộp không còn trong danh sách sau expires_at
+    """
+    roster = cache.get(_key(exam_id, 'roster'))
+    if roster is None:
+        sessions = sharding.sessions(exam_id).filter(exam_id=exam_id, is_submitted=False,
+                                                     expires_at__gt=timezone.now())
+        if sharding.enabled():
+            # Tài khoản ở primary, phiên thi ở shard -> không JOIN được, tra tài khoản bằng truy vấn riêng
+            rows = list(sessions.values_list('id', 'student_id', 'expires_at'))
+            names = {uid: (username, student_id) for uid, username, student_id in User.objects.filter(
+                id__in={user_id for _, user_id, _ in rows}).values_list('id', 'username', 'userprofile__student_id')}
+            rows = [(sid, *names.get(user_id, ('', '')), expires_at) for sid, user_id, expires_at in rows]
+        else:
+            rows = sessions.values_list('id', 'student__username', 'student__userprofile__student_id', 'expires_at')
+        roster = [(sid, username, student_id or '', expires_at.timestamp())
+                  for sid, username, student_id, expires_at in rows]
+        cache.set(_key(exam_id, 'roster'), roster, ROSTER_TTL)
+    return roster
+
+
+def snapshot(exam_id):
+    """Số liệu hiện tại của phòng thi (dùng cho màn hình giám sát)"""
+    now = time.time()
+    minute = _minute(now)
+    minutes = list(range(minute - SAVE_WINDOW_MINUTES + 1, minute + 1))
+    keys = [_key(exam_id, 'submitted')] + [_key(exam_id, f'saves:{m}') for m in minutes]
+    values = cache.get_many(keys)
+    if keys[0] not in values:
+        values[keys[0]] = _seed_counts(exam_id)
+
+    # Đang thi = danh sách thí sinh trừ phiên vừa hết giờ (danh sách cache tối đa ROSTER_TTL giây)
+    roster = [row for row in _roster(exam_id) if row[3] > now]
+    seen = cache.get_many([_seen_key(sid) for sid, *_ in roster])
+    idle = []
+    for sid, username, student_id, expires_at in roster:
+        last = seen.get(_seen_key(sid))
+        if last is None or now - last >= IDLE_SECONDS:
+            idle.append({
+                'session_id': sid,
+                'username': username,
+                'student_id': student_id,
+                'idle_seconds': int(now - last) if last else None,
+            })
+    idle.sort(key=lambda row: -(row['idle_seconds'] or 0))
+
+    saves = [{'minute': m * 60, 'count': values.get(_key(exam_id, f'saves:{m}'), 0)} for m in minutes]
+    return {
+        'active': len(roster),
+        'submitted': values[keys[0]],
+        'saves_per_minute': saves[-2]['count'] if len(saves) > 1 else 0,  # phút gần nhất đã trọn vẹn
+        'saves': saves,
+        'idle': idle,
+        'generated_at': int(now),
+    }
@@ -0,0 +1,140 @@
+# profiling.py
+# Đo từng request (RequestProfilingMiddleware, đặt đầu MIDDLEWARE):
+# - Request được lấy mẫu (REQUEST_PROFILING_SAMPLE_RATE): đếm truy vấn + thời gian DB (execute_wrapper trên
+#   mọi kết nối), thời gian dựng template, thời gian view; trả về header Server-Timing (xem trong tab Network
+#   của trình duyệt) và ghi log các truy vấn tốn thời gian nhất nếu request chậm
+# - Request không lấy mẫu: chỉ đo tổng thời gian (2 lần perf_counter), chậm thì ghi log không kèm truy vấn
+# Log ghi 1 dòng JSON vào logger 'baseapp.profiling' (mức WARNING) để gom/lọc bằng công cụ log.
+# Response stream (xuất file) chạy truy vấn sau khi header đã gửi -> Server-Timing chỉ tính phần trong view.
+import json
+import logging
+import random
+import time
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+from django.template.backends.django import Template as DjangoTemplate
+
+logger = logging.getLogger(__name__)
+
+SQL_LOG_LENGTH = 500
+
+_profile = ContextVar('baseapp_request_profile', default=None)
+
+
+class RequestProfile:
+    """Số liệu của 1 request đang được lấy mẫu"""
+
+    def __init__(self):
+        self.queries = []        # [(giây, sql, alias)]
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.view_start = None
+
+    def execute(self, execute, sql, params, many, context):
+        """execute_wrapper: đo từng câu lệnh SQL"""
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.db_time += elapsed
+            self.queries.append((elapsed, sql, context['connection'].alias))
+
+    def top_queries(self, limit):
+        """Các câu SQL tốn thời gian nhất, gộp câu giống nhau (N+1 hiện thành 1 dòng count lớn)"""
+        grouped = {}
+        for elapsed, sql, alias in self.queries:
+            entry = grouped.setdefault((sql, alias), {'sql': sql[:SQL_LOG_LENGTH], 'db': alias, 'count': 0, 'ms': 0.0})
+            entry['count'] += 1
+            entry['ms'] += elapsed * 1000
+        top = sorted(grouped.values(), key=lambda e: e['ms'], reverse=True)[:limit]
+        for entry in top:
+            entry['ms'] = round(entry['ms'], 2)
+        return top
+
+
+def _timed_render(self, context=None, request=None):
+    profile = _profile.get()
+    if profile is None:
+        return _timed_render.original(self, context, request)
+    start = time.perf_counter()
+    try:
+        return _timed_render.original(self, context, request)
+    finally:
+        profile.template_time += time.perf_counter() - start
+
+
+def _install_template_timer():
+    """Bọc Template.render của backend DTL (1 lần/process); {% include %} không đi qua đây nên không tính 2 lần"""
+    if DjangoTemplate.render is not _timed_render:
+        _timed_render.original = DjangoTemplate.render
+        DjangoTemplate.render = _timed_render
+
+
+class RequestProfilingMiddleware:
+    """Server-Timing + log request chậm. Tắt lấy mẫu (0) thì chi phí chỉ còn 1 lần đo tổng thời gian"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = float(getattr(settings, 'REQUEST_PROFILING_SAMPLE_RATE', 0))
+        self.slow_ms = getattr(settings, 'REQUEST_PROFILING_SLOW_MS', 1000)
+        self.top_queries = getattr(settings, 'REQUEST_PROFILING_TOP_QUERIES', 5)
+        if self.sample_rate:
+            _install_template_timer()
+
+    def __call__(self, request):
+        start = time.perf_counter()
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            response = self.get_response(request)
+            total_ms = (time.perf_counter() - start) * 1000
+            if total_ms >= self.slow_ms:
+                self._log_slow(request, response, {'total_ms': round(total_ms, 2)})
+            return response
+
+        profile = RequestProfile()
+        token = _profile.set(profile)
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(profile.execute))
+                response = self.get_response(request)
+        finally:
+            _profile.reset(token)
+        end = time.perf_counter()
+
+        timings = {
+            'total_ms': round((end - start) * 1000, 2),
+            'view_ms': round((end - profile.view_start) * 1000, 2) if profile.view_start else 0.0,
+            'db_ms': round(profile.db_time * 1000, 2),
+            'template_ms': round(profile.template_time * 1000, 2),
+            'queries': len(profile.queries),
+        }
+        response['Server-Timing'] = (
+            f'db;dur={timings["db_ms"]};desc="{timings["queries"]} queries", '
+            f'tpl;dur={timings["template_ms"]}, view;dur={timings["view_ms"]}, total;dur={timings["total_ms"]}'
+        )
+        if timings['total_ms'] >= self.slow_ms:
+            self._log_slow(request, response, {**timings, 'top_queries': profile.top_queries(self.top_queries)})
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        profile = _profile.get()
+        if profile is not None:
+            profile.view_start = time.perf_counter()
+        return None
+
+    def _log_slow(self, request, response, data):
+        match = getattr(request, 'resolver_match', None)
+        user = getattr(request, 'user', None)
+        logger.warning(json.dumps({
+            'event': 'slow_request',
+            'method': request.method,
+            'path': request.path,
+            'view': match.view_name if match else None,
+            'status': response.status_code,
+            'user': user.username if user is not None and user.is_authenticated else None,
+            **data,
+        }, ensure_ascii=False))
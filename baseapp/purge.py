@@ -0,0 +1,83 @@
+# purge.py
+# Xoá đề thi theo lô nhỏ ở chế độ nền thay vì exam.delete() (cascade nạp mọi bản ghi liên quan vào bộ nhớ).
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connections, transaction
+
+from . import sharding
+from .models import (Exam, ExamItem, ExamChoice, StudentExamSession, StudentAnswer, StudentAnswerLog,
+                     ExamStatistics, ExamScoreBucket, ExamAnswerArchive, SessionDirectory, ExamAccessToken)
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 2000
+
+# Thứ tự xoá: bảng con trước, bảng cha sau. (model, điều kiện lọc theo exam_id)
+EXAM_DEPENDENTS = [
+    (StudentAnswer, 'session__exam_id'),
+    (StudentAnswerLog, 'session__exam_id'),
+    (StudentExamSession, 'exam_id'),
+    (ExamChoice, 'item__exam_id'),
+    (ExamItem, 'exam_id'),
+    (ExamScoreBucket, 'exam_id'),
+    (ExamStatistics, 'exam_id'),
+    (ExamAnswerArchive, 'exam_id'),
+    (SessionDirectory, 'exam_id'),
+    (ExamAccessToken, 'exam_id'),
+]
+
+
+def delete_in_chunks(queryset, chunk_size=CHUNK_SIZE, using='default'):
+    """
+    DELETE thô theo lô khoá chính tăng dần: mỗi lô là 1 câu lệnh + 1 transaction ngắn,
+    không phát signal, không nạp model vào bộ nhớ.
+    """
+    model = queryset.model
+    conn = connections[using]
+    table = conn.ops.quote_name(model._meta.db_table)
+    pk = conn.ops.quote_name(model._meta.pk.column)
+    ids_qs = queryset.using(using).order_by('pk').values_list('pk', flat=True)
+    deleted, last_pk = 0, None
+    while True:
+        batch = ids_qs.filter(pk__gt=last_pk) if last_pk is not None else ids_qs
+        ids = list(batch[:chunk_size])
+        if not ids:
+            return deleted
+        with transaction.atomic(using=using), conn.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {table} WHERE {pk} IN ({', '.join(['%s'] * len(ids))})", ids)
+        deleted += len(ids)
+        last_pk = ids[-1]
+
+
+def purge_exam(exam_id, archive=False, chunk_size=CHUNK_SIZE):
+    """Xoá hẳn một đề thi đã ẩn (deleted_at) cùng dữ liệu liên quan. Chạy lại nhiều lần vẫn an toàn."""
+    if archive:
+        from .archive import export_exam_jsonl
+        if Exam.objects.filter(id=exam_id).exists():
+            logger.info("Đã sao lưu đề %s vào %s", exam_id, export_exam_jsonl(exam_id))
+
+    counts = {}
+    for model, lookup in EXAM_DEPENDENTS:
+        using = sharding.write_alias(exam_id) if sharding.is_sharded_model(model) else 'default'
+        counts[model.__name__] = delete_in_chunks(model.objects.filter(**{lookup: exam_id}), chunk_size, using)
+    counts['Exam'] = delete_in_chunks(Exam.objects.filter(id=exam_id, deleted_at__isnull=False), chunk_size)
+    logger.info("Đã xoá đề %s: %s", exam_id, counts)
+    return counts
+
+
+def purge_exam_in_background(exam_id, archive=False):
+    """Chạy purge_exam ở thread nền sau khi transaction hiện tại commit"""
+    if not getattr(settings, 'EXAM_PURGE_IN_BACKGROUND', True):
+        return  # Để lệnh purge_deleted_exams (cron) xử lý
+
+    def run():
+        try:
+            purge_exam(exam_id, archive=archive)
+        except Exception:
+            logger.exception("Xoá đề %s thất bại, lệnh purge_deleted_exams sẽ xử lý lại", exam_id)
+        finally:
+            connections.close_all()  # Thread riêng mở connection riêng (default + các shard)
+
+    transaction.on_commit(lambda: threading.Thread(target=run, name=f"purge-exam-{exam_id}", daemon=True).start())
@@ -0,0 +1,230 @@
+# roster.py
+# Nhập danh sách học sinh đầu kỳ (lệnh import_roster): file CSV/XLSX cột MSSV, họ tên, mật khẩu ban đầu.
+# - Băm mật khẩu (PBKDF2, vài trăm ms/mật khẩu) chiếm gần hết thời gian -> băm song song ở ProcessPoolExecutor,
+#   tốc độ tăng theo số nhân CPU; mỗi tài khoản vẫn có salt riêng
+# - Ghi theo lô: bulk_create User + UserProfile, học sinh đã có (trùng MSSV) thì cập nhật họ tên bằng bulk_update;
+#   mật khẩu của học sinh đã có chỉ đặt lại khi yêu cầu (reset_passwords), tránh ghi đè mật khẩu đã đổi
+# Tài khoản đăng nhập = MSSV viết thường (như synthetic.seed_students).
+import csv
+import io
+import os
+import re
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from xml.etree import ElementTree
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import access
+from .models import UserProfile
+
+ROSTER_BATCH_SIZE = 2000
+PARALLEL_MIN_PASSWORDS = 16   # Ít mật khẩu hơn thì băm ngay trong process hiện tại
+
+# Tên cột chấp nhận (không phân biệt hoa thường)
+COLUMNS = {
+    'student_id': ('student_id', 'mssv', 'mã sinh viên', 'ma sinh vien', 'mã học sinh'),
+    'name': ('name', 'full_name', 'họ tên', 'họ và tên', 'ho ten'),
+    'password': ('password', 'initial_password', 'mật khẩu', 'mat khau'),
+}
+STUDENT_ID_MAX_LENGTH = UserProfile._meta.get_field('student_id').max_length
+
+_XLSX_NS = {'m': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+_REL_NS = '{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id'
+
+
+class RosterError(Exception):
+    pass
+
+
+@dataclass
+class RosterReport:
+    created: int = 0
+    updated: int = 0
+    passwords_reset: int = 0
+    errors: list = field(default_factory=list)   # [(dòng, lý do)]
+
+
+# ===== Đọc file =====
+def _column_index(ref):
+    """'AB12' -> 27 (cột tính từ 0)"""
+    index = 0
+    for ch in re.match(r'[A-Z]+', ref).group():
+        index = index * 26 + ord(ch) - ord('A') + 1
+    return index - 1
+
+
+def _cell_text(cell, shared):
+    kind = cell.get('t')
+    if kind == 'inlineStr':
+        return ''.join(t.text or '' for t in cell.iterfind('.//m:t', _XLSX_NS))
+    value = cell.findtext('m:v', default='', namespaces=_XLSX_NS)
+    if kind == 's':
+        return shared[int(value)]
+    if kind in (None, 'n') and value:
+        number = float(value)   # MSSV nhập dạng số: 20211234 / 2.0211234E7
+        return str(int(number)) if number.is_integer() else value
+    return value
+
+
+def _xlsx_rows(data):
+    """Các dòng (list chuỗi) của sheet đầu tiên trong file .xlsx"""
+    with zipfile.ZipFile(io.BytesIO(data)) as xlsx:
+        names = set(xlsx.namelist())
+        shared = []
+        if 'xl/sharedStrings.xml' in names:
+            root = ElementTree.fromstring(xlsx.read('xl/sharedStrings.xml'))
+            shared = [''.join(t.text or '' for t in si.iterfind('.//m:t', _XLSX_NS))
+                      for si in root.iterfind('m:si', _XLSX_NS)]
+        workbook = ElementTree.fromstring(xlsx.read('xl/workbook.xml'))
+        rel_id = workbook.find('m:sheets/m:sheet', _XLSX_NS).get(_REL_NS)
+        rels = ElementTree.fromstring(xlsx.read('xl/_rels/workbook.xml.rels'))
+        target = next(rel.get('Target') for rel in rels if rel.get('Id') == rel_id)
+        sheet = ElementTree.fromstring(xlsx.read(target.lstrip('/') if target.startswith('/') else f'xl/{target}'))
+    rows = []
+    for row in sheet.iterfind('m:sheetData/m:row', _XLSX_NS):
+        values = []
+        for position, cell in enumerate(row.iterfind('m:c', _XLSX_NS)):
+            index = _column_index(cell.get('r')) if cell.get('r') else position
+            values.extend([''] * (index - len(values) + 1))
+            values[index] = _cell_text(cell, shared)
+        rows.append(values)
+    return rows
+
+
+def read_roster(data, filename):
+    """
+    Nội dung file CSV (UTF-8, có/không BOM) hoặc XLSX -> [(số dòng, {student_id, name, password})].
+    Dòng đầu là tiêu đề; thiếu cột bắt buộc -> RosterError
+    """
+    if filename.lower().endswith('.xlsx'):
+        try:
+            rows = _xlsx_rows(data)
+        except (zipfile.BadZipFile, KeyError, StopIteration, AttributeError, ElementTree.ParseError) as exc:
+            raise RosterError(f'File XLSX không hợp lệ: {exc}') from exc
+    else:
+        try:
+            rows = list(csv.reader(io.StringIO(data.decode('utf-8-sig'))))
+        except UnicodeDecodeError as exc:
+            raise RosterError('File CSV phải lưu dạng UTF-8') from exc
+    if not rows:
+        raise RosterError('File rỗng')
+
+    header = [(cell or '').strip().lower() for cell in rows[0]]
+    positions = {}
+    for key, aliases in COLUMNS.items():
+        position = next((i for i, name in enumerate(header) if name in aliases), None)
+        if position is None:
+            raise RosterError(f"Thiếu cột {key} (chấp nhận: {', '.join(aliases)})")
+        positions[key] = position
+
+    records = []
+    for number, row in enumerate(rows[1:], start=2):
+        if not any((cell or '').strip() for cell in row):
+            continue
+        records.append((number, {key: (row[i] if i < len(row) else '').strip() for key, i in positions.items()}))
+    return records
+
+
+# ===== Băm mật khẩu =====
+def _init_worker():
+    import django
+    from django.apps import apps
+    if not apps.ready:   # Process mới kiểu spawn (Windows/macOS) chưa nạp Django
+        django.setup()
+
+
+def hash_passwords(passwords, pool=None):
+    """make_password cho từng mật khẩu (salt riêng), giữ thứ tự; có pool thì băm song song"""
+    if pool is None or len(passwords) < PARALLEL_MIN_PASSWORDS:
+        return [make_password(password) for password in passwords]
+    return list(pool.map(make_password, passwords, chunksize=4))
+
+
+def hash_pool(workers=None):
+    """ProcessPoolExecutor dùng cho hash_passwords (workers mặc định = số nhân CPU)"""
+    return ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker)
+
+
+# ===== Ghi =====
+def _split_name(full_name):
+    """'Nguyễn Văn An' -> ('An', 'Nguyễn Văn')"""
+    parts = full_name.split()
+    if not parts:
+        return '', ''
+    return parts[-1][:150], ' '.join(parts[:-1])[:150]
+
+
+def _validate(records, report):
+    """Bỏ dòng lỗi, MSSV trùng trong file thì dòng sau thắng. Trả về {student_id: (số dòng, record)}"""
+    students, usernames = {}, {}
+    for number, record in records:
+        student_id = record['student_id']
+        if not student_id:
+            report.errors.append((number, 'Thiếu MSSV'))
+        elif len(student_id) > STUDENT_ID_MAX_LENGTH or not re.fullmatch(r'[\w.@+-]+', student_id):
+            report.errors.append((number, f'MSSV không hợp lệ: {student_id}'))
+        elif not record['password']:
+            report.errors.append((number, f'{student_id}: thiếu mật khẩu ban đầu'))
+        elif usernames.setdefault(student_id.lower(), student_id) != student_id:
+            report.errors.append((number, f'{student_id}: trùng tên đăng nhập với {usernames[student_id.lower()]}'))
+        else:
+            students[student_id] = (number, record)
+    return students
+
+
+def import_roster(records, pool=None, reset_passwords=False, batch_size=ROSTER_BATCH_SIZE, progress=None):
+    """
+    Tạo/cập nhật tài khoản học sinh theo MSSV. records: kết quả read_roster; pool: hash_pool() để băm song song.
+    Trả về RosterReport
+    """
+    report = RosterReport()
+    students = list(_validate(records, report).items())
+    for start in range(0, len(students), batch_size):
+        _import_batch(dict(students[start:start + batch_size]), pool, reset_passwords, report)
+        if progress:
+            progress(min(start + batch_size, len(students)), len(students))
+    report.errors.sort()
+    return report
+
+
+def _import_batch(students, pool, reset_passwords, report):
+    existing = {profile.student_id: profile.user for profile in
+                UserProfile.objects.filter(student_id__in=students).select_related('user')}
+    new_ids = [sid for sid in students if sid not in existing]
+    # Tài khoản trùng tên đăng nhập nhưng không gắn MSSV này (vd. tài khoản admin) -> báo lỗi, không ghi đè
+    taken = set(User.objects.filter(username__in=[sid.lower() for sid in new_ids]).values_list('username', flat=True))
+    for sid in [sid for sid in new_ids if sid.lower() in taken]:
+        report.errors.append((students[sid][0], f'{sid}: tên đăng nhập {sid.lower()} đã thuộc tài khoản khác'))
+        new_ids.remove(sid)
+
+    to_hash = new_ids + (list(existing) if reset_passwords else [])
+    hashed = dict(zip(to_hash, hash_passwords([students[sid][1]['password'] for sid in to_hash], pool)))
+
+    users = []
+    for sid in new_ids:
+        first_name, last_name = _split_name(students[sid][1]['name'])
+        users.append(User(username=sid.lower(), password=hashed[sid], first_name=first_name, last_name=last_name))
+    changed = []
+    for sid, user in existing.items():
+        first_name, last_name = _split_name(students[sid][1]['name'])
+        if (user.first_name, user.last_name) != (first_name, last_name) or sid in hashed:
+            user.first_name, user.last_name = first_name, last_name
+            if sid in hashed:
+                user.password = hashed[sid]
+            changed.append(user)
+
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        ids = dict(User.objects.filter(username__in=[user.username for user in users]).values_list('username', 'id'))
+        UserProfile.objects.bulk_create([UserProfile(user_id=ids[sid.lower()], role='student', student_id=sid)
+                                         for sid in new_ids])
+        fields = ['first_name', 'last_name'] + (['password'] if reset_passwords else [])
+        User.objects.bulk_update(changed, fields)
+    access.forget_users([user.id for user in changed])   # bulk_update không phát signal
+    report.created += len(users)
+    report.updated += len(changed)
+    report.passwords_reset += len(existing) if reset_passwords else 0
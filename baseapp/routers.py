@@ -0,0 +1,178 @@
+# routers.py
+# Chia tải đọc sang DB replica: chỉ các view/khối lệnh được đánh dấu (use_replica / read_from_replica)
+# mới đọc bảng baseapp từ replica, mọi thao tác ghi, session/user và các view khác vẫn dùng 'default'.
+# Bật bằng cách khai báo DATABASES['replica'] và
+#   DATABASE_ROUTERS = ['baseapp.routers.PrimaryReplicaRouter']
+# Request nào ghi dữ liệu baseapp (bắt đầu/nộp bài, tạo/xoá đề...) thì trình duyệt nhận cookie ký số
+# DB_STICKY_COOKIE (ReplicaStickinessMiddleware): trong REPLICA_STICKY_SECONDS giây sau đó các view
+# đánh dấu vẫn đọc từ primary, nên người dùng luôn thấy ngay dữ liệu mình vừa ghi dù replica trễ.
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from . import sharding
+
+REPLICA_ALIAS = 'replica'
+DB_STICKY_COOKIE = 'db_sticky'
+_STICKY_SALT = 'baseapp.routers.sticky'
+
+_read_alias = ContextVar('baseapp_read_alias', default=None)
+_request_writes = ContextVar('baseapp_request_writes', default=None)  # {'wrote': bool} trong 1 request
+
+
+def replica_alias():
+    """Alias replica nếu đã cấu hình, ngược lại None (mọi truy vấn về 'default')"""
+    alias = getattr(settings, 'REPLICA_DATABASE_ALIAS', REPLICA_ALIAS)
+    return alias if alias in settings.DATABASES else None
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 30)
+
+
+@contextmanager
+def read_from_replica():
+    """Các truy vấn đọc trong khối lệnh đi replica (dùng cho báo cáo, xuất file, lệnh quản trị)"""
+    token = _read_alias.set(replica_alias())
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+@contextmanager
+def read_from_primary():
+    """Ép đọc từ primary bên trong một khối đang dùng replica"""
+    token = _read_alias.set(None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def is_sticky(request):
+    """Request này vừa ghi gần đây (cookie còn hạn) -> phải đọc primary"""
+    return request.get_signed_cookie(DB_STICKY_COOKIE, default=None, salt=_STICKY_SALT,
+                                     max_age=sticky_seconds()) is not None
+
+
+def mark_sticky(response):
+    """Gắn cookie để các request tiếp theo của người dùng đọc primary trong sticky_seconds() giây"""
+    if replica_alias():
+        response.set_signed_cookie(DB_STICKY_COOKIE, '1', salt=_STICKY_SALT, max_age=sticky_seconds(),
+                                   httponly=True, samesite='Lax')
+    return response
+
+
+def use_replica(view_func):
+    """Decorator cho view chỉ đọc: truy vấn đọc đi replica, trừ khi người dùng vừa ghi (cookie sticky)"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if is_sticky(request):
+            return view_func(request, *args, **kwargs)
+        with read_from_replica():
+            return view_func(request, *args, **kwargs)
+    return wrapper
+
+
+class ReplicaStickinessMiddleware:
+    """Gắn cookie sticky cho response của request đã ghi dữ liệu baseapp"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = {'wrote': False}
+        token = _request_writes.set(state)
+        try:
+            response = self.get_response(request)
+            if state['wrote']:
+                mark_sticky(response)
+            return response
+        finally:
+            _request_writes.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """Ghi luôn vào 'default'; đọc vào replica khi đang trong use_replica/read_from_replica"""
+
+    def db_for_read(self, model, **hints):
+        # Chỉ bảng của baseapp; session/user luôn đọc primary (session vừa tạo chưa kịp sang replica)
+        if model._meta.app_label == 'baseapp':
+            return _read_alias.get()
+        return None
+
+    def db_for_write(self, model, **hints):
+        state = _request_writes.get()
+        if state is not None and model._meta.app_label == 'baseapp':
+            state['wrote'] = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replica là bản sao của primary -> object đọc từ 2 nơi vẫn liên kết được với nhau
+        aliases = {DEFAULT_DB_ALIAS, replica_alias()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replica nhận schema/dữ liệu qua cơ chế replication của MySQL
+        if db == replica_alias():
+            return False
+        return None
+
+
+class ShardRouter:
+    """
+    Chia shard bảng bài làm theo đề (EXAM_SHARDS, baseapp/sharding.py): object bài làm ở shard nào thì
+    đọc/ghi ở shard đó, quan hệ sang danh mục (User, Exam, ExamItem...) luôn về primary.
+    Không chia shard -> luôn trả None để PrimaryReplicaRouter quyết định. Đặt trước PrimaryReplicaRouter.
+    """
+
+    def _shard_of(self, instance):
+        """Shard suy ra từ object gợi ý (phiên thi, câu trả lời, đề thi)"""
+        if instance is None:
+            return None
+        if instance._state.db in sharding.shards():
+            return instance._state.db
+        if instance._meta.label_lower == 'baseapp.exam':
+            return sharding.shard_for_exam(instance.pk)
+        if getattr(instance, 'exam_id', None) is not None:
+            return sharding.shard_for_exam(instance.exam_id)
+        if getattr(instance, 'session_id', None) is not None:
+            session = type(instance)._meta.get_field('session').get_cached_value(instance, None)
+            if session is not None:
+                return self._shard_of(session)
+            return sharding.session_alias(instance.session_id)
+        return None
+
+    def _route(self, model, hints):
+        if not sharding.enabled():
+            return None
+        instance = hints.get('instance')
+        if sharding.is_sharded_model(model):
+            return self._shard_of(instance)
+        if instance is not None and instance._state.db in sharding.shards():
+            return DEFAULT_DB_ALIAS  # Danh mục của object nằm trên shard
+        return None
+
+    def db_for_read(self, model, **hints):
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = sharding.shards()
+        if obj1._state.db in aliases or obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Shard chỉ chứa bảng bài làm
+        if db in sharding.shards():
+            return app_label == 'baseapp' and model_name in sharding.SHARDED_MODELS
+        return None
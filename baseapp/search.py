@@ -0,0 +1,186 @@
+# search.py
+# Tìm kiếm toàn văn ngân hàng câu hỏi (trang quản trị Django + trang ngân hàng câu hỏi question_bank).
+# - Question.search_text: nội dung câu hỏi đã bỏ dấu tiếng Việt, viết thường (fold) - gán khi Question.save(),
+#   luồng bulk_create tự gán (synthetic.py); lệnh rebuild_question_search tính lại cho dữ liệu cũ
+# - Index theo DB:
+#     SQLite: bảng ảo FTS5 baseapp_question_fts (external content trỏ vào baseapp_question), trigger giữ đồng bộ
+#             với mọi INSERT/UPDATE/DELETE, kể cả bulk_create và xoá cascade; xếp hạng bm25
+#     MySQL:  FULLTEXT INDEX trên search_text, tìm BOOLEAN MODE, xếp hạng NATURAL LANGUAGE MODE. Tiếng Việt có nhiều
+#             âm tiết 1-2 chữ -> máy chủ MySQL cần innodb_ft_min_token_size=1 và innodb_ft_enable_stopword=OFF
+#             (đặt trong my.cnf trước khi migrate; đổi sau thì chạy rebuild_question_search)
+#     DB khác / SQLite không có FTS5: LIKE trên search_text (quét bảng, chỉ để chạy được)
+# - Từ khoá cũng được fold -> gõ có dấu hay không dấu đều ra cùng kết quả; mỗi từ khớp tiền tố, mọi từ phải có mặt
+import re
+import unicodedata
+
+from django.db import connections, router
+from django.db.models.expressions import RawSQL
+
+from .models import Question
+
+FTS_TABLE = 'baseapp_question_fts'
+FULLTEXT_INDEX = 'question_search_ft'
+PAGE_SIZE = 25
+MAX_TERMS = 10
+MAX_PAGES = 40    # Kết quả xếp hạng phân trang bằng OFFSET -> giới hạn số trang
+
+
+def fold(text):
+    """'Đâu là KHOÁ chính?' -> 'dau la khoa chinh?' (bỏ dấu, đ -> d, viết thường, gộp khoảng trắng)"""
+    text = unicodedata.normalize('NFD', (text or '').replace('đ', 'd').replace('Đ', 'D'))
+    text = ''.join(ch for ch in text if unicodedata.category(ch) != 'Mn')
+    return ' '.join(text.lower().split())
+
+
+def terms(query):
+    return re.findall(r'\w+', fold(query))[:MAX_TERMS]
+
+
+_modes = {}
+
+
+def backend(connection):
+    """'fts5' / 'mysql' / 'like' theo DB và index đã cài (kiểm tra 1 lần cho mỗi DB)"""
+    key = (connection.alias, str(connection.settings_dict['NAME']))
+    if key not in _modes:
+        if connection.vendor == 'mysql':
+            _modes[key] = 'mysql'
+        elif connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+            _modes[key] = 'fts5'
+        else:
+            _modes[key] = 'like'
+    return _modes[key]
+
+
+def _expression(mode, words):
+    if mode == 'fts5':
+        return ' '.join(f'"{word}"*' for word in words)
+    return ' '.join(f'+{word}*' for word in words)
+
+
+# ===== Cài đặt index (migration 0017, lệnh rebuild_question_search) =====
+def install_index(connection, table=None):
+    """Tạo index toàn văn trên cột search_text của bảng câu hỏi (mặc định bảng của Question)"""
+    _modes.clear()
+    table = table or Question._meta.db_table
+    if connection.vendor == 'mysql':
+        with connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {table} ADD FULLTEXT INDEX {FULLTEXT_INDEX} (search_text)')
+        return
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+        if not cursor.fetchone()[0]:
+            return   # SQLite không có FTS5 -> tìm bằng LIKE
+        cursor.execute(f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+                       f"search_text, content='{table}', content_rowid='id')")
+        cursor.execute(f"CREATE TRIGGER {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN "
+                       f"INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text); END")
+        cursor.execute(f"CREATE TRIGGER {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN "
+                       f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) "
+                       f"VALUES ('delete', old.id, old.search_text); END")
+        cursor.execute(f"CREATE TRIGGER {FTS_TABLE}_au AFTER UPDATE OF search_text ON {table} BEGIN "
+                       f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, search_text) "
+                       f"VALUES ('delete', old.id, old.search_text); "
+                       f"INSERT INTO {FTS_TABLE}(rowid, search_text) VALUES (new.id, new.search_text); END")
+        cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def drop_index(connection, table=None):
+    _modes.clear()
+    table = table or Question._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'mysql':
+            cursor.execute(f'ALTER TABLE {table} DROP INDEX {FULLTEXT_INDEX}')
+        elif connection.vendor == 'sqlite':
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}')
+            cursor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+def refresh_search_text(queryset=None, batch_size=2000):
+    """Tính lại search_text (vd. dữ liệu ghi bằng SQL thô). Trả về số câu đã cập nhật"""
+    queryset = (queryset if queryset is not None else Question.objects.all()).order_by('id')
+    manager = Question.objects.db_manager(queryset.db)
+    changed, batch = 0, []
+    for question in queryset.only('id', 'text', 'search_text').iterator(chunk_size=batch_size):
+        folded = fold(question.text)
+        if question.search_text != folded:
+            question.search_text = folded
+            batch.append(question)
+        if len(batch) >= batch_size:
+            manager.bulk_update(batch, ['search_text'])
+            changed, batch = changed + len(batch), []
+    if batch:
+        manager.bulk_update(batch, ['search_text'])
+    return changed + len(batch)
+
+
+# ===== Tìm kiếm =====
+def filter_questions(queryset, query):
+    """Thu hẹp queryset về các câu khớp từ khoá (không xếp hạng) - dùng cho trang quản trị Django"""
+    words = terms(query)
+    if not words:
+        return queryset
+    table = Question._meta.db_table
+    mode = backend(connections[queryset.db])
+    if mode == 'fts5':
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [_expression(mode, words)]))
+    if mode == 'mysql':
+        return queryset.filter(id__in=RawSQL(
+            f'SELECT id FROM {table} WHERE MATCH(search_text) AGAINST (%s IN BOOLEAN MODE)',
+            [_expression(mode, words)]))
+    for word in words:
+        queryset = queryset.filter(search_text__contains=word)
+    return queryset
+
+
+def search_questions(query, subject_id=None, unit=None, level=None, page=1, before=None):
+    """
+    Câu hỏi lọc theo môn/chương/mức độ. Có từ khoá: xếp theo độ liên quan (rồi id), phân trang theo số trang
+    (tối đa MAX_PAGES); không có: mới nhất trước, phân trang keyset theo id (before).
+    Trả về (câu hỏi của trang, tham số trang sau hoặc None)
+    """
+    words = terms(query)
+    table = Question._meta.db_table
+    alias = router.db_for_read(Question)
+    mode = backend(connections[alias])
+    filters = {'subject_id': subject_id, 'unit': unit, 'level': level}
+    filters = {column: value for column, value in filters.items() if value not in (None, '')}
+
+    if not words:
+        questions = Question.objects.using(alias).filter(**filters)
+        if before:
+            questions = questions.filter(id__lt=before)
+        ids = list(questions.order_by('-id').values_list('id', flat=True)[:PAGE_SIZE + 1])
+        next_page = {'before': ids[PAGE_SIZE - 1]} if len(ids) > PAGE_SIZE else None
+    else:
+        page = min(max(page, 1), MAX_PAGES)
+        offset = (page - 1) * PAGE_SIZE
+        where = ''.join(f' AND q.{column} = %s' for column in filters)
+        params = list(filters.values())
+        if mode == 'fts5':
+            sql = (f'SELECT q.id FROM {FTS_TABLE} JOIN {table} q ON q.id = {FTS_TABLE}.rowid '
+                   f'WHERE {FTS_TABLE} MATCH %s{where} ORDER BY {FTS_TABLE}.rank, q.id LIMIT %s OFFSET %s')
+            params = [_expression(mode, words)] + params + [PAGE_SIZE + 1, offset]
+        elif mode == 'mysql':
+            sql = (f'SELECT q.id FROM {table} q WHERE MATCH(q.search_text) AGAINST (%s IN BOOLEAN MODE){where} '
+                   f'ORDER BY MATCH(q.search_text) AGAINST (%s IN NATURAL LANGUAGE MODE) DESC, q.id '
+                   f'LIMIT %s OFFSET %s')
+            params = [_expression(mode, words)] + params + [' '.join(words), PAGE_SIZE + 1, offset]
+        else:
+            sql = None
+        if sql:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(sql, params)
+                ids = [row[0] for row in cursor.fetchall()]
+        else:
+            questions = filter_questions(Question.objects.using(alias).filter(**filters), query)
+            ids = list(questions.order_by('-id').values_list('id', flat=True)[offset:offset + PAGE_SIZE + 1])
+        next_page = {'page': page + 1} if len(ids) > PAGE_SIZE and page < MAX_PAGES else None
+
+    by_id = Question.objects.using(alias).select_related('subject').prefetch_related('choices').in_bulk(
+        ids[:PAGE_SIZE])
+    return [by_id[pk] for pk in ids[:PAGE_SIZE] if pk in by_id], next_page
@@ -0,0 +1,132 @@
+# sharding.py
+# Chia bảng bài làm (StudentExamSession, StudentAnswer, StudentAnswerLog) theo đề thi ra nhiều DB.
+# Bật bằng EXAM_SHARDS = ['shard0', 'shard1', ...] (các alias trong DATABASES); mặc định [] = mọi thứ ở 'default'.
+# - Mỗi đề nằm cố định ở 1 shard: crc32(exam_id) % số shard (không phụ thuộc process/lần khởi động)
+# - SessionDirectory (trên primary) cấp id phiên thi toàn cục, giữ ràng buộc 1 học sinh/1 đề
+#   và cho biết phiên thi nằm ở shard nào
+# - Danh mục (Subject, Question, Exam, User...) luôn ở primary. Không JOIN được từ shard sang danh mục
+#   -> dùng with_exam() (prefetch khi chia shard) thay cho select_related('exam')
+# Đổi danh sách shard làm đổi vị trí của đề -> chỉ đổi khi các shard chưa có dữ liệu.
+import zlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+SHARDED_MODELS = ('studentexamsession', 'studentanswer', 'studentanswerlog')
+DIRECTORY_CACHE_TIMEOUT = 60 * 60 * 24   # Vị trí phiên thi không bao giờ đổi
+
+
+def shards():
+    return list(getattr(settings, 'EXAM_SHARDS', None) or [])
+
+
+def enabled():
+    return bool(shards())
+
+
+def is_sharded_model(model):
+    return model._meta.app_label == 'baseapp' and model._meta.model_name in SHARDED_MODELS
+
+
+def shard_for_exam(exam_id):
+    """Alias shard chứa bài làm của đề; None khi không chia shard"""
+    aliases = shards()
+    if not aliases or exam_id is None:
+        return None
+    return aliases[zlib.crc32(str(exam_id).encode()) % len(aliases)]
+
+
+def write_alias(exam_id):
+    """DB để ghi bài làm của đề (không bao giờ là replica)"""
+    return shard_for_exam(exam_id) or DEFAULT_DB_ALIAS
+
+
+def sessions(exam_id):
+    """StudentExamSession của 1 đề, đúng shard (không chia shard: để router chọn default/replica)"""
+    from .models import StudentExamSession
+    return StudentExamSession.objects.using(shard_for_exam(exam_id))
+
+
+def answers(exam_id):
+    from .models import StudentAnswer
+    return StudentAnswer.objects.using(shard_for_exam(exam_id))
+
+
+def session_alias(session_id):
+    """Shard chứa phiên thi (tra SessionDirectory, có cache); None khi không chia shard hoặc không tìm thấy"""
+    if not enabled():
+        return None
+    from .models import SessionDirectory
+    key = f"session_shard:{session_id}"
+    alias = cache.get(key)
+    if alias is None:
+        alias = SessionDirectory.objects.filter(id=session_id).values_list('shard', flat=True).first()
+        if alias is None:
+            return None
+        cache.set(key, alias, DIRECTORY_CACHE_TIMEOUT)
+    return alias
+
+
+def with_exam(queryset, *lookups):
+    """select_related các quan hệ danh mục; khi chia shard thì prefetch (truy vấn riêng trên primary)"""
+    if enabled():
+        return queryset.prefetch_related(*lookups)
+    return queryset.select_related(*lookups)
+
+
+def has_session(student, exam):
+    """Học sinh đã bắt đầu đề này chưa"""
+    if enabled():
+        from .models import SessionDirectory
+        return SessionDirectory.objects.filter(student=student, exam=exam).exists()
+    return sessions(exam.id).filter(student=student, exam=exam).exists()
+
+
+def started_exam_ids(student):
+    """Queryset exam_id các đề học sinh đã bắt đầu (dùng làm subquery trên DB danh mục)"""
+    if enabled():
+        from .models import SessionDirectory
+        return SessionDirectory.objects.filter(student=student).values('exam_id')
+    from .models import StudentExamSession
+    return StudentExamSession.objects.filter(student=student).values('exam_id')
+
+
+def create_session(student, exam, **fields):
+    """
+    Tạo phiên thi. Khi chia shard: cấp id trong SessionDirectory trước (unique student+exam),
+    rồi tạo phiên với đúng id đó trên shard của đề. Trùng -> IntegrityError như khi không chia shard.
+    """
+    from .models import StudentExamSession, SessionDirectory
+    alias = shard_for_exam(exam.id)
+    if alias is None:
+        return StudentExamSession.objects.create(student=student, exam=exam, **fields)
+    entry = SessionDirectory.objects.create(student=student, exam=exam, shard=alias)
+    try:
+        session = StudentExamSession.objects.using(alias).create(id=entry.id, student=student, exam=exam, **fields)
+    except Exception:
+        SessionDirectory.objects.filter(id=entry.id).delete()
+        raise
+    cache.set(f"session_shard:{entry.id}", alias, DIRECTORY_CACHE_TIMEOUT)
+    return session
+
+
+def fan_out(build):
+    """Gọi build(alias) trên từng shard (không chia shard: 1 lần với alias None) và gộp kết quả"""
+    results = []
+    for alias in shards() or [None]:
+        results.extend(build(alias))
+    return results
+
+
+def count_unsubmitted():
+    """Số phiên chưa nộp của các đề chưa xoá (nguồn đối soát bộ đếm active_attempts)"""
+    from .models import Exam, StudentExamSession
+    if not enabled():
+        return StudentExamSession.objects.filter(is_submitted=False, exam__deleted_at__isnull=True).count()
+    # Đề đã xoá (đang chờ dọn) luôn ít -> loại trừ theo danh sách id
+    deleted_ids = list(Exam.objects.filter(deleted_at__isnull=False).values_list('id', flat=True))
+    return sum(fan_out(lambda alias: [
+        StudentExamSession.objects.using(alias).filter(is_submitted=False)
+        .exclude(exam_id__in=deleted_ids).count()
+    ]))
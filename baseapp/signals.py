@@ -0,0 +1,49 @@
+# signals.py
+from django.contrib.auth.models import User
+from django.db.models.signals import post_save, post_delete
+
+from . import access, counters, grading
+from .models import Subject, Question, Exam, UserProfile
+
+# Luồng tạo hàng loạt (bulk_create) không phát signal -> tự gọi counters.incr
+COUNTED_MODELS = {
+    Subject: counters.SUBJECTS,
+    Question: counters.QUESTIONS,
+    Exam: counters.EXAMS,
+}
+
+
+def count_created(sender, instance, created, **kwargs):
+    if created:
+        counters.incr(COUNTED_MODELS[sender], 1)
+
+
+def count_deleted(sender, instance, **kwargs):
+    counters.incr(COUNTED_MODELS[sender], -1)
+
+
+# Đăng ký theo từng model: signal không gắn sender sẽ làm mọi lệnh xoá cascade mất fast-delete
+for model in COUNTED_MODELS:
+    post_save.connect(count_created, sender=model, dispatch_uid=f'count_created_{model.__name__}')
+    post_delete.connect(count_deleted, sender=model, dispatch_uid=f'count_deleted_{model.__name__}')
+
+
+# User/UserProfile thay đổi (mật khẩu, is_active, role...) -> xoá bản cache của access.CachedModelBackend
+def forget_cached_user(sender, instance, **kwargs):
+    access.forget_user(instance.pk if sender is User else instance.user_id)
+
+
+for model in (User, UserProfile):
+    post_save.connect(forget_cached_user, sender=model, dispatch_uid=f'forget_saved_{model.__name__}')
+    post_delete.connect(forget_cached_user, sender=model, dispatch_uid=f'forget_deleted_{model.__name__}')
+
+
+# Sửa câu hỏi (vd. trong trang quản trị Django) -> đề đã dựng trong cache (grading.get_exam_paper) của các đề dùng
+# câu đó phải dựng lại, nếu không chấm bài/result_snapshot vẫn theo nội dung, điểm cũ.
+# Phương án trong đề là bản sao ExamChoice lúc tạo đề nên sửa Choice của ngân hàng câu hỏi không đổi đề.
+def forget_exam_papers(sender, instance, created, **kwargs):
+    if not created:
+        grading.invalidate_question_papers(instance.pk)
+
+
+post_save.connect(forget_exam_papers, sender=Question, dispatch_uid='forget_exam_papers_Question')
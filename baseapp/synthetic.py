@@ -0,0 +1,198 @@
+# synthetic.py
+# Sinh dữ liệu giả số lượng lớn cho chạy thử tải / benchmark / seed_data: mọi bảng ghi bằng bulk_create theo lô
+# (câu trả lời: INSERT executemany như bundles.insert_answers),
+# mật khẩu băm 1 lần rồi dùng chung cho mọi tài khoản, nội dung sinh từ random.Random(seed) nên
+# cùng seed cho cùng dữ liệu. Không phát signal -> bộ đếm trang chủ cần đối soát lại (reconcile_counters);
+# thống kê điểm của đề (ExamStatistics) do seed_sessions(submitted=True) tự tính lại.
+import io
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.db import connections, router, transaction
+from django.db.models import DateTimeField, ExpressionWrapper, F, Max
+from django.utils import timezone
+
+from . import papers, sharding
+from .bundles import insert_answers
+from .grading import encode_vector, get_exam_paper, grade_answers
+from .models import (Choice, Exam, ExamChoice, ExamItem, ExamStatistics, Question, SessionDirectory, StudentExamSession,
+                     Subject, UserProfile)
+from .search import fold
+
+BATCH_SIZE = 2000
+LABELS = 'ABCDEFGH'
+WORDS = ('dữ liệu', 'hàm', 'biến', 'vòng lặp', 'đối tượng', 'lớp', 'mảng', 'chuỗi', 'truy vấn', 'bảng',
+         'khoá chính', 'chỉ mục', 'giao dịch', 'luồng', 'tiến trình', 'bộ nhớ', 'con trỏ', 'đệ quy')
+
+
+def batched(items, size=BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def bulk_insert(model, objs, batch_size=BATCH_SIZE):
+    """
+    bulk_create theo lô và gán id cho từng object. MySQL không trả id từ INSERT nhiều dòng -> đọc lại các id
+    mới theo thứ tự tăng dần (id của 1 câu INSERT liên tiếp) - chỉ dùng khi không có ai khác ghi vào bảng.
+    """
+    returns_ids = connections[router.db_for_write(model)].features.can_return_rows_from_bulk_insert
+    for chunk in batched(objs, batch_size):
+        if returns_ids:
+            model.objects.bulk_create(chunk)
+            continue
+        last_id = model.objects.aggregate(last=Max('id'))['last'] or 0
+        model.objects.bulk_create(chunk)
+        ids = model.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:len(chunk)]
+        for obj, pk in zip(chunk, ids):
+            obj.id = pk
+    return objs
+
+
+def sentence(rng, words=12):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def seed_subject(code, name):
+    return Subject.objects.get_or_create(code=code, defaults={'name': name})[0]
+
+
+def seed_question_bank(subject, count, rng, choices=4, units=10):
+    """count câu hỏi (mỗi câu `choices` phương án, 1 đáp án đúng). Trả về [(question, [choice...])]"""
+    questions = [
+        Question(subject=subject, text=f'{sentence(rng)} ({subject.code}-{i})?', mark=1.0,
+                 level=rng.choice(('easy', 'medium', 'hard')), unit=f'Chương {i % units + 1}')
+        for i in range(count)
+    ]
+    for question in questions:   # bulk_create không gọi save()
+        question.search_text = fold(question.text)
+    bulk_insert(Question, questions)
+    bank = []
+    rows = []
+    for question in questions:
+        correct = rng.randrange(choices)
+        options = [Choice(question=question, label=LABELS[k], text=sentence(rng, 5), is_correct=(k == correct))
+                   for k in range(choices)]
+        bank.append((question, options))
+        rows.extend(options)
+    for chunk in batched(rows):
+        Choice.objects.bulk_create(chunk)
+    return bank
+
+
+def seed_exam(code, subject, bank, duration_minutes=60, **fields):
+    """Đề gồm các câu của bank theo thứ tự, phương án giữ nguyên nhãn. Trả về đề"""
+    exam = Exam.objects.create(code=code, subject=subject, duration_minutes=duration_minutes,
+                               question_count=len(bank), **fields)
+    items = bulk_insert(ExamItem, [ExamItem(exam=exam, question=q, order=n) for n, (q, _) in enumerate(bank, 1)])
+    rows = [ExamChoice(item=item, label=c.label, text=c.text, is_correct=c.is_correct)
+            for item, (_, options) in zip(items, bank) for c in options]
+    for chunk in batched(rows):
+        ExamChoice.objects.bulk_create(chunk)
+    return exam
+
+
+def seed_students(count, password, prefix='sv', start=0):
+    """
+    count tài khoản học sinh prefix00001... (đã có thì giữ nguyên) + UserProfile, mật khẩu băm 1 lần.
+    Trả về {username: user_id}
+    """
+    hashed = make_password(password)
+    usernames = [f'{prefix}{n:05d}' for n in range(start + 1, start + count + 1)]
+    ids = {}
+    for chunk in batched(usernames):
+        User.objects.bulk_create([User(username=name, password=hashed) for name in chunk], ignore_conflicts=True)
+        created = dict(User.objects.filter(username__in=chunk).values_list('username', 'id'))
+        UserProfile.objects.bulk_create([
+            UserProfile(user_id=created[name], role='student', student_id=name.upper()) for name in chunk
+        ], ignore_conflicts=True)
+        ids.update(created)
+    return ids
+
+
+def image_png(rng, width=240, height=160):
+    """Ảnh PNG nhiễu ngẫu nhiên (nén kém như ảnh chụp thật)"""
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', (width, height), rng.randbytes(width * height * 3)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def template_docx(count, rng, subject_code='BENCH', topic_code='T01', image_every=5, choices=4):
+    """
+    File .docx đúng bố cục Template.docx (dựng bằng papers): count câu, cứ image_every câu có 1 câu kèm ảnh
+    (0 = không ảnh), khoảng 1/3 số câu trộn phương án. Topic code trong file là '<topic_code>-V01'
+    """
+    images = {}
+    source = []
+    for i in range(count):
+        image = ''
+        if image_every and i % image_every == 0:
+            image = f'q{i + 1}.png'
+            images[image] = image_png(rng)
+        correct = rng.randrange(choices)
+        source.append({
+            'text': f'{sentence(rng)} ({i + 1})?', 'mark': 1.0, 'unit': f'Chương {i % 10 + 1}',
+            'mix': i % 3 == 0, 'image': image,
+            'choices': [(sentence(rng, 5), k == correct) for k in range(choices)],
+        })
+    job = papers.build_job(source, subject_code, topic_code, 0, images=images)
+    return papers.render_variant(1, job)[1]
+
+
+def seed_sessions(exam, student_ids, rng, answered=0.9, started_at=None, spread=0, submitted=False):
+    """
+    Ma trận phiên thi x câu trả lời: mỗi học sinh 1 phiên của đề, trả lời ngẫu nhiên khoảng answered số câu -
+    dòng StudentAnswer hoặc mảng đáp án tuỳ EXAM_ANSWER_STORAGE, đúng shard của đề.
+    started_at: giờ bắt đầu (mặc định bây giờ), mỗi phiên lệch ngẫu nhiên thêm tối đa spread giây;
+    submitted: bài đã nộp và chấm (điểm + snapshot) rồi tính lại ExamStatistics của đề, ngược lại phiên đang làm.
+    Trả về danh sách phiên
+    """
+    paper = get_exam_paper(exam.id)
+    vector_mode = getattr(settings, 'EXAM_ANSWER_STORAGE', 'rows') == 'vector'
+    alias = sharding.write_alias(exam.id)
+    manager = StudentExamSession.objects.using(alias)
+    duration = timezone.timedelta(minutes=exam.duration_minutes)
+    backdated = started_at is not None
+    started_at = started_at or timezone.now()
+    result = []
+    for chunk in batched(list(student_ids)):
+        selections = {
+            student_id: {item['id']: rng.choice(item['choices'])['id']
+                         for item in paper['items'] if rng.random() < answered}
+            for student_id in chunk
+        }
+        sessions = []
+        for student_id, selected in selections.items():
+            start = started_at + timezone.timedelta(seconds=rng.uniform(0, spread))
+            session = StudentExamSession(student_id=student_id, exam_id=exam.id, expires_at=start + duration,
+                                         answer_vector=encode_vector(paper, selected) if vector_mode else None)
+            if submitted:
+                session.score, session.total_marks, session.result_snapshot = grade_answers(paper, selected)
+                session.is_submitted = True
+                session.end_time = start + duration * rng.uniform(0.3, 1)
+            sessions.append(session)
+        if sharding.enabled():
+            SessionDirectory.objects.bulk_create(
+                [SessionDirectory(student_id=student_id, exam_id=exam.id, shard=alias) for student_id in chunk])
+            ids = dict(SessionDirectory.objects.filter(exam_id=exam.id, student_id__in=chunk)
+                       .values_list('student_id', 'id'))
+            for session in sessions:
+                session.id = ids[session.student_id]
+        with transaction.atomic(using=alias):
+            manager.bulk_create(sessions)
+            ids = dict(manager.filter(exam_id=exam.id, student_id__in=chunk).values_list('student_id', 'id'))
+            for session in sessions:
+                session.id = ids[session.student_id]
+            if backdated:
+                # start_time là auto_now_add -> tính lại từ expires_at trong 1 câu UPDATE (như bundles.ingest_results)
+                manager.filter(id__in=ids.values()).update(start_time=ExpressionWrapper(
+                    F('expires_at') - duration, output_field=DateTimeField()))
+            if not vector_mode:
+                insert_answers(alias, [(ids[student_id], item_id, choice_id)
+                                       for student_id, selected in selections.items()
+                                       for item_id, choice_id in selected.items()])
+        result.extend(sessions)
+    if submitted:
+        ExamStatistics.rebuild(exam)   # bulk_create không qua submit_session -> thống kê chưa cộng
+    return result
@@ -1,3 +1,1292 @@
-from django.test import TestCase
+# tests.py
+# Ngân sách truy vấn cho từng view: mỗi URL trong baseapp/urls.py được gọi trên dữ liệu mẫu,
+# số truy vấn không được vượt QUERY_BUDGETS và không truy vấn SELECT nào quét toàn bảng lớn.
+# Lỗi N+1 (truy vấn trong vòng lặp) làm số truy vấn tăng theo dữ liệu -> test fail.
+#python manage.py test baseapp --settings=exammanagement.settings_test
+import csv
+import io
+import json
+import os
+import random
+import re
+import shutil
+import sqlite3
+import struct
+import subprocess
+import sys
+import tempfile
+import zipfile
+from contextlib import ExitStack
 
-# Create your tests here.
+from django.contrib.auth import authenticate
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection, connections, router
+from django.db.models import Sum
+from django.db.utils import OperationalError
+from django.test import LiveServerTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from exammanagement.db_backends import ConnectionPool
+
+from . import (archive, benchmarks, bundles, counters, exports, loadtest, metrics, papers, proctoring, purge, roster,
+               search, sharding, synthetic, tokens, urls)
+from .grading import get_exam_paper, load_selected, save_vector_answer, submit_session
+from .purge import purge_exam
+from .views import EXAM_PAGE_SIZE, HISTORY_PAGE_SIZE, _parse_template_docx
+from .routers import DB_STICKY_COOKIE, read_from_primary, read_from_replica
+from .models import (Subject, Question, Choice, Exam, ExamItem, ExamChoice, StudentExamSession,
+                     StudentAnswer, StudentAnswerLog, UserProfile, SessionDirectory, ExamStatistics, ExamAnswerArchive,
+                     ExamAccessToken, SiteCounter)
+
+# (tên URL, method) -> số truy vấn tối đa. Dữ liệu mẫu đủ lớn (20 câu/đề, nhiều bài làm)
+# để truy vấn trong vòng lặp vượt ngân sách ngay.
+QUERY_BUDGETS = {
+    ('login', 'get'): 0,
+    ('login', 'post'): 5,
+    ('logout', 'get'): 3,
+    ('exam_access', 'get'): 0,
+    ('exam_access', 'post'): 6,
+    ('admin_home', 'get'): 4,
+    ('admin_exam_list', 'get'): 2,
+    ('question_bank', 'get'): 8,   # Lần đầu trong process: +1 truy vấn kiểm tra bảng FTS5 (search.backend)
+    ('import_docx', 'get'): 2,
+    ('exam_create', 'get'): 2,
+    ('exam_preview', 'get'): 4,
+    ('exam_schedule', 'get'): 2,
+    ('exam_schedule', 'post'): 3,
+    ('exam_access_tokens', 'get'): 2,
+    ('exam_access_tokens', 'post'): 6,
+    ('exam_delete', 'get'): 3,
+    ('exam_delete', 'post'): 6,
+    ('exam_proctor', 'get'): 4,
+    ('exam_proctor_stats', 'get'): 1,
+    ('exam_results_export', 'get'): 7,
+    ('subject_results_export', 'get'): 6,
+    ('exam_papers_export', 'get'): 4,
+    ('exam_bundle_export', 'get'): 4,
+    ('metrics', 'get'): 3,
+    ('student_home', 'get'): 4,
+    ('exam_start', 'get'): 6,
+    ('exam_taking', 'get'): 5,
+    ('exam_submit', 'get'): 11,
+    ('exam_result', 'get'): 7,
+    ('save_answer', 'post'): 6,
+}
+
+# Tạo đề: mỗi câu 1 INSERT ExamItem + 1 INSERT/phương án -> ngân sách tính theo số câu
+EXAM_CREATE_BASE_BUDGET = 7
+EXAM_CREATE_PER_QUESTION_BUDGET = 5
+
+# Các bảng lớn: SELECT phải dùng index (SEARCH ... / SCAN ... USING INDEX), không quét toàn bảng
+HOT_TABLES = (
+    'baseapp_exam', 'baseapp_examitem', 'baseapp_examchoice', 'baseapp_question', 'baseapp_choice',
+    'baseapp_studentexamsession', 'baseapp_studentanswer',
+)
+_FULL_SCAN = re.compile(r'\bSCAN (%s)\b(?! USING)' % '|'.join(HOT_TABLES))
+_SAVEPOINT = re.compile(r'(RELEASE |ROLLBACK TO )?SAVEPOINT ')
+
+QUESTIONS = 40
+EXAM_QUESTIONS = 20
+STUDENTS = 8
+
+
+class ReplicaMirrorMixin:
+    """
+    Replica (TEST MIRROR của default) dùng chung connection với default trong test,
+    để các view @use_replica thấy dữ liệu chưa commit trong transaction của TestCase.
+    """
+    databases = {'default', 'replica'}
+
+    @classmethod
+    def setUpClass(cls):
+        connections['replica'] = connections['default']
+        cls.addClassCleanup(connections.__delitem__, 'replica')
+        super().setUpClass()
+
+
+class QueryBudgetTests(ReplicaMirrorMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.subject = Subject.objects.create(code='PRN', name='Python')
+        questions = []
+        for i in range(QUESTIONS):
+            q = Question.objects.create(subject=cls.subject, text=f'Câu {i}', mark=1,
+                                        unit=f'Chương {i % 4}', level='Dễ' if i % 2 else 'Khó')
+            for label in 'ABCD':
+                Choice.objects.create(question=q, label=label, text=f'{label}{i}', is_correct=(label == 'A'))
+            questions.append(q)
+
+        cls.admin = User.objects.create_user('admin1', password='pass12345')
+        UserProfile.objects.create(user=cls.admin, role='admin')
+        cls.students = []
+        for i in range(STUDENTS):
+            user = User.objects.create_user(f'sv{i}', password='pass12345')
+            UserProfile.objects.create(user=user, role='student', student_id=f'SV{i:03d}')
+            cls.students.append(user)
+
+        cls.exam = cls._make_exam('PRN_E1', questions[:EXAM_QUESTIONS])
+        cls.other_exam = cls._make_exam('PRN_E2', questions[EXAM_QUESTIONS:])
+
+        # Nửa số học sinh đã nộp bài, 1 học sinh đang làm dở, còn lại chưa làm
+        items = list(cls.exam.items.prefetch_related('choices').order_by('order'))
+        for n, user in enumerate(cls.students[:STUDENTS // 2 + 1]):
+            session = StudentExamSession.objects.create(student=user, exam=cls.exam)
+            for item in items[:5 + n * 3]:
+                choices = list(item.choices.all())
+                StudentAnswer.objects.create(session=session, exam_item=item,
+                                             selected_choice=choices[n % len(choices)])
+            if n < STUDENTS // 2:
+                submit_session(StudentExamSession.objects.select_related('exam').get(id=session.id))
+        cls.submitted = StudentExamSession.objects.filter(exam=cls.exam, is_submitted=True).first()
+        cls.running = StudentExamSession.objects.get(exam=cls.exam, is_submitted=False)
+        cls.fresh_student = cls.students[-1]
+
+    @classmethod
+    def _make_exam(cls, code, questions):
+        exam = Exam.objects.create(code=code, subject=cls.subject, duration_minutes=60,
+                                   question_count=len(questions))
+        for order, q in enumerate(questions, start=1):
+            item = ExamItem.objects.create(exam=exam, question=q, order=order)
+            for c in q.choices.all():
+                ExamChoice.objects.create(item=item, label=c.label, text=c.text, is_correct=c.is_correct)
+        return exam
+
+    def setUp(self):
+        cache.clear()  # Đo trường hợp xấu nhất: đề/thống kê chưa có trong cache
+
+    def _login(self, user):
+        self.client.force_login(user)
+
+    def _assert_plans(self, queries):
+        for query in queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+                plan = ' | '.join(row[-1] for row in cursor.fetchall())
+            self.assertIsNone(_FULL_SCAN.search(plan), f"Quét toàn bảng:\n{sql}\n-> {plan}")
+
+    def assertQueryBudget(self, name, method='get', kwargs=None, data=None, budget=None):
+        """Gọi URL, kiểm tra số truy vấn <= ngân sách và kế hoạch truy vấn; trả về response"""
+        budget = QUERY_BUDGETS[(name, method)] if budget is None else budget
+        url = reverse(name, kwargs=kwargs)
+        with ExitStack() as stack:
+            unique = {id(connections[alias]): connections[alias] for alias in self.databases}
+            contexts = [stack.enter_context(CaptureQueriesContext(conn)) for conn in unique.values()]
+            response = getattr(self.client, method)(url, data or {})
+            if response.streaming:   # Truy vấn của response stream chạy khi đọc nội dung
+                response.body = b''.join(response.streaming_content)
+        self.assertLess(response.status_code, 400, f"{method.upper()} {url} -> {response.status_code}")
+        # SAVEPOINT/RELEASE do transaction.atomic lồng trong transaction của TestCase -> không tính
+        queries = [q for ctx in contexts for q in ctx.captured_queries if not _SAVEPOINT.match(q['sql'])]
+        self.assertLessEqual(
+            len(queries), budget,
+            f"{method.upper()} {url}: {len(queries)} truy vấn > ngân sách {budget}\n"
+            + '\n'.join(q['sql'] for q in queries)
+        )
+        self._assert_plans(queries)
+        return response
+
+    def test_every_url_has_budget(self):
+        names = {p.name for p in urls.urlpatterns}
+        covered = {name for name, _ in QUERY_BUDGETS} | {'exam_create'}
+        self.assertEqual(names - covered, set(), "View mới cần khai báo ngân sách truy vấn trong QUERY_BUDGETS")
+
+    # ===== Đăng nhập =====
+    def test_login(self):
+        self.assertQueryBudget('login')
+        response = self.assertQueryBudget('login', 'post', data={'username': 'sv0', 'password': 'pass12345'})
+        self.assertRedirects(response, reverse('student_home'), fetch_redirect_response=False)
+
+    def test_logout(self):
+        self._login(self.students[0])
+        self.assertQueryBudget('logout')
+
+    # ===== Admin =====
+    def test_admin_home(self):
+        self._login(self.admin)
+        self.assertQueryBudget('admin_home')
+
+    def test_admin_exam_list(self):
+        self._login(self.admin)
+        self.assertQueryBudget('admin_exam_list', data={'subject': self.subject.id, 'status': 'active', 'q': 'PRN'})
+
+    def test_question_bank(self):
+        self._login(self.admin)
+        response = self.assertQueryBudget('question_bank', data={'q': 'cau 1', 'subject': self.subject.id,
+                                                                 'unit': 'Chương 1', 'level': 'Dễ'})
+        self.assertEqual([q.text for q in response.context['questions']][:1], ['Câu 1'])
+        response = self.assertQueryBudget('question_bank', data={'subject': self.subject.id})
+        self.assertEqual(len(response.context['questions']), search.PAGE_SIZE)
+        response = self.assertQueryBudget('question_bank', data={'subject': self.subject.id,
+                                                                 'before': response.context['questions'][-1].id})
+        self.assertEqual(len(response.context['questions']), QUESTIONS - search.PAGE_SIZE)
+
+    def test_import_docx_form(self):
+        self._login(self.admin)
+        self.assertQueryBudget('import_docx')
+
+    def test_exam_create(self):
+        self._login(self.admin)
+        self.assertQueryBudget('exam_create')
+        n = 10
+        budget = EXAM_CREATE_BASE_BUDGET + EXAM_CREATE_PER_QUESTION_BUDGET * n
+        self.assertQueryBudget('exam_create', 'post', budget=budget, data={
+            'code': 'E3', 'subject_id': self.subject.id, 'duration': 30, 'num_questions': n,
+        })
+        self.assertEqual(Exam.objects.get(code='PRN_E3').items.count(), n)
+
+    def test_exam_preview(self):
+        self._login(self.admin)
+        self.assertQueryBudget('exam_preview', kwargs={'exam_id': self.exam.id})
+
+    def test_exam_schedule(self):
+        self._login(self.admin)
+        self.assertQueryBudget('exam_schedule', kwargs={'exam_id': self.exam.id})
+        self.assertQueryBudget('exam_schedule', 'post', kwargs={'exam_id': self.exam.id},
+                               data={'start_time': '2025-01-01T08:00', 'is_active': 'on'})
+
+    def test_exam_access_tokens(self):
+        Exam.objects.filter(id=self.exam.id).update(end_time=timezone.now() + timezone.timedelta(hours=2))
+        self._login(self.admin)
+        kwargs = {'exam_id': self.exam.id}
+        response = self.assertQueryBudget('exam_access_tokens', 'post', kwargs=kwargs,
+                                          data={'student_ids': ', '.join(f'SV{i:03d}' for i in range(STUDENTS))})
+        rows = list(csv.reader(io.StringIO(response.body.decode('utf-8-sig'))))
+        self.assertEqual([row[0] for row in rows[1:]], [f'SV{i:03d}' for i in range(STUDENTS)])
+        response = self.assertQueryBudget('exam_access_tokens', kwargs=kwargs)
+        self.assertEqual(list(csv.reader(io.StringIO(response.body.decode('utf-8-sig'))))[1:], sorted(rows[1:]))
+
+    def test_exam_delete(self):
+        self._login(self.admin)
+        self.assertQueryBudget('exam_delete', kwargs={'exam_id': self.exam.id})
+        self.assertQueryBudget('exam_delete', 'post', kwargs={'exam_id': self.exam.id})
+        self.assertFalse(Exam.objects.visible().filter(id=self.exam.id).exists())
+
+    def test_exam_proctor(self):
+        self._login(self.admin)
+        running = StudentExamSession.objects.filter(id=self.running.id)
+        running.update(expires_at=timezone.now() + timezone.timedelta(minutes=30))
+        self.assertQueryBudget('exam_proctor', kwargs={'exam_id': self.exam.id})
+        response = self.assertQueryBudget('exam_proctor_stats', kwargs={'exam_id': self.exam.id})
+        self.assertEqual((response.json()['active'], response.json()['submitted']), (1, STUDENTS // 2))
+        # Bỏ dở không nộp: hết giờ thì không còn tính là đang thi
+        running.update(expires_at=timezone.now() - timezone.timedelta(minutes=1))
+        cache.clear()
+        response = self.client.get(reverse('exam_proctor_stats', kwargs={'exam_id': self.exam.id}))
+        self.assertEqual(response.json()['active'], 0)
+
+    def test_results_export_csv(self):
+        self._login(self.admin)
+        response = self.assertQueryBudget('exam_results_export', kwargs={'exam_id': self.exam.id},
+                                          data={'format': 'csv', 'choices': '1'})
+        rows = list(csv.reader(io.StringIO(response.body.decode('utf-8-sig'))))
+        self.assertEqual(len(rows), 1 + STUDENTS // 2 + 1)
+        self.assertEqual(len(rows[0]), 10 + EXAM_QUESTIONS)
+        first = StudentExamSession.objects.filter(exam=self.exam).order_by('id').first()
+        self.assertEqual(rows[1][2:4], [first.student.username, first.student.userprofile.student_id])
+        self.assertEqual(rows[1][10:15], ['A'] * 5)   # Học sinh đầu chọn phương án đầu ở 5 câu đầu
+        self.assertEqual(rows[1][15], '')
+
+    def test_results_export_xlsx(self):
+        self._login(self.admin)
+        response = self.assertQueryBudget('subject_results_export', kwargs={'subject_id': self.subject.id},
+                                          data={'format': 'xlsx'})
+        with zipfile.ZipFile(io.BytesIO(response.body)) as archive:
+            self.assertIsNone(archive.testzip())
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row '), 1 + STUDENTS // 2 + 1)
+        self.assertIn('<t xml:space="preserve">SV000</t>', sheet)
+
+    def test_exam_papers_export(self):
+        self._login(self.admin)
+        response = self.assertQueryBudget('exam_papers_export', kwargs={'exam_id': self.exam.id},
+                                          data={'variants': 2})
+        with zipfile.ZipFile(io.BytesIO(response.body)) as archive:
+            self.assertEqual(archive.namelist(), ['PRN_E1-V01.docx', 'PRN_E1-V02.docx', 'answer_keys.csv'])
+            keys = list(csv.reader(io.StringIO(archive.read('answer_keys.csv').decode('utf-8-sig'))))
+            # Mã đề in import lại được bằng chính parser của import_docx, đáp án khớp answer_keys.csv
+            for variant in ('PRN_E1-V01', 'PRN_E1-V02'):
+                meta, questions = _parse_template_docx(archive.read(f'{variant}.docx'))
+                self.assertEqual((meta['topic_code'], len(questions)), (variant, EXAM_QUESTIONS))
+                self.assertEqual([q['answer'] for q in questions], [a for v, _, a in keys if v == variant])
+        self.assertEqual({q['answer'] for q in questions}, {'A'})   # Không trộn phương án: đáp án gốc luôn là A
+
+    @override_settings(PAPER_RENDER_WORKERS=2)
+    def test_exam_papers_parallel(self):
+        variants = papers.PARALLEL_MIN_VARIANTS + 1
+        job = papers.prepare_job(self.exam)
+        with zipfile.ZipFile(io.BytesIO(b''.join(papers.stream_papers_zip(job, variants)))) as archive:
+            # Dựng ở process pool (spawn) giống hệt dựng trong process hiện tại, đúng thứ tự mã đề
+            for variant in range(1, variants + 1):
+                filename, content, _ = papers.render_variant(variant, job)
+                with zipfile.ZipFile(io.BytesIO(archive.read(filename))) as parallel, \
+                        zipfile.ZipFile(io.BytesIO(content)) as local:
+                    self.assertEqual(parallel.read('word/document.xml'), local.read('word/document.xml'))
+            self.assertEqual(archive.namelist()[-1], 'answer_keys.csv')
+        self.assertIs(papers._executor(), papers._executor())   # Pool dùng chung giữa các request
+
+    def test_exam_bundle_export(self):
+        self._login(self.admin)
+        response = self.assertQueryBudget('exam_bundle_export', kwargs={'exam_id': self.exam.id})
+        document, images = bundles.read_bundle(io.BytesIO(response.content))
+        self.assertEqual((document['code'], len(document['items'])), ('PRN_E1', EXAM_QUESTIONS))
+        # Cài lại cùng gói: không tạo đề mới; đổi mã đề (như ở máy chủ điểm thi khác) -> đề giống hệt
+        self.assertEqual(bundles.install_bundle(document, images), (self.exam, False))
+        counters.reconcile()
+        document['code'] = 'PRN_C1'
+        document['subject'] = {'code': 'PRN_HP', 'name': 'Python (điểm thi Hải Phòng)'}
+        copy, created = bundles.install_bundle(document, images)
+        self.assertTrue(created)
+        self.assertEqual(bundles.exam_document(copy)[0], document)
+        # Bộ đếm trang chủ cộng qua signals, không cộng 2 lần
+        values = counters.get_counters()
+        for name in (counters.SUBJECTS, counters.QUESTIONS, counters.EXAMS):
+            self.assertEqual(values[name], counters.SOURCES[name](), name)
+        # Sửa exam.json mà không cập nhật manifest -> sai checksum
+        tampered = io.BytesIO()
+        with zipfile.ZipFile(io.BytesIO(response.content)) as src, zipfile.ZipFile(tampered, 'w') as dst:
+            for name in src.namelist():
+                blob = src.read(name)
+                dst.writestr(name, blob.replace(b'PRN_E1', b'PRN_E9') if name == 'exam.json' else blob)
+        with self.assertRaises(bundles.BundleError):
+            bundles.read_bundle(tampered)
+
+    def test_paper_follows_question_edits(self):
+        question = self.exam.items.get(order=1).question
+        self.assertEqual(get_exam_paper(self.exam.id)['items'][0]['mark'], 1)
+        question.mark = 2
+        question.save()
+        paper = get_exam_paper(self.exam.id)
+        self.assertEqual((paper['items'][0]['mark'], paper['total_marks']), (2, EXAM_QUESTIONS + 1))
+        session = StudentExamSession.objects.select_related('exam').get(id=self.running.id)
+        submit_session(session)
+        self.assertEqual(session.total_marks, EXAM_QUESTIONS + 1)
+
+    def test_ingest_centre_results(self):
+        scores = dict(StudentExamSession.objects.filter(exam=self.exam, is_submitted=True)
+                      .values_list('student_id', 'score'))
+        answers = StudentAnswer.objects.filter(session__exam=self.exam).count()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'HN01.jsonl')
+            with open(path, 'w', encoding='utf-8') as f:
+                bundles.write_results(self.exam, f, 'HN01')
+            for _ in range(2):   # Nạp lại cùng file không đổi kết quả
+                report = bundles.ingest_results([path])
+                self.assertEqual((report.sessions, report.unknown_students), (STUDENTS // 2 + 1, []))
+                sessions = StudentExamSession.objects.filter(exam=self.exam)
+                self.assertEqual(sessions.count(), STUDENTS // 2 + 1)
+                self.assertFalse(sessions.filter(is_submitted=False).exists())
+                self.assertEqual(StudentAnswer.objects.filter(session__exam=self.exam).count(), answers)
+                for student_id, score in scores.items():
+                    self.assertEqual(sessions.get(student_id=student_id).score, score)
+            self.assertEqual(self.exam.statistics.submitted_count, STUDENTS // 2 + 1)
+
+    def test_metrics(self):
+        self._login(self.running.student)
+        self.client.post(reverse('save_answer'), {'session_id': self.running.id, 'item_id': 0, 'choice_id': ''})
+        self._login(self.admin)
+        response = self.assertQueryBudget('metrics')
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        body = response.content.decode()
+        self.assertRegex(body, r'exam_save_answer_seconds_count [1-9]')
+        self.assertRegex(body, r'exam_save_answer_errors_total [1-9]')
+        self.assertIn(f'exam_unsubmitted_sessions {counters.get_counters()[counters.ACTIVE_ATTEMPTS]}', body)
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(METRICS_TOKEN='s3cret'):
+            response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer s3cret')
+        self.assertEqual(response.status_code, 200)
+
+    # ===== Học sinh =====
+    def test_student_home(self):
+        self._login(self.students[0])
+        self.assertQueryBudget('student_home')
+
+    def test_exam_start(self):
+        self._login(self.fresh_student)
+        self.assertQueryBudget('exam_start', kwargs={'exam_id': self.exam.id})
+        self.assertTrue(StudentExamSession.objects.filter(student=self.fresh_student, exam=self.exam).exists())
+
+    def test_exam_access(self):
+        Exam.objects.filter(id=self.exam.id).update(end_time=timezone.now() + timezone.timedelta(hours=2))
+        [(_, code)] = tokens.issue_tokens(Exam.objects.get(id=self.exam.id), [self.fresh_student])
+        self.assertQueryBudget('exam_access')
+        response = self.assertQueryBudget('exam_access', 'post', data={'code': code.lower()})
+        self.assertRedirects(response, reverse('exam_start', kwargs={'exam_id': self.exam.id}),
+                             fetch_redirect_response=False)
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.fresh_student.id)
+
+    def test_exam_taking(self):
+        self._login(self.running.student)
+        self.assertQueryBudget('exam_taking', kwargs={'session_id': self.running.id})
+
+    def test_save_answer(self):
+        self._login(self.running.student)
+        item = self.exam.items.order_by('-order').first()
+        for choice in item.choices.all()[:2]:  # Lần đầu tạo, lần sau cập nhật
+            self.assertQueryBudget('save_answer', 'post', data={
+                'session_id': self.running.id, 'item_id': item.id, 'choice_id': choice.id,
+            })
+
+    @override_settings(EXAM_ANSWER_STORAGE='vector')
+    def test_save_answer_vector(self):
+        self._login(self.fresh_student)
+        self.client.get(reverse('exam_start', kwargs={'exam_id': self.exam.id}))
+        session = StudentExamSession.objects.get(student=self.fresh_student, exam=self.exam)
+        item = self.exam.items.order_by('-order').first()
+        choice = item.choices.order_by('label').last()
+        self.assertQueryBudget('save_answer', 'post', budget=4, data={
+            'session_id': session.id, 'item_id': item.id, 'choice_id': choice.id,
+        })
+        session.refresh_from_db()
+        self.assertEqual(bytes(session.answer_vector)[-1], item.choices.count())
+
+    @override_settings(EXAM_ANSWER_STORAGE='vector')
+    def test_vector_session_round_trip(self):
+        self._login(self.fresh_student)
+        self.client.get(reverse('exam_start', kwargs={'exam_id': self.exam.id}))
+        session = StudentExamSession.objects.select_related('exam').get(student=self.fresh_student, exam=self.exam)
+        stale = StudentExamSession.objects.get(id=session.id)
+        paper = get_exam_paper(self.exam.id)
+        items = paper['items']
+        right, wrong = (items[0]['choices'][0]['id'], items[0]['choices'][1]['id'])   # A đúng, B sai
+
+        def save(item, choice_id):
+            response = self.client.post(reverse('save_answer'), {
+                'session_id': session.id, 'item_id': item['id'], 'choice_id': choice_id or ''})
+            self.assertEqual(response.json(), {'success': True})
+
+        save(items[0], right)
+        save(items[0], wrong)                                # Đổi đáp án
+        save(items[1], items[1]['choices'][0]['id'])
+        save(items[1], None)                                 # Bỏ chọn
+        save(items[2], items[2]['choices'][0]['id'])
+        # Bản đọc cũ (mảng đáp án toàn 0): UPDATE so sánh-và-đổi thất bại, đọc lại rồi ghi -> không mất câu khác
+        self.assertTrue(save_vector_answer(stale, paper, 3, 1))
+        session.refresh_from_db()
+        self.assertEqual(bytes(session.answer_vector)[:4], bytes([2, 0, 1, 1]))
+        self.assertFalse(StudentAnswer.objects.filter(session=session).exists())
+
+        self.client.get(reverse('exam_submit', kwargs={'session_id': session.id}))
+        session.refresh_from_db()
+        self.assertEqual((session.is_submitted, session.score, session.total_marks), (True, 2, EXAM_QUESTIONS))
+        self.assertEqual(session.result_snapshot[:4], [[items[0]['id'], wrong, 0], [items[1]['id'], None, 0],
+                                                       [items[2]['id'], items[2]['choices'][0]['id'], 1],
+                                                       [items[3]['id'], items[3]['choices'][0]['id'], 1]])
+        # Đã nộp: không ghi thêm được (UPDATE có điều kiện is_submitted=False)
+        self.assertFalse(save_vector_answer(session, paper, 4, 1))
+        session.refresh_from_db()
+        self.assertEqual(bytes(session.answer_vector)[4], 0)
+
+        results = self.client.get(reverse('exam_result', kwargs={'session_id': session.id})).context['results']
+        self.assertEqual([(r['selected'] or {}).get('id') for r in results[:4]],
+                         [wrong, None, items[2]['choices'][0]['id'], items[3]['choices'][0]['id']])
+        self.assertEqual([r['is_correct'] for r in results[:4]], [False, False, True, True])
+
+    def test_exam_submit(self):
+        self._login(self.running.student)
+        self.assertQueryBudget('exam_submit', kwargs={'session_id': self.running.id})
+
+    def test_exam_result(self):
+        self._login(self.submitted.student)
+        response = self.assertQueryBudget('exam_result', kwargs={'session_id': self.submitted.id})
+        self.assertEqual(len(response.context['results']), EXAM_QUESTIONS)
+
+    def test_exam_result_without_snapshot(self):
+        StudentExamSession.objects.filter(id=self.submitted.id).update(result_snapshot=None)
+        self._login(self.submitted.student)
+        self.assertQueryBudget('exam_result', kwargs={'session_id': self.submitted.id}, budget=10)
+
+
+class AccessTests(ReplicaMirrorMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.student = User.objects.create_user('sv1', password='pass12345')
+        UserProfile.objects.create(user=self.student, role='student', student_id='SV1')
+
+    def test_every_url_declares_access(self):
+        missing = [p.name for p in urls.urlpatterns if not hasattr(p.callback, 'access')]
+        self.assertEqual(missing, [], "URL mới cần khai báo quyền (access.public/login_only/admin_only/admin_api)")
+
+    def test_cached_user_needs_no_auth_queries(self):
+        self.client.force_login(self.student)
+        self.client.get(reverse('student_home'))
+        with CaptureQueriesContext(connection) as ctx:
+            self.assertEqual(self.client.get(reverse('student_home')).status_code, 200)
+        auth = [q['sql'] for q in ctx.captured_queries if re.search(r'auth_user|baseapp_userprofile', q['sql'])]
+        self.assertEqual(auth, [])
+
+    def test_role_change_invalidates_cache(self):
+        self.client.force_login(self.student)
+        self.assertRedirects(self.client.get(reverse('admin_home')), reverse('student_home'),
+                             fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('admin_exam_list')).status_code, 403)
+        profile = self.student.userprofile
+        profile.role = 'admin'
+        profile.save()
+        self.assertEqual(self.client.get(reverse('admin_home')).status_code, 200)
+        self.student.is_active = False
+        self.student.save()
+        self.assertRedirects(self.client.get(reverse('admin_home')),
+                             f"{reverse('login')}?next={reverse('admin_home')}", fetch_redirect_response=False)
+
+    def test_sessions_from_model_backend_still_resolve(self):
+        # Phiên đăng nhập tạo trước khi chuyển sang CachedModelBackend
+        self.client.force_login(self.student, backend='django.contrib.auth.backends.ModelBackend')
+        self.assertEqual(self.client.get(reverse('student_home')).status_code, 200)
+        with self.assertNumQueries(1):   # Sai mật khẩu: chỉ CachedModelBackend kiểm tra
+            self.assertIsNone(authenticate(username='sv1', password='wrong'))
+
+    def test_user_cache_must_be_shared(self):
+        with override_settings(AUTH_USER_CACHE_LOCAL=False):
+            with self.assertRaises(ImproperlyConfigured):
+                authenticate(username='sv1', password='pass12345')
+            with override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}):
+                self.assertEqual(authenticate(username='sv1', password='pass12345'), self.student)
+
+    def test_anonymous_redirects_to_login(self):
+        url = reverse('exam_taking', kwargs={'session_id': 1})
+        self.assertRedirects(self.client.get(url), f"{reverse('login')}?next={url}", fetch_redirect_response=False)
+        self.assertEqual(self.client.get(reverse('exam_proctor_stats', kwargs={'exam_id': 1})).status_code, 403)
+
+
+class CounterTests(ReplicaMirrorMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.subject = Subject.objects.create(code='CNT', name='Bộ đếm')
+        self.admin = User.objects.create_user('cnt_admin', password='pass12345')
+        UserProfile.objects.create(user=self.admin, role='admin')
+        self.client.force_login(self.admin)
+        counters.reconcile()
+
+    def _assert_reconciled(self):
+        values = counters.get_counters()
+        for name, source in counters.SOURCES.items():
+            self.assertEqual(values[name], source(), name)
+        return values
+
+    def _exam(self, code):
+        return Exam.objects.create(code=code, subject=self.subject, question_count=1)
+
+    def test_signals_move_counters(self):
+        before = self._assert_reconciled()
+        subject = Subject.objects.create(code='CNT2', name='Môn 2')
+        question = Question.objects.create(subject=subject, text='Câu 1', mark=1)
+        Question.objects.create(subject=subject, text='Câu 2', mark=1)
+        exam = Exam.objects.create(code='CNT2_E1', subject=subject, question_count=2)
+        question.save()   # Sửa, không phải tạo mới -> không cộng
+        values = self._assert_reconciled()
+        self.assertEqual([values[n] - before[n] for n in (counters.SUBJECTS, counters.QUESTIONS, counters.EXAMS)],
+                         [1, 2, 1])
+        question.delete()
+        exam.delete()
+        self.assertEqual(self._assert_reconciled()[counters.QUESTIONS], before[counters.QUESTIONS] + 1)
+        subject.delete()   # Xoá cascade câu hỏi còn lại: mỗi dòng 1 signal
+        self.assertEqual(self._assert_reconciled(), before)
+
+    def test_exam_delete_decrements_once(self):
+        exam = self._exam('CNT_E1')
+        now = timezone.now()
+        for n, fields in enumerate([{'expires_at': now + timezone.timedelta(hours=1)},
+                                    {'expires_at': now - timezone.timedelta(hours=1)},
+                                    {'is_submitted': True, 'end_time': now}]):
+            StudentExamSession.objects.create(student=User.objects.create_user(f'cnt{n}'), exam=exam, **fields)
+        before = counters.reconcile()
+        self.client.post(reverse('exam_delete', kwargs={'exam_id': exam.id}))
+        values = self._assert_reconciled()
+        self.assertEqual((values[counters.EXAMS], values[counters.ACTIVE_ATTEMPTS]),
+                         (before[counters.EXAMS] - 1, before[counters.ACTIVE_ATTEMPTS] - 2))
+        # Xoá bằng DELETE thô (không signal) -> bộ đếm không bị trừ lần nữa
+        purge_exam(exam.id)
+        self.assertFalse(Exam.objects.filter(id=exam.id).exists())
+        self.assertEqual(self._assert_reconciled(), values)
+
+    def test_incr_seeds_missing_row(self):
+        SiteCounter.objects.filter(name=counters.EXAMS).delete()
+        counters.incr(counters.EXAMS, 0)
+        self.assertFalse(SiteCounter.objects.filter(name=counters.EXAMS).exists())
+        self._exam('CNT_E1')   # Signal gọi incr khi chưa có dòng: lấy giá trị đếm thật (đã gồm đề mới), không cộng thêm
+        self.assertEqual(SiteCounter.objects.get(name=counters.EXAMS).value, counters.SOURCES[counters.EXAMS]())
+        counters.incr(counters.EXAMS, 2)
+        self.assertEqual(SiteCounter.objects.get(name=counters.EXAMS).value, counters.SOURCES[counters.EXAMS]() + 2)
+
+    def test_admin_exam_list_paging(self):
+        exams = [self._exam(f'CNT_E{n}') for n in range(EXAM_PAGE_SIZE + 3)]
+        Exam.objects.filter(id__in=[e.id for e in exams[2:]]).update(created_at=timezone.now())   # Cắt trang giữa nhóm
+        Exam.objects.filter(id=exams[0].id).update(deleted_at=timezone.now())
+        expected = list(Exam.objects.visible().order_by('-created_at', '-id').values_list('id', flat=True))
+        first = self.client.get(reverse('admin_exam_list')).json()
+        second = self.client.get(reverse('admin_exam_list'), {'after': first['next']}).json()
+        self.assertEqual([e['id'] for e in first['exams']], expected[:EXAM_PAGE_SIZE])
+        self.assertEqual([e['id'] for e in second['exams']], expected[EXAM_PAGE_SIZE:])
+        self.assertIsNone(second['next'])
+
+
+class StudentHomeTests(ReplicaMirrorMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.now = timezone.now()
+        self.hour = timezone.timedelta(hours=1)
+        self.subject = Subject.objects.create(code='HOM', name='Trang chủ')
+        self.student = User.objects.create_user('svh', password='pass12345')
+        UserProfile.objects.create(user=self.student, role='student', student_id='SVH')
+        self.client.force_login(self.student)
+
+    def _exam(self, code, **fields):
+        return Exam.objects.create(code=code, subject=self.subject, question_count=10, **fields)
+
+    def _session(self, exam, **fields):
+        return StudentExamSession.objects.create(student=self.student, exam=exam, **fields)
+
+    def test_available_exams(self):
+        now, hour = self.now, self.hour
+        open_exams = [self._exam('H_OPEN'), self._exam('H_WINDOW', start_time=now - hour, end_time=now + hour)]
+        self._exam('H_FUTURE', start_time=now + hour)
+        self._exam('H_ENDED', end_time=now - hour)
+        self._exam('H_OFF', is_active=False)
+        self._exam('H_DEL', deleted_at=now)
+        taken = self._exam('H_TAKEN')
+        self._session(taken, is_submitted=True, end_time=now, score=5, total_marks=10)
+        self.assertEqual(set(Exam.objects.available(now)), set(open_exams) | {taken})
+        response = self.client.get(reverse('student_home'))
+        self.assertEqual(set(response.context['available_exams']), set(open_exams))   # Đã làm -> bỏ
+
+    def test_expired_session_not_running(self):
+        running = self._session(self._exam('H_RUN'), expires_at=self.now + self.hour)
+        self._session(self._exam('H_LATE'), expires_at=self.now - self.hour)   # Hết giờ nhưng chưa nộp
+        self._session(self._exam('H_CLOSED', end_time=self.now - self.hour), expires_at=self.now + self.hour)
+        response = self.client.get(reverse('student_home'))
+        self.assertEqual(list(response.context['active_sessions']), [running])
+        self.assertEqual(list(response.context['available_exams']), [])
+
+    def test_history_paging(self):
+        # Nhiều phiên nộp cùng thời điểm: con trỏ (end_time, id) không được lặp hay bỏ sót
+        sessions = []
+        for n in range(HISTORY_PAGE_SIZE + 5):
+            end_time = self.now - timezone.timedelta(minutes=n // 3)   # Trang 1 cắt giữa nhóm cùng giờ
+            sessions.append(self._session(self._exam(f'H_HIS{n}'), is_submitted=True, end_time=end_time,
+                                          score=5, total_marks=10))
+        expected = sorted(sessions, key=lambda s: (s.end_time, s.id), reverse=True)
+        first = self.client.get(reverse('student_home')).context
+        self.assertEqual(list(first['completed_sessions']), expected[:HISTORY_PAGE_SIZE])
+        self.assertTrue(first['is_first_page'])
+        second = self.client.get(reverse('student_home'), {'before': first['next_cursor']}).context
+        self.assertEqual(list(second['completed_sessions']), expected[HISTORY_PAGE_SIZE:])
+        self.assertEqual((second['is_first_page'], second['next_cursor']), (False, None))
+
+
+class TokenTests(TestCase):
+
+    def setUp(self):
+        subject = Subject.objects.create(code='TOK', name='Tokens')
+        self.exam = Exam.objects.create(code='TOK_E1', subject=subject, duration_minutes=30, question_count=0,
+                                        end_time=timezone.now() + timezone.timedelta(hours=1))
+        self.student = User.objects.create_user('sv1')
+        UserProfile.objects.create(user=self.student, role='student', student_id='SV1')
+
+    def test_code_is_single_use_and_bound_to_hmac(self):
+        [(_, code)] = tokens.issue_tokens(self.exam, [self.student])
+        raw = code.replace('-', '')
+        forged = raw[:-1] + next(ch for ch in tokens.ALPHABET if ch != raw[-1])
+        with self.assertNumQueries(0), self.assertRaises(tokens.TokenError):
+            tokens.redeem('0O1I-abc')
+        with self.assertNumQueries(1), self.assertRaises(tokens.TokenError):
+            tokens.redeem(forged)
+        self.assertEqual(tokens.redeem(f' {raw.lower()} ').student, self.student)
+        with self.assertRaises(tokens.TokenError):
+            tokens.redeem(code)
+
+    def test_reused_id_rejects_old_code(self):
+        [(_, code)] = tokens.issue_tokens(self.exam, [self.student])
+        token = ExamAccessToken.objects.get(exam=self.exam, student=self.student)
+        other = User.objects.create_user('sv2')
+        # Bảng khôi phục từ bản sao lưu / AUTO_INCREMENT đặt lại: id cũ thuộc về học sinh khác
+        token.delete()
+        ExamAccessToken.objects.create(id=token.id, exam=self.exam, student=other)
+        with self.assertRaises(tokens.TokenError):
+            tokens.redeem(code)
+
+    def test_reissue_and_expiry(self):
+        [(_, old)] = tokens.issue_tokens(self.exam, [self.student])
+        [(_, new)] = tokens.issue_tokens(self.exam, [self.student])
+        with self.assertRaises(tokens.TokenError):
+            tokens.redeem(old)
+        self.assertEqual(tokens.students_by_id(['SV1', 'SV9']), ([self.student], ['SV9']))
+        Exam.objects.filter(id=self.exam.id).update(end_time=timezone.now() - timezone.timedelta(minutes=1))
+        with self.assertRaises(tokens.TokenError):
+            tokens.redeem(new)
+        self.exam.end_time = None
+        with self.assertRaises(tokens.TokenError):
+            tokens.issue_tokens(self.exam, [self.student])
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        self.subject = Subject.objects.create(code='CSDL', name='Cơ sở dữ liệu')
+        self.key = Question.objects.create(subject=self.subject, text='Khoá chính của bảng là gì?', unit='Chương 1')
+        self.index = Question.objects.create(subject=self.subject, text='Chỉ mục giúp truy vấn nhanh hơn', unit='Chương 2')
+        self.both = Question.objects.create(subject=self.subject, unit='Chương 2',
+                                            text='Khoá chính có tự tạo chỉ mục không? Chỉ mục trên khoá chính')
+
+    def _ids(self, query, **filters):
+        return [q.id for q in search.search_questions(query, **filters)[0]]
+
+    def test_fold_and_rank(self):
+        self.assertEqual(search.fold('  Đâu là KHOÁ   chính?'), 'dau la khoa chinh?')
+        self.assertEqual(self._ids('khoa chinh'), self._ids('KHOÁ CHÍNH'))
+        self.assertEqual(set(self._ids('khoa chinh')), {self.key.id, self.both.id})
+        self.assertEqual(self._ids('chỉ mục'), [self.both.id, self.index.id])   # Khớp nhiều lần xếp trước
+        self.assertEqual(self._ids('chi', unit='Chương 2'), [self.both.id, self.index.id])
+        self.assertEqual(self._ids('tru'), [self.index.id])   # Khớp tiền tố
+        admin_hits = search.filter_questions(Question.objects.filter(subject=self.subject), 'bảng khoá')
+        self.assertEqual(list(admin_hits), [self.key])
+
+    def test_index_follows_edits(self):
+        self.key.text = 'Ràng buộc toàn vẹn là gì?'
+        self.key.save(update_fields=['text'])
+        self.assertEqual(self._ids('khoa chinh'), [self.both.id])
+        self.assertEqual(self._ids('rang buoc'), [self.key.id])
+        self.both.delete()
+        self.assertEqual(self._ids('chi muc'), [self.index.id])
+        Question.objects.filter(id=self.index.id).update(text='Khung nhìn')   # Ghi ngoài save()
+        self.assertEqual(search.refresh_search_text(), 1)
+        self.assertEqual(self._ids('khung nhin'), [self.index.id])
+
+
+class StatisticsTests(TestCase):
+    SCORES = (0, 3, 5, 5, 7.5, 10)   # Trên thang 10 -> 0%, 30%, 50%, 50%, 75%, 100%
+
+    def setUp(self):
+        subject = Subject.objects.create(code='STA', name='Thống kê')
+        self.exam = Exam.objects.create(code='STA_E1', subject=subject, duration_minutes=30, question_count=10)
+        self.sessions = []
+        for n, score in enumerate(self.SCORES):
+            student = User.objects.create_user(f'sta{n}')
+            self.sessions.append(StudentExamSession.objects.create(
+                student=student, exam=self.exam, is_submitted=True, score=score, total_marks=10))
+
+    def _expected(self):
+        """Thống kê tính lại trực tiếp từ các phiên đã nộp"""
+        pcts = [s.score / s.total_marks * 100 for s in StudentExamSession.objects.filter(exam=self.exam,
+                                                                                        is_submitted=True)]
+        histogram = [0] * ExamStatistics.HISTOGRAM_BUCKETS
+        for pct in pcts:
+            histogram[ExamStatistics.bucket_of(pct)] += 1
+        return {
+            'submitted_count': len(pcts),
+            'pass_count': sum(pct >= ExamStatistics.PASS_PERCENTAGE for pct in pcts),
+            'sum_percentage': sum(pcts),
+            'sum_sq_percentage': sum(pct * pct for pct in pcts),
+            'min_percentage': min(pcts),
+            'max_percentage': max(pcts),
+            'histogram': histogram,
+        }
+
+    def _actual(self):
+        stats = ExamStatistics.objects.get(exam=self.exam)
+        fields = ('submitted_count', 'pass_count', 'sum_percentage', 'sum_sq_percentage',
+                  'min_percentage', 'max_percentage')
+        return {**{field: getattr(stats, field) for field in fields}, 'histogram': stats.get_histogram()}
+
+    def test_record_matches_sessions(self):
+        for session in self.sessions:
+            ExamStatistics.record(self.exam.id, session.get_percentage())
+        self.assertEqual(self._actual(), self._expected())
+        stats = ExamStatistics.objects.get(exam=self.exam)
+        self.assertAlmostEqual(stats.mean_percentage, 305 / 6)
+        self.assertEqual(stats.pass_rate, 66.7)
+
+    def test_rebuild_after_double_record(self):
+        for session in self.sessions + self.sessions[:2]:   # Cộng trùng 2 bài (vd. nộp 2 lần trước khi có khoá)
+            ExamStatistics.record(self.exam.id, session.get_percentage())
+        self.assertEqual(self._actual()['submitted_count'], len(self.SCORES) + 2)
+        self.assertNotEqual(self._actual(), self._expected())
+        ExamStatistics.rebuild(self.exam)
+        self.assertEqual(self._actual(), self._expected())
+
+    def test_median_and_rank(self):
+        stats = ExamStatistics.rebuild(self.exam)
+        # Histogram [1,0,0,1,0,2,0,1,0,1]: phần tử thứ 3/6 rơi vào khoảng 50-60%, nội suy giữa khoảng
+        self.assertEqual(stats.median_percentage(), 55.0)
+        self.assertEqual(stats.median_percentage([0] * ExamStatistics.HISTOGRAM_BUCKETS), 0)
+        ranks = [stats.rank_of(session) for session in self.sessions]
+        self.assertEqual(ranks, [6, 5, 3, 3, 2, 1])   # Đồng điểm cùng hạng
+
+
+class PurgeTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)   # Đề đã dựng trong cache theo exam_id, id được dùng lại ở test khác
+        rng = random.Random(0)
+        subject = synthetic.seed_subject('PUR', 'Xoá đề')
+        bank = synthetic.seed_question_bank(subject, 4, rng)
+        students = list(synthetic.seed_students(3, 'pass12345', prefix='pur').values())
+        self.exams = [synthetic.seed_exam(f'PUR_E{n}', subject, bank) for n in (1, 2)]
+        for exam in self.exams:
+            sessions = synthetic.seed_sessions(exam, students, rng, answered=1, submitted=True)
+            StudentAnswerLog.objects.bulk_create([StudentAnswerLog(session_id=session.id, position=k, choice_index=1)
+                                                  for session in sessions for k in range(2)])
+            ExamAnswerArchive.objects.create(exam=exam, item_count=4, session_count=3, payload=b'')
+            SessionDirectory.objects.bulk_create([SessionDirectory(id=session.id, student_id=session.student_id,
+                                                                   exam=exam, shard='default')
+                                                  for session in sessions])
+            ExamAccessToken.objects.bulk_create([ExamAccessToken(exam=exam, student_id=sid) for sid in students])
+
+    def _counts(self, exam):
+        return {model.__name__: model.objects.filter(**{lookup: exam.id}).count()
+                for model, lookup in purge.EXAM_DEPENDENTS}
+
+    def test_purge_every_dependent_in_chunks(self):
+        exam, other = self.exams
+        before = self._counts(exam)
+        self.assertNotIn(0, before.values(), "Mỗi bảng trong EXAM_DEPENDENTS cần có dữ liệu để kiểm tra")
+        self.assertGreater(before['ExamChoice'], 2 * 2)   # Nhiều lô
+        kept = self._counts(other)
+        Exam.objects.filter(id=exam.id).update(deleted_at=timezone.now())
+
+        counts = purge_exam(exam.id, chunk_size=2)
+        self.assertEqual(counts, {**before, 'Exam': 1})
+        self.assertEqual(set(self._counts(exam).values()), {0})
+        self.assertFalse(Exam.objects.filter(id=exam.id).exists())
+        self.assertEqual(self._counts(other), kept)
+        self.assertEqual(purge_exam(exam.id, chunk_size=2)['Exam'], 0)   # Chạy lại an toàn
+
+
+class ArchiveTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        rng = random.Random(0)
+        subject = synthetic.seed_subject('ARC', 'Lưu trữ')
+        self.exam = synthetic.seed_exam('ARC_E1', subject, synthetic.seed_question_bank(subject, 6, rng),
+                                        end_time=timezone.now() + timezone.timedelta(hours=1))
+        students = synthetic.seed_students(3, 'pass12345', prefix='arc')
+        self.sessions = synthetic.seed_sessions(self.exam, students.values(), rng,
+                                                started_at=timezone.now() - timezone.timedelta(hours=2))
+
+    def test_refuses_open_exam(self):
+        with self.assertRaises(archive.ArchiveError):
+            archive.archive_exam(self.exam)
+        call_command('archive_exams', exam=[self.exam.id], stdout=io.StringIO(), stderr=io.StringIO())
+        self.exam.end_time = None
+        with self.assertRaises(archive.ArchiveError):
+            archive.archive_exam(self.exam)
+        self.exam.refresh_from_db()
+        self.assertIsNone(self.exam.archived_at)
+        self.assertFalse(StudentExamSession.objects.filter(exam=self.exam, is_submitted=True).exists())
+        # Đề đã kết thúc nhưng còn phiên chưa tới expires_at -> chưa lưu trữ
+        Exam.objects.filter(id=self.exam.id).update(end_time=timezone.now() - timezone.timedelta(minutes=1))
+        StudentExamSession.objects.filter(id=self.sessions[0].id).update(
+            expires_at=timezone.now() + timezone.timedelta(minutes=5))
+        with self.assertRaises(archive.ArchiveError):
+            archive.archive_exam(Exam.objects.get(id=self.exam.id))
+        self.assertFalse(StudentExamSession.objects.filter(exam=self.exam, is_submitted=True).exists())
+
+    def test_archive_round_trip(self):
+        Exam.objects.filter(id=self.exam.id).update(end_time=timezone.now() - timezone.timedelta(minutes=1))
+        sessions = StudentExamSession.objects.filter(exam=self.exam).select_related('exam').order_by('id')
+        before = {session.id: load_selected(session) for session in sessions}
+        self.assertTrue(any(before.values()))
+        call_command('archive_exams', exam=[self.exam.id], stdout=io.StringIO())
+        self.assertFalse(StudentAnswer.objects.filter(session__exam=self.exam).exists())
+        self.assertFalse(sessions.filter(is_submitted=False).exists())
+        self.assertIsNotNone(Exam.objects.get(id=self.exam.id).archived_at)
+        cache.clear()
+        self.assertEqual({session.id: load_selected(session) for session in sessions.all()}, before)
+        self.assertEqual(self.exam.statistics.submitted_count, len(before))
+
+
+class ReplicaRouterTests(ReplicaMirrorMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        subject = Subject.objects.create(code='DBI', name='Database')
+        cls.exam = Exam.objects.create(code='DBI_E1', subject=subject, duration_minutes=30, question_count=1)
+        question = Question.objects.create(subject=subject, text='Câu 1')
+        item = ExamItem.objects.create(exam=cls.exam, question=question, order=1)
+        ExamChoice.objects.create(item=item, label='A', text='Đúng', is_correct=True)
+        cls.student = User.objects.create_user('sv_router', password='pass12345')
+        UserProfile.objects.create(user=cls.student, role='student', student_id='SV999')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_router_decisions(self):
+        self.assertEqual(router.db_for_read(Exam), 'default')
+        with read_from_replica():
+            self.assertEqual(router.db_for_read(Exam), 'replica')
+            self.assertEqual(router.db_for_read(User), 'default')  # session/user luôn đọc primary
+            self.assertEqual(router.db_for_write(Exam), 'default')
+            with read_from_primary():
+                self.assertEqual(router.db_for_read(Exam), 'default')
+
+    @override_settings(REPLICA_DATABASE_ALIAS='reporting')  # alias chưa khai báo trong DATABASES
+    def test_disabled_without_replica_alias(self):
+        with read_from_replica():
+            self.assertEqual(router.db_for_read(Exam), 'default')
+
+    def test_read_your_writes_after_submit(self):
+        self.client.force_login(self.student)
+        response = self.client.get(reverse('exam_start', kwargs={'exam_id': self.exam.id}))
+        self.assertIn(DB_STICKY_COOKIE, response.cookies)  # Request có ghi -> cookie sticky
+        session = StudentExamSession.objects.get(student=self.student)
+        response = self.client.get(reverse('exam_submit', kwargs={'session_id': session.id}))
+        self.assertIn(DB_STICKY_COOKIE, response.cookies)
+
+        # Còn cookie -> trang kết quả đọc primary
+        response = self.client.get(reverse('exam_result', kwargs={'session_id': session.id}))
+        self.assertEqual(response.context['session']._state.db, 'default')
+        self.assertNotIn(DB_STICKY_COOKIE, response.cookies)  # Chỉ đọc -> không gia hạn cookie
+
+        # Hết hạn cookie -> đọc replica
+        self.client.cookies.pop(DB_STICKY_COOKIE)
+        response = self.client.get(reverse('exam_result', kwargs={'session_id': session.id}))
+        self.assertEqual(response.context['session']._state.db, 'replica')
+
+
+@override_settings(EXAM_SHARDS=['shard0', 'shard1'])
+class ShardingTests(ReplicaMirrorMixin, TestCase):
+    databases = {'default', 'replica', 'shard0', 'shard1'}
+
+    @classmethod
+    def setUpTestData(cls):
+        subject = Subject.objects.create(code='MAE', name='Toán')
+        cls.exams = {}
+        n = 0
+        while len(cls.exams) < 2:   # Mỗi shard 1 đề
+            n += 1
+            exam = Exam.objects.create(code=f'MAE_E{n}', subject=subject, duration_minutes=30, question_count=2)
+            shard = sharding.shard_for_exam(exam.id)
+            if shard in cls.exams:
+                exam.delete()
+                continue
+            for order in (1, 2):
+                question = Question.objects.create(subject=subject, text=f'Câu {order}')
+                item = ExamItem.objects.create(exam=exam, question=question, order=order)
+                ExamChoice.objects.create(item=item, label='A', text='Đúng', is_correct=True)
+                ExamChoice.objects.create(item=item, label='B', text='Sai', is_correct=False)
+            cls.exams[shard] = exam
+        cls.admin = User.objects.create_user('admin_shard', password='pass12345')
+        UserProfile.objects.create(user=cls.admin, role='admin')
+        cls.student = User.objects.create_user('sv_shard', password='pass12345')
+        UserProfile.objects.create(user=cls.student, role='student', student_id='SV777')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.student)
+
+    def _take(self, exam, correct=True):
+        """Bắt đầu, trả lời hết các câu và nộp bài -> phiên thi (đọc từ shard của đề)"""
+        self.client.get(reverse('exam_start', kwargs={'exam_id': exam.id}))
+        session_id = SessionDirectory.objects.get(student=self.student, exam=exam).id
+        for item in exam.items.all():
+            choice = item.choices.get(is_correct=correct)
+            response = self.client.post(reverse('save_answer'), {
+                'session_id': session_id, 'item_id': item.id, 'choice_id': choice.id})
+            self.assertEqual(response.json(), {'success': True})
+        self.client.get(reverse('exam_submit', kwargs={'session_id': session_id}))
+        return StudentExamSession.objects.using(sharding.shard_for_exam(exam.id)).get(id=session_id)
+
+    def test_placement_is_stable(self):
+        for shard, exam in self.exams.items():
+            self.assertEqual(sharding.shard_for_exam(exam.id), shard)
+            self.assertEqual(sharding.write_alias(exam.id), shard)
+        with override_settings(EXAM_SHARDS=[]):
+            self.assertIsNone(sharding.shard_for_exam(self.exams['shard0'].id))
+            self.assertEqual(sharding.write_alias(self.exams['shard0'].id), 'default')
+
+    def test_answers_live_on_exam_shard(self):
+        for shard, exam in self.exams.items():
+            session = self._take(exam, correct=(shard == 'shard0'))
+            self.assertTrue(session.is_submitted)
+            self.assertEqual(session.score, 2 if shard == 'shard0' else 0)
+            self.assertEqual(SessionDirectory.objects.get(id=session.id).shard, shard)
+            self.assertEqual(StudentAnswer.objects.using(shard).filter(session_id=session.id).count(), 2)
+        # Primary chỉ giữ danh bạ, không có bài làm
+        self.assertFalse(StudentExamSession.objects.using('default').exists())
+        self.assertFalse(StudentAnswer.objects.using('default').exists())
+
+        response = self.client.get(reverse('exam_result', kwargs={'session_id': session.id}))
+        self.assertEqual(response.context['session']._state.db, sharding.shard_for_exam(session.exam_id))
+        self.assertEqual(len(response.context['results']), 2)
+
+        # Trang chủ gộp lịch sử từ cả 2 shard, không còn đề nào để làm
+        response = self.client.get(reverse('student_home'))
+        self.assertEqual({s.exam_id for s in response.context['completed_sessions']},
+                         {exam.id for exam in self.exams.values()})
+        self.assertEqual(list(response.context['available_exams']), [])
+
+    def test_second_start_is_rejected(self):
+        exam = self.exams['shard1']
+        self.client.get(reverse('exam_start', kwargs={'exam_id': exam.id}))
+        self.client.get(reverse('exam_start', kwargs={'exam_id': exam.id}))
+        self.assertEqual(StudentExamSession.objects.using('shard1').filter(student=self.student).count(), 1)
+        self.assertEqual(SessionDirectory.objects.filter(student=self.student).count(), 1)
+
+    def test_admin_views_fan_out(self):
+        for exam in self.exams.values():
+            self.client.get(reverse('exam_start', kwargs={'exam_id': exam.id}))
+        self.assertEqual(sharding.count_unsubmitted(), 2)
+        self.assertEqual(counters.reconcile()[counters.ACTIVE_ATTEMPTS], 2)
+
+        self.client.force_login(self.admin)
+        exam = self.exams['shard0']
+        cache.clear()  # Màn hình giám sát đếm lại từ shard
+        response = self.client.get(reverse('exam_proctor_stats', kwargs={'exam_id': exam.id}))
+        self.assertEqual(response.json()['active'], 1)
+        self.assertEqual([row[1] for row in proctoring._roster(exam.id)], ['sv_shard'])
+
+        self.client.post(reverse('exam_delete', kwargs={'exam_id': exam.id}))
+        self.assertEqual(sharding.count_unsubmitted(), 1)  # Đề đã ẩn không tính
+        purge_exam(exam.id)
+        self.assertFalse(StudentExamSession.objects.using('shard0').exists())
+        self.assertFalse(SessionDirectory.objects.filter(exam_id=exam.id).exists())
+        self.assertTrue(StudentExamSession.objects.using('shard1').exists())
+
+
+    def test_ingest_centre_results(self):
+        exam = self.exams['shard1']
+        header = {'format': bundles.RESULTS_FORMAT, 'centre': 'HP02', 'exam': exam.code,
+                  'exam_sha256': bundles.exam_digest(exam)}
+        record = {'student': 'sv_shard', 'start_time': '2025-01-01T08:00:00+00:00',
+                  'end_time': '2025-01-01T08:20:00+00:00', 'is_submitted': True, 'answers': {'1': 'A', '2': 'B'}}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'HP02.jsonl')
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(json.dumps(header) + '\n' + json.dumps(record) + '\n')
+            bundles.ingest_results([path])
+            bundles.ingest_results([path])
+        entry = SessionDirectory.objects.get(student=self.student, exam=exam)
+        session = StudentExamSession.objects.using('shard1').get(id=entry.id)
+        self.assertEqual((entry.shard, session.score, session.total_marks), ('shard1', 1.0, 2.0))
+        self.assertEqual(session.start_time.isoformat(), '2025-01-01T08:00:00+00:00')
+        self.assertEqual(StudentAnswer.objects.using('shard1').filter(session_id=entry.id).count(), 2)
+
+
+class RequestProfilingTests(ReplicaMirrorMixin, TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('admin_prof', password='pass12345')
+        UserProfile.objects.create(user=cls.admin, role='admin')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=1, REQUEST_PROFILING_SLOW_MS=0)
+    def test_sampled_request(self):
+        with self.assertLogs('baseapp.profiling', 'WARNING') as logs:
+            response = self.client.get(reverse('admin_home'))
+        self.assertRegex(response['Server-Timing'],
+                         r'^db;dur=[\d.]+;desc="[1-9]\d* queries", tpl;dur=[\d.]+, view;dur=[\d.]+, total;dur=[\d.]+$')
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual((record['view'], record['status']), ('admin_home', 200))
+        self.assertGreater(record['template_ms'], 0)
+        self.assertTrue(record['top_queries'])
+        self.assertLessEqual(sum(q['count'] for q in record['top_queries']), record['queries'])
+
+    @override_settings(REQUEST_PROFILING_SAMPLE_RATE=0, REQUEST_PROFILING_SLOW_MS=0)
+    def test_unsampled_request(self):
+        with self.assertLogs('baseapp.profiling', 'WARNING') as logs:
+            response = self.client.get(reverse('admin_home'))
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('top_queries', json.loads(logs.records[0].getMessage()))
+
+
+class BenchmarkTests(ReplicaMirrorMixin, TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)   # Đề sinh ra bị rollback, id đề dùng lại ở test sau -> không để lại cache
+
+    def test_synthetic_template_docx(self):
+        meta, items = _parse_template_docx(synthetic.template_docx(7, random.Random(3), 'PRN', image_every=3))
+        self.assertEqual((meta['subject'], meta['topic_code'], meta['num_quiz']), ('PRN', 'T01-V01', 7))
+        self.assertEqual(len(items), 7)
+        self.assertEqual([bool(q['image']) for q in items], [True, False, False, True, False, False, True])
+        self.assertTrue(all(len(q['choices']) == 4 and q['answer'] for q in items))
+
+    def test_run_suite_and_compare(self):
+        params = {'questions': 4, 'bank': 12, 'exam_questions': 5, 'sessions': 3, 'results': 2, 'repeat': 1}
+        with tempfile.TemporaryDirectory() as media, override_settings(MEDIA_ROOT=media):
+            results = benchmarks.run_suite(params)
+        self.assertEqual(list(results), list(benchmarks.CASES))
+        self.assertTrue(all(r['runs'] == 1 and r['peak_kb'] > 0 for r in results.values()))
+        self.assertEqual(StudentExamSession.objects.filter(is_submitted=True).count(), 3 * 3)
+
+        baseline = {'results': {'exam_submit': {'median_ms': 100.0, 'peak_kb': 1000},
+                                'exam_result': {'median_ms': 0.2, 'peak_kb': 1000}}}
+        current = {'exam_submit': {'median_ms': 130.0, 'peak_kb': 1010},
+                   'exam_result': {'median_ms': 0.5, 'peak_kb': 900}}
+        self.assertEqual([r[:2] for r in benchmarks.compare(current, baseline, 0.2)], [('exam_submit', 'median_ms')])
+        self.assertEqual(benchmarks.compare(current, baseline, 0.5), [])
+
+    def test_session_workload(self):
+        subject = synthetic.seed_subject('SES', 'Sessions')
+        bank = synthetic.seed_question_bank(subject, 4, random.Random(1))
+        usernames = sorted(synthetic.seed_students(2, 'pass12345', prefix='ses'))
+        totals = {engine: benchmarks.session_workload(engine, synthetic.seed_exam(f'SES_{engine}', subject, bank),
+                                                      usernames, 'pass12345', answers=4)
+                  for engine in ('db', 'cached_db')}
+        self.assertEqual(totals['db']['save_answer']['requests'], 2 * 4)
+        self.assertEqual(totals['db']['save_answer']['session_reads'], 2 * 4)
+        for engine in ('db', 'cached_db'):   # Lưu đáp án không ghi lại phiên
+            self.assertEqual(sum(row['session_writes'] for name, row in totals[engine].items() if name != 'login'), 0)
+        self.assertEqual(sum(row['session_reads'] for name, row in totals['cached_db'].items() if name != 'login'), 0)
+
+    def test_seed_data(self):
+        options = {'subjects': 2, 'questions': 30, 'exams': 6, 'exam_questions': 5, 'students': 12,
+                   'sessions_per_exam': 4, 'days': 2, 'seed': 5, 'stdout': io.StringIO()}
+        for prefix in ('sa', 'sb'):
+            call_command('seed_data', prefix=prefix, **options)
+        self.assertEqual(Question.objects.filter(subject__code__startswith='SA').count(), 30)
+        self.assertEqual(ExamItem.objects.filter(exam__code__startswith='SA_').count(), 6 * 5)
+        sessions = StudentExamSession.objects.filter(exam__code__startswith='SA_')
+        self.assertEqual(sessions.count(), 6 * 4)
+        for session in sessions.filter(is_submitted=True).select_related('exam'):
+            self.assertIsNotNone(session.result_snapshot)
+            self.assertLessEqual(session.exam.start_time, session.start_time)
+            self.assertLess(session.start_time, session.end_time)
+        self.assertEqual(ExamStatistics.objects.aggregate(n=Sum('submitted_count'))['n'],
+                         StudentExamSession.objects.filter(is_submitted=True).count())
+        self.assertEqual(SiteCounter.objects.get(name=counters.ACTIVE_ATTEMPTS).value,
+                         StudentExamSession.objects.filter(is_submitted=False).count())
+
+        # Cùng seed -> cùng dữ liệu (chỉ khác tiền tố)
+        def scores(prefix):
+            return list(StudentExamSession.objects.filter(exam__code__startswith=f'{prefix}_')
+                        .order_by('exam__code', 'student__username').values_list('score', 'is_submitted'))
+        self.assertEqual(scores('SA'), scores('SB'))
+        with self.assertRaises(CommandError):
+            call_command('seed_data', prefix='sa', **options)
+
+
+class RosterTests(TestCase):
+
+    def test_read_xlsx(self):
+        rows = [['STT', 'MSSV', 'Họ và tên', 'Mật khẩu'], [1, 20210001, 'Trần Thị Bình', 'abc123'],
+                [2, 'SV002', 'An', ''], ['', '', '', '']]
+        records = roster.read_roster(b''.join(exports.stream_xlsx(rows)), 'K68.xlsx')
+        self.assertEqual(records, [
+            (2, {'student_id': '20210001', 'name': 'Trần Thị Bình', 'password': 'abc123'}),
+            (3, {'student_id': 'SV002', 'name': 'An', 'password': ''}),
+        ])
+        with self.assertRaises(roster.RosterError):
+            roster.read_roster('mssv,họ tên\nSV1,A\n'.encode(), 'thieu_cot.csv')
+
+    def test_import_roster_upserts_by_student_id(self):
+        existing = User.objects.create_user('sv001', password='changed', first_name='Cũ')
+        UserProfile.objects.create(user=existing, role='student', student_id='SV001')
+        User.objects.create_user('sv003')   # Trùng tên đăng nhập, không phải học sinh SV003
+        data = ('\ufeffMSSV,Họ tên,Mật khẩu\n'
+                'SV001,Nguyễn Văn An,init1\nSV002,Lê Bình,init2\nSV003,Phạm C,init3\nsv002,X,init4\n').encode()
+        with roster.hash_pool(2) as pool:
+            report = roster.import_roster(roster.read_roster(data, 'k68.csv'), pool, batch_size=2)
+        self.assertEqual((report.created, report.updated), (1, 1))
+        self.assertEqual([number for number, _ in report.errors], [4, 5])
+        existing.refresh_from_db()
+        self.assertEqual((existing.first_name, existing.last_name), ('An', 'Nguyễn Văn'))
+        self.assertTrue(existing.check_password('changed'))   # Không ghi đè mật khẩu đã đổi
+        created = User.objects.get(username='sv002')
+        self.assertTrue(created.check_password('init2'))
+        self.assertEqual((created.userprofile.role, created.userprofile.student_id), ('student', 'SV002'))
+
+        passwords = [f'pw{i}' for i in range(roster.PARALLEL_MIN_PASSWORDS)]
+        with roster.hash_pool(2) as pool:
+            hashed = roster.hash_passwords(passwords, pool)
+        self.assertEqual(len(set(hashed)), len(passwords))   # Salt riêng từng mật khẩu
+        report = roster.import_roster(roster.read_roster(data, 'k68.csv'), reset_passwords=True)
+        self.assertEqual((report.created, report.updated, report.passwords_reset), (0, 2, 2))
+        existing.refresh_from_db()
+        self.assertTrue(existing.check_password('init1'))
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        self.addCleanup(setattr, metrics, '_store', metrics._store)
+        metrics._store = None
+        self.directory = tempfile.mkdtemp(prefix='exammanagement-metrics-')
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        override = override_settings(METRICS_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _worker_file(self, pid, **values):
+        """File số liệu giả của 1 worker khác: {tên số liệu: giá trị ô đầu tiên}"""
+        size, digest = metrics._get_layout()
+        slots = [0.0] * size
+        for name, value in values.items():
+            slots[metrics._BY_NAME[name].offset] = value
+        with open(os.path.join(self.directory, f'metrics_{pid}.db'), 'wb') as f:
+            f.write(digest + struct.pack(f'{size}d', *slots))
+
+    def test_aggregates_worker_files(self):
+        metrics.inc(metrics.SUBMISSIONS, 2)
+        metrics.observe(metrics.SAVE_ANSWER, 0.02)
+        self.assertTrue(os.path.exists(os.path.join(self.directory, f'metrics_{os.getpid()}.db')))
+        dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+        dead.wait()
+        self._worker_file(os.getppid(), exam_submissions_total=3, db_pool_connections_in_use=4)
+        self._worker_file(dead.pid, exam_submissions_total=5, db_pool_connections_in_use=7)
+        collected = {metric.name: (metric, values) for metric, values in metrics.collect()}
+        metric, values = collected[metrics.SUBMISSIONS]
+        self.assertEqual(values[metric.offset], 10)   # Bộ đếm: cộng cả process đã thoát
+        metric, values = collected['db_pool_connections_in_use']
+        self.assertEqual(values[metric.offset], 4)    # Gauge: chỉ process còn sống
+        body = metrics.render()
+        self.assertIn('exam_save_answer_seconds_bucket{le="0.025"} 1', body)
+        self.assertIn('exam_save_answer_seconds_bucket{le="+Inf"} 1', body)
+
+
+class LoadTestTests(LiveServerTestCase):
+    # DB test SQLite trong bộ nhớ: server test dùng chung 1 connection -> học sinh ảo chạy lần lượt (concurrency=1)
+
+    def test_virtual_students_complete_exam(self):
+        rng = random.Random(7)
+        subject = synthetic.seed_subject('LOAD', 'Tải')
+        exam = synthetic.seed_exam('LOAD_E1', subject, synthetic.seed_question_bank(subject, 5, rng))
+        usernames = list(synthetic.seed_students(3, 'pass12345', prefix='lt'))
+        items = [(item.id, list(item.choices.values_list('id', flat=True))) for item in exam.items.all()]
+        report = loadtest.run_load(self.live_server_url, exam.id, items, usernames, 'pass12345', duration=1,
+                                   think_time=0.05, ramp_up=0, submit_spread=0, concurrency=1)
+        self.assertEqual((report['completed'], report['errors']), (3, 0))
+        self.assertEqual(report['endpoints']['exam_submit']['statuses'], {'302': 3})
+        self.assertGreater(report['endpoints']['save_answer']['count'], 0)
+        self.assertEqual(StudentExamSession.objects.filter(exam=exam, is_submitted=True).count(), 3)
+
+
+class ConnectionPoolTests(TestCase):
+    databases = set()
+
+    def test_reuse_limit_and_timeout(self):
+        pool = ConnectionPool('test', max_size=2, timeout=0.01, recycle=60, ping_after=60)
+        first = pool.acquire(lambda: sqlite3.connect(':memory:', check_same_thread=False))
+        second = pool.acquire(lambda: sqlite3.connect(':memory:', check_same_thread=False))
+        with self.assertRaises(OperationalError):   # Hết chỗ -> chờ TIMEOUT rồi báo lỗi
+            pool.acquire(lambda: sqlite3.connect(':memory:'))
+        pool.release(first)
+        self.assertIs(pool.acquire(lambda: None), first)   # Dùng lại connection vừa trả
+        pool.release(second, reusable=False)               # Connection lỗi -> đóng, nhường chỗ mở mới
+        third = pool.acquire(lambda: sqlite3.connect(':memory:', check_same_thread=False))
+        self.assertIsNot(third, second)
+        self.assertEqual(pool.stats, {'created': 3, 'reused': 1, 'waited': 1, 'timeouts': 1, 'discarded': 1})
+        pool.release(first)
+        pool.release(third)
+        pool.close_all()
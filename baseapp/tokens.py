@@ -0,0 +1,127 @@
+# tokens.py
+# Mã vào thi dùng 1 lần (ExamAccessToken) cho lúc chuông vào thi: hàng trăm học sinh đăng nhập cùng lúc, mỗi lần
+# authenticate băm PBKDF2 vài trăm ms -> CPU quá tải. Giám thị cấp mã trước cho từng học sinh của 1 đề;
+# học sinh nhập mã (hoặc quét QR chứa link /access/?code=...) là được đăng nhập và vào thẳng exam_start.
+# - Mã = id token + HMAC(SECRET_KEY, id + đề + học sinh) rút gọn. Redeem: 1 truy vấn đọc token theo id rồi kiểm tra
+#   HMAC với đề/học sinh của chính dòng đó (so sánh thời gian hằng) + 1 UPDATE đánh dấu đã dùng (chỉ thắng 1 lần).
+#   id bị dùng lại (AUTO_INCREMENT đặt lại sau khi khởi động lại InnoDB < 8.0, khôi phục bảng từ bản sao lưu)
+#   thì mã in cũ không khớp dòng mới -> không đăng nhập nhầm học sinh khác
+# - DB chỉ lưu id/đề/học sinh, không lưu mã; cấp lại cho cùng học sinh -> token mới (id mới), mã cũ mất hiệu lực
+# - Hết hạn lúc exam.end_time (đề phải có giờ kết thúc mới cấp được mã)
+import hmac
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+from django.utils.crypto import salted_hmac
+
+from .models import ExamAccessToken
+
+KEY_SALT = 'baseapp.tokens.exam-access'
+ALPHABET = '23456789ABCDEFGHJKLMNPQRSTUVWXYZ'   # Base32 bỏ 0/1/I/O cho dễ đọc, dễ gõ
+MAC_LENGTH = 10                              # 50 bit
+GROUP = 4                                    # Hiển thị XXXX-XXXX-...
+
+
+class TokenError(Exception):
+    pass
+
+
+def _encode(number, length=None):
+    digits = []
+    while number or not digits:
+        number, digit = divmod(number, len(ALPHABET))
+        digits.append(ALPHABET[digit])
+    return ''.join(reversed(digits)).rjust(length or 0, ALPHABET[0])
+
+
+def _mac(token_id, exam_id, student_id):
+    message = f'{token_id}:{exam_id}:{student_id}'
+    digest = int.from_bytes(salted_hmac(KEY_SALT, message, algorithm='sha256').digest()[:8], 'big')
+    return _encode(digest >> (64 - 5 * MAC_LENGTH), MAC_LENGTH)
+
+
+def make_code(token):
+    """Mã hiển thị của token: '<id><mac>' chia nhóm 4 ký tự"""
+    raw = _encode(token.id) + _mac(token.id, token.exam_id, token.student_id)
+    return '-'.join(raw[i:i + GROUP] for i in range(0, len(raw), GROUP))
+
+
+def parse_code(code):
+    """
+    Mã (không phân biệt hoa thường, bỏ qua '-'/khoảng trắng) -> (id token, mac); sai định dạng -> None.
+    mac chỉ kiểm tra được khi đã có dòng token (check_code)
+    """
+    raw = ''.join((code or '').split()).replace('-', '').upper()
+    if len(raw) <= MAC_LENGTH or any(ch not in ALPHABET for ch in raw):
+        return None
+    token_id = 0
+    for ch in raw[:-MAC_LENGTH]:
+        token_id = token_id * len(ALPHABET) + ALPHABET.index(ch)
+    return token_id, raw[-MAC_LENGTH:]
+
+
+def check_code(token, mac):
+    return hmac.compare_digest(mac, _mac(token.id, token.exam_id, token.student_id))
+
+
+def issue_tokens(exam, students):
+    """
+    Cấp mã mới cho các học sinh (User) của đề, thay mã cũ nếu có. Trả về [(học sinh, mã)] theo thứ tự students
+    """
+    if exam.end_time is None:
+        raise TokenError('Đề chưa có giờ kết thúc - đặt lịch thi trước khi cấp mã vào thi')
+    if exam.end_time <= timezone.now():
+        raise TokenError('Đề đã hết giờ thi')
+    students = list({student.id: student for student in students}.values())
+    ids = [student.id for student in students]
+    with transaction.atomic():
+        ExamAccessToken.objects.filter(exam=exam, student_id__in=ids).delete()
+        ExamAccessToken.objects.bulk_create([ExamAccessToken(exam=exam, student=student) for student in students])
+        # MySQL không trả id từ bulk_create -> đọc lại theo cặp (đề, học sinh) duy nhất
+        tokens = {token.student_id: token for token in
+                  ExamAccessToken.objects.filter(exam=exam, student_id__in=ids).only('id', 'exam_id', 'student_id')}
+    return [(student, make_code(tokens[student.id])) for student in students]
+
+
+def issued_codes(exam):
+    """Các mã còn hiệu lực (chưa dùng) của đề: [(học sinh, mã)] theo tài khoản"""
+    tokens = (ExamAccessToken.objects.filter(exam=exam, used_at__isnull=True)
+              .select_related('student__userprofile').order_by('student__username'))
+    return [(token.student, make_code(token)) for token in tokens]
+
+
+def redeem(code):
+    """
+    Dùng mã vào thi: đúng HMAC, chưa dùng, đề đang mở, tài khoản còn hoạt động -> đánh dấu đã dùng, trả về token
+    (kèm exam, student). Không hợp lệ -> TokenError
+    """
+    parsed = parse_code(code)
+    if parsed is None:
+        raise TokenError('Mã vào thi không đúng')
+    token_id, mac = parsed
+    token = (ExamAccessToken.objects.select_related('exam', 'student__userprofile')
+             .filter(id=token_id).first())
+    if token is None or not check_code(token, mac):
+        # Không có dòng, hoặc id đã thuộc về token khác (cấp lại, id bị dùng lại) -> cùng 1 thông báo
+        raise TokenError('Mã vào thi không đúng hoặc không còn hiệu lực')
+    if token.used_at:
+        raise TokenError('Mã vào thi đã được sử dụng')
+    if not token.exam.is_available_now():
+        raise TokenError('Đề thi chưa mở, đã hết giờ hoặc không còn tồn tại')
+    if not token.student.is_active:
+        raise TokenError('Tài khoản đã bị khoá')
+    now = timezone.now()
+    if not ExamAccessToken.objects.filter(id=token.id, used_at__isnull=True).update(used_at=now):
+        raise TokenError('Mã vào thi đã được sử dụng')   # Dùng đồng thời ở 2 máy: chỉ 1 request thắng
+    token.used_at = now
+    return token
+
+
+def students_by_id(student_ids):
+    """Danh sách MSSV -> ([học sinh theo thứ tự danh sách], [MSSV không tìm thấy])"""
+    wanted = list(dict.fromkeys(sid.strip() for sid in student_ids if sid.strip()))
+    users = {user.userprofile.student_id: user for user in
+             User.objects.filter(userprofile__role='student', userprofile__student_id__in=wanted)
+             .select_related('userprofile')}
+    return [users[sid] for sid in wanted if sid in users], [sid for sid in wanted if sid not in users]
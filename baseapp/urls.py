@@ -11,27 +11,42 @@
 
 from django.urls import path
 from . import views
+from .access import admin_api, admin_only, login_only, public
 
+# Quyền truy cập khai báo tại đây (baseapp/access.py), view không tự kiểm tra role
 urlpatterns = [
     # Authentication
-    path('', views.login_view, name="login"),
-    path('logout/', views.logout_view, name="logout"),
+    path('', public(views.login_view), name="login"),
+    path('logout/', public(views.logout_view), name="logout"),
+    path('access/', public(views.exam_access), name="exam_access"),
     
     # Admin URLs
-    path('admin/home/', views.admin_home, name="admin_home"),
-    path('admin/import/', views.import_docx, name="import_docx"),
-    path('admin/exam/create/', views.exam_create, name='exam_create'),
-    path('admin/exam/<int:exam_id>/', views.exam_preview, name='exam_preview'),
-    path('admin/exam/<int:exam_id>/schedule/', views.exam_schedule, name='exam_schedule'),
-    path('admin/exam/<int:exam_id>/delete/', views.exam_delete, name='exam_delete'),
+    path('admin/home/', admin_only(views.admin_home), name="admin_home"),
+    path('admin/exams/', admin_api(views.admin_exam_list), name="admin_exam_list"),
+    path('admin/questions/', admin_only(views.question_bank), name="question_bank"),
+    path('admin/import/', admin_only(views.import_docx), name="import_docx"),
+    path('admin/exam/create/', admin_only(views.exam_create), name='exam_create'),
+    path('admin/exam/<int:exam_id>/', admin_only(views.exam_preview), name='exam_preview'),
+    path('admin/exam/<int:exam_id>/schedule/', admin_only(views.exam_schedule), name='exam_schedule'),
+    path('admin/exam/<int:exam_id>/tokens/', admin_only(views.exam_access_tokens), name='exam_access_tokens'),
+    path('admin/exam/<int:exam_id>/delete/', admin_only(views.exam_delete), name='exam_delete'),
+    path('admin/exam/<int:exam_id>/proctor/', admin_only(views.exam_proctor), name='exam_proctor'),
+    path('admin/exam/<int:exam_id>/proctor/stats/', admin_api(views.exam_proctor_stats), name='exam_proctor_stats'),
+    path('admin/exam/<int:exam_id>/results/export/', admin_only(views.exam_results_export), name='exam_results_export'),
+    path('admin/exam/<int:exam_id>/papers/', admin_only(views.exam_papers_export), name='exam_papers_export'),
+    path('admin/exam/<int:exam_id>/bundle/', admin_only(views.exam_bundle_export), name='exam_bundle_export'),
+    path('admin/subject/<int:subject_id>/results/export/', admin_only(views.subject_results_export), name='subject_results_export'),
     
     # Student URLs
-    path('student/home/', views.student_home, name="student_home"),
-    path('student/exam/<int:exam_id>/start/', views.exam_start, name='exam_start'),
-    path('student/exam/session/<int:session_id>/', views.exam_taking, name='exam_taking'),
-    path('student/exam/session/<int:session_id>/submit/', views.exam_submit, name='exam_submit'),
-    path('student/exam/session/<int:session_id>/result/', views.exam_result, name='exam_result'),
+    path('student/home/', login_only(views.student_home), name="student_home"),
+    path('student/exam/<int:exam_id>/start/', login_only(views.exam_start), name='exam_start'),
+    path('student/exam/session/<int:session_id>/', login_only(views.exam_taking), name='exam_taking'),
+    path('student/exam/session/<int:session_id>/submit/', login_only(views.exam_submit), name='exam_submit'),
+    path('student/exam/session/<int:session_id>/result/', login_only(views.exam_result), name='exam_result'),
     
     # AJAX
-    path('ajax/save-answer/', views.save_answer, name='save_answer'),
+    path('ajax/save-answer/', login_only(views.save_answer), name='save_answer'),
+    
+    # Giám sát (Prometheus)
+    path('metrics/', public(views.metrics_view), name='metrics'),
 ]
\ No newline at end of file
@@ -1,11 +1,14 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import authenticate, login as auth_login, logout
-from django.contrib.auth.decorators import login_required
 from django.views.decorators.http import require_http_methods
 from django.db import transaction
+from django.db.models import Q, prefetch_related_objects
 from django.utils import timezone
-from django.http import JsonResponse
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse, StreamingHttpResponse
+from datetime import timezone as dt_timezone
 from io import BytesIO
 from docx import Document
 from random import sample, shuffle
@@ -13,7 +16,12 @@ import re, zipfile, os
 from django.core.files.base import ContentFile
 from django.core.files.storage import default_storage
 from .models import (Subject, Question, Choice, Exam, ExamItem, ExamChoice, 
-                    StudentExamSession, StudentAnswer, UserProfile)
+                    StudentExamSession, UserProfile, ExamStatistics, SessionDirectory)
+from . import access, bundles, counters, exports, metrics, papers, proctoring, search, sharding, tokens
+from .purge import purge_exam_in_background
+from .routers import use_replica
+from .grading import (get_exam_paper, grade_session, build_results, invalidate_exam_paper, submit_session,
+                      load_selected, locate_choice, save_vector_answer)
 from docx.oxml.text.paragraph import CT_P
 from docx.oxml.table import CT_Tbl
 from docx.text.paragraph import Paragraph
@@ -29,17 +37,11 @@ def login_view(request):
         user = authenticate(request, username=username, password=password)
         if user is not None:
             auth_login(request, user)
-            # Phân quyền theo role
-            try:
-                profile = user.userprofile
-                if profile.role == 'admin':
-                    return redirect('admin_home')
-                else:
-                    return redirect('student_home')
-            except UserProfile.DoesNotExist:
+            # Phân quyền theo role (profile đã lấy kèm khi xác thực - access.CachedModelBackend)
+            if access.user_role(user) is None:
                 # Tạo profile mặc định nếu chưa có
                 UserProfile.objects.create(user=user, role='student')
-                return redirect('student_home')
+            return redirect(access.home_url(user))
         else:
             messages.error(request, 'Tên đăng nhập hoặc mật khẩu không đúng')
     
@@ -49,41 +51,143 @@ def logout_view(request):
     logout(request)
     return redirect('login')
 
+def exam_access(request):
+    """Vào thi bằng mã dùng 1 lần do giám thị cấp (baseapp/tokens.py): đăng nhập không cần mật khẩu, vào thẳng đề"""
+    code = request.POST.get('code') or request.GET.get('code') or ''
+    if request.method == 'POST':
+        try:
+            token = tokens.redeem(code)
+        except tokens.TokenError as exc:
+            messages.error(request, str(exc))
+        else:
+            auth_login(request, token.student, backend=settings.AUTHENTICATION_BACKENDS[0])
+            return redirect('exam_start', exam_id=token.exam_id)
+    return render(request, 'exam_access.html', {'code': code})
+
+# ===== PHÂN TRANG KEYSET =====
+_EPOCH = timezone.datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+def _encode_cursor(moment, pk):
+    """Con trỏ phân trang keyset: '<thời điểm tính bằng micro giây>-<id>'"""
+    delta = moment - _EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+    return f"{micros}-{pk}"
+
+def _decode_cursor(cursor):
+    try:
+        micros, pk = (int(x) for x in cursor.split('-', 1))
+    except (ValueError, AttributeError):
+        return None
+    return _EPOCH + timezone.timedelta(microseconds=micros), pk
+
 # ===== ADMIN VIEWS =====
-# @login_required
+EXAM_PAGE_SIZE = 25
+
+def _exam_listing(params):
+    """
+    Danh sách đề thi cho trang quản trị: lọc theo môn/trạng thái/mã đề,
+    phân trang keyset theo (created_at, id) giảm dần. Trả về (exams, next_cursor).
+    """
+    exams = Exam.objects.visible().select_related('subject').order_by('-created_at', '-id')
+    if (params.get('subject') or '').isdigit():
+        exams = exams.filter(subject_id=params.get('subject'))
+    if params.get('status') == 'active':
+        exams = exams.filter(is_active=True)
+    elif params.get('status') == 'inactive':
+        exams = exams.filter(is_active=False)
+    if params.get('q'):
+        exams = exams.filter(code__icontains=params.get('q').strip())
+    cursor = _decode_cursor(params.get('after'))
+    if cursor:
+        created_at, exam_id = cursor
+        exams = exams.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=exam_id))
+    page = list(exams[:EXAM_PAGE_SIZE + 1])
+    next_cursor = None
+    if len(page) > EXAM_PAGE_SIZE:
+        last = page[EXAM_PAGE_SIZE - 1]
+        next_cursor = _encode_cursor(last.created_at, last.id)
+    return page[:EXAM_PAGE_SIZE], next_cursor
+
+@use_replica
 def admin_home(request):
     """Trang chủ admin"""
-    # Kiểm tra quyền admin
-    if not hasattr(request.user, 'userprofile') or request.user.userprofile.role != 'admin':
-        return redirect('student_home')
-    
-    # Lấy thống kê
-    subjects = Subject.objects.all()
-    all_exams = Exam.objects.select_related('subject').order_by('-created_at')
-    recent_exams = all_exams[:5]
-    
-    # Tính toán thống kê
+    # Thống kê lấy từ bộ đếm tổng hợp (1 truy vấn) thay vì COUNT(*) trên từng bảng
+    counts = counters.get_counters()
     stats = {
-        'total_subjects': subjects.count(),
-        'total_questions': Question.objects.count(),
-        'total_exams': all_exams.count(),
-        'active_attempts': StudentExamSession.objects.filter(is_submitted=False).count()
+        'total_subjects': counts[counters.SUBJECTS],
+        'total_questions': counts[counters.QUESTIONS],
+        'total_exams': counts[counters.EXAMS],
+        'active_attempts': counts[counters.ACTIVE_ATTEMPTS],
     }
     
+    # Trang đầu của danh sách đề thi; các trang sau tải qua admin_exam_list (JSON)
+    all_exams, next_cursor = _exam_listing(request.GET)
+    
     return render(request, 'admin_home.html', {
-        'subjects': subjects, 
-        'exams': recent_exams,
+        'subjects': Subject.objects.order_by('code'), 
+        'exams': all_exams[:5],
         'all_exams': all_exams,
+        'next_cursor': next_cursor,
+        'filters': request.GET,
         'stats': stats
     })
 
-@login_required
+@use_replica
+def admin_exam_list(request):
+    """Trang tiếp theo của danh sách đề thi (AJAX, phân trang keyset)"""
+    exams, next_cursor = _exam_listing(request.GET)
+    return JsonResponse({
+        'exams': [{
+            'id': exam.id,
+            'code': exam.code,
+            'subject': exam.subject.name,
+            'question_count': exam.question_count,
+            'duration_minutes': exam.duration_minutes,
+            'is_active': exam.is_active,
+            'created_at': timezone.localtime(exam.created_at).strftime('%d/%m/%Y %H:%M'),
+        } for exam in exams],
+        'next': next_cursor,
+    })
+
+@use_replica
+def question_bank(request):
+    """Ngân hàng câu hỏi: tìm toàn văn (gõ có dấu hay không dấu), lọc theo môn/chương/mức độ - xem search.py"""
+    params = request.GET
+    subject_id = params.get('subject') if (params.get('subject') or '').isdigit() else None
+    page = int(params['page']) if (params.get('page') or '').isdigit() else 1
+    before = int(params['before']) if (params.get('before') or '').isdigit() else None
+    questions, next_page = search.search_questions(params.get('q', ''), subject_id, params.get('unit'),
+                                                   params.get('level'), page, before)
+    
+    # Chương/mức độ của môn đang chọn (đọc từ index môn -> chương -> mức độ)
+    units, levels = [], []
+    if subject_id:
+        bank = Question.objects.filter(subject_id=subject_id)
+        units = bank.order_by('unit').values_list('unit', flat=True).distinct()
+        levels = bank.order_by('level').values_list('level', flat=True).distinct()
+    
+    next_url = None
+    if next_page:
+        query = params.copy()
+        for key in ('page', 'before'):
+            query.pop(key, None)
+        for key, value in next_page.items():
+            query[key] = value
+        next_url = f"?{query.urlencode()}"
+    
+    return render(request, 'question_bank.html', {
+        'subjects': Subject.objects.order_by('code'),
+        'units': units,
+        'levels': levels,
+        'questions': questions,
+        'filters': params,
+        'next_url': next_url,
+    })
+
+@metrics.timed(metrics.IMPORT_DOCX, method='POST')
 @require_http_methods(["GET", "POST"])
 def import_docx(request):
     """Import đề thi từ file docx (giữ nguyên code cũ)"""
-    if not hasattr(request.user, 'userprofile') or request.user.userprofile.role != 'admin':
-        return redirect('student_home')
-    
     subjects = Subject.objects.all()
     if request.method == "POST":
         file = request.FILES.get("file")
@@ -130,88 +234,91 @@ def import_docx(request):
             messages.error(request, f"Mã đề '{exam_code}' đã tồn tại.")
             return redirect("import_docx")
 
-        # Helper: lưu file đúng tên (overwrite nếu trùng tên)
-        def save_binary_exact(filename: str, data: bytes) -> str:
-            if default_storage.exists(filename):
-                default_storage.delete(filename)
-            return default_storage.save(filename, ContentFile(data))
-
         warns = []
-        with transaction.atomic():
-            created_qs = []
-
-            # 4) Tạo Question/Choice và LƯU ẢNH trực tiếp từ docx theo quy tắc tên
-            for q in items:
-                qobj = Question.objects.create(
-                    subject=subject,
-                    text=q.get("text") or "",
-                    mark=q.get("mark") or 1.0,
-                    unit=q.get("unit") or ""
-                )
+        # 4) + 5) Lưu câu hỏi, ảnh và đề
+        exam = _save_imported_exam(subject, exam_code, duration_minutes, items)
 
-                # Lưu ảnh (nếu parser có): q["image"] (bytes), q["image_name"] (tên gốc trong docx)
-                blob = q.get("image")
-                orig = (q.get("image_name") or "").strip()
-                if blob:
-                    # Lấy phần mở rộng từ tên gốc; fallback .jpg
-                    ext = os.path.splitext(orig)[1].lower() or '.jpg'
-                    if ext not in {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp'}:
-                        ext = '.jpg'
-
-                    # QN từ tài liệu; nếu thiếu, dùng thứ tự hiện tại
-                    qn = q.get('id') or (len(created_qs) + 1)
-                    # Tên file theo yêu cầu: subjectId_examCode_Q{soThuTu}.{ext}
-                    safe_exam = re.sub(r'[^A-Za-z0-9_-]+', '-', exam_code)
-                    filename = f"{subject.id}_{safe_exam}_Q{qn}{ext}"
-
-                    saved = save_binary_exact(filename, blob)
-                    # ImageField lưu relative path trong MEDIA_ROOT
-                    qobj.image.name = saved
-                    qobj.save(update_fields=["image"])
-
-                # Lưu lựa chọn A–D
-                for label, text in (q.get("choices") or []):
-                    Choice.objects.create(
-                        question=qobj, label=label, text=text,
-                        is_correct=(label == q.get("answer"))
-                    )
+        metrics.inc(metrics.IMPORTED_QUESTIONS, exam.question_count)
+        msg = f"Đã import {exam.question_count} câu hỏi cho {subject}. Tạo đề '{exam.code}'."
+        messages.success(request, msg)
+        if warns or '_num_quiz_mismatch' in meta:
+            messages.warning(request, "Lưu ý: File có thể không đúng định dạng chuẩn. Vui lòng kiểm tra lại template DOCX.")
+        return redirect('exam_preview', exam_id=exam.id)
 
-                created_qs.append((qobj, bool(q.get("mix"))))
+    return render(request, "import_docx.html", {"subjects": subjects})
 
-            # 5) Tạo Exam + ExamItem + ExamChoice (trộn đáp án nếu mix=True)
-            exam = Exam.objects.create(
-                code=exam_code,
+def _save_imported_exam(subject, exam_code, duration_minutes, items):
+    """Bước lưu của import docx: Question/Choice + ảnh, rồi Exam/ExamItem/ExamChoice. Trả về đề"""
+    # Helper: lưu file đúng tên (overwrite nếu trùng tên)
+    def save_binary_exact(filename: str, data: bytes) -> str:
+        if default_storage.exists(filename):
+            default_storage.delete(filename)
+        return default_storage.save(filename, ContentFile(data))
+
+    with transaction.atomic():
+        created_qs = []
+
+        # 4) Tạo Question/Choice và LƯU ẢNH trực tiếp từ docx theo quy tắc tên
+        for q in items:
+            qobj = Question.objects.create(
                 subject=subject,
-                duration_minutes=duration_minutes,
-                question_count=len(created_qs),
+                text=q.get("text") or "",
+                mark=q.get("mark") or 1.0,
+                unit=q.get("unit") or ""
             )
-            for idx, (qobj, mix) in enumerate(created_qs, start=1):
-                item = ExamItem.objects.create(
-                    exam=exam, question=qobj, order=idx, mix_choices=mix
+
+            # Lưu ảnh (nếu parser có): q["image"] (bytes), q["image_name"] (tên gốc trong docx)
+            blob = q.get("image")
+            orig = (q.get("image_name") or "").strip()
+            if blob:
+                # Lấy phần mở rộng từ tên gốc; fallback .jpg
+                ext = os.path.splitext(orig)[1].lower() or '.jpg'
+                if ext not in {'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp'}:
+                    ext = '.jpg'
+
+                # QN từ tài liệu; nếu thiếu, dùng thứ tự hiện tại
+                qn = q.get('id') or (len(created_qs) + 1)
+                # Tên file theo yêu cầu: subjectId_examCode_Q{soThuTu}.{ext}
+                safe_exam = re.sub(r'[^A-Za-z0-9_-]+', '-', exam_code)
+                filename = f"{subject.id}_{safe_exam}_Q{qn}{ext}"
+
+                saved = save_binary_exact(filename, blob)
+                # ImageField lưu relative path trong MEDIA_ROOT
+                qobj.image.name = saved
+                qobj.save(update_fields=["image"])
+
+            # Lưu lựa chọn A–D
+            for label, text in (q.get("choices") or []):
+                Choice.objects.create(
+                    question=qobj, label=label, text=text,
+                    is_correct=(label == q.get("answer"))
                 )
-                opts = list(qobj.choices.order_by('label'))
-                if mix:
-                    shuffle(opts)
-                labels = list("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
-                for i, opt in enumerate(opts):
-                    ExamChoice.objects.create(
-                        item=item, label=labels[i], text=opt.text, is_correct=opt.is_correct
-                    )
 
-        msg = f"Đã import {len(created_qs)} câu hỏi cho {subject}. Tạo đề '{exam.code}'."
-        messages.success(request, msg)
-        if warns or '_num_quiz_mismatch' in meta:
-            messages.warning(request, "Lưu ý: File có thể không đúng định dạng chuẩn. Vui lòng kiểm tra lại template DOCX.")
-        return redirect('exam_preview', exam_id=exam.id)
+            created_qs.append((qobj, bool(q.get("mix"))))
 
-    return render(request, "import_docx.html", {"subjects": subjects})
+        # 5) Tạo Exam + ExamItem + ExamChoice (trộn đáp án nếu mix=True)
+        exam = Exam.objects.create(
+            code=exam_code,
+            subject=subject,
+            duration_minutes=duration_minutes,
+            question_count=len(created_qs),
+        )
+        for idx, (qobj, mix) in enumerate(created_qs, start=1):
+            item = ExamItem.objects.create(
+                exam=exam, question=qobj, order=idx, mix_choices=mix
+            )
+            opts = list(qobj.choices.order_by('label'))
+            if mix:
+                shuffle(opts)
+            labels = list("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+            for i, opt in enumerate(opts):
+                ExamChoice.objects.create(
+                    item=item, label=labels[i], text=opt.text, is_correct=opt.is_correct
+                )
+    return exam
 
-@login_required
 def exam_create(request):
     """Tạo đề thi ngẫu nhiên"""
-    if not hasattr(request.user, 'userprofile') or request.user.userprofile.role != 'admin':
-        return redirect('student_home')
-    
     subjects = Subject.objects.all()
     if request.method == 'POST':
         code = (request.POST.get('code') or '').strip()
@@ -258,23 +365,15 @@ def exam_create(request):
 
     return render(request, 'exam_create.html', {'subjects': subjects})
 
-@login_required
 def exam_preview(request, exam_id):
     """Xem trước đề thi (admin)"""
-    if not hasattr(request.user, 'userprofile') or request.user.userprofile.role != 'admin':
-        return redirect('student_home')
-    
-    exam = get_object_or_404(Exam.objects.select_related('subject'), id=exam_id)
+    exam = get_object_or_404(Exam.objects.visible().select_related('subject'), id=exam_id)
     items = exam.items.select_related('question').prefetch_related('choices').order_by('order')
     return render(request, 'exam_preview.html', {'exam': exam, 'items': items})
 
-@login_required
 def exam_schedule(request, exam_id):
     """Thiết lập lịch thi (ý 4)"""
-    if not hasattr(request.user, 'userprofile') or request.user.userprofile.role != 'admin':
-        return redirect('student_home')
-    
-    exam = get_object_or_404(Exam, id=exam_id)
+    exam = get_object_or_404(Exam.objects.visible(), id=exam_id)
     
     if request.method == 'POST':
         start_time = request.POST.get('start_time')
@@ -293,84 +392,203 @@ def exam_schedule(request, exam_id):
     
     return render(request, 'exam_schedule.html', {'exam': exam})
 
-@login_required
+def exam_access_tokens(request, exam_id):
+    """
+    Mã vào thi (CSV: MSSV, họ tên, mã, link cho QR, hết hạn). POST: cấp mã mới cho danh sách MSSV;
+    GET: tải lại các mã đã cấp còn chưa dùng
+    """
+    exam = get_object_or_404(Exam.objects.visible(), id=exam_id)
+    if request.method == 'POST':
+        students, missing = tokens.students_by_id(re.split(r'[\s,;]+', request.POST.get('student_ids', '')))
+        if missing or not students:
+            messages.error(request, f"Không tìm thấy MSSV: {', '.join(missing[:20])}" if missing else 'Chưa nhập MSSV')
+            return redirect('exam_preview', exam_id=exam.id)
+        try:
+            issued = tokens.issue_tokens(exam, students)
+        except tokens.TokenError as exc:
+            messages.error(request, str(exc))
+            return redirect('exam_preview', exam_id=exam.id)
+    else:
+        issued = tokens.issued_codes(exam)
+    
+    link = request.build_absolute_uri(reverse('exam_access'))
+    expires = timezone.localtime(exam.end_time).strftime('%d/%m/%Y %H:%M') if exam.end_time else ''
+    rows = [['MSSV', 'Tài khoản', 'Họ tên', 'Mã vào thi', 'Link (QR)', 'Hết hạn']]
+    rows.extend([student.userprofile.student_id, student.username, student.get_full_name(), code,
+                 f"{link}?code={code}", expires] for student, code in issued)
+    return _export_response(rows, f"ma_vao_thi_{exam.code}", request.GET.get('format'))
+
 def exam_delete(request, exam_id):
     """Xóa đề thi"""
-    if not hasattr(request.user, 'userprofile') or request.user.userprofile.role != 'admin':
-        messages.error(request, 'Bạn không có quyền thực hiện thao tác này.')
-        return redirect('student_home')
-    
-    exam = get_object_or_404(Exam, id=exam_id)
+    exam = get_object_or_404(Exam.objects.visible().select_related('subject'), id=exam_id)
     
     if request.method == 'POST':
-        exam_code = exam.code
-        try:
-            # Đếm số lượng dữ liệu liên quan trước khi xóa
-            session_count = StudentExamSession.objects.filter(exam=exam).count()
-            answer_count = StudentAnswer.objects.filter(session__exam=exam).count()
-            item_count = ExamItem.objects.filter(exam=exam).count()
-            
-            # Xóa đề thi - Django sẽ tự động xóa các bảng liên quan nhờ CASCADE
-            exam.delete()
-            
-            # Thông báo kết quả chi tiết
-            if session_count > 0:
-                messages.success(request, f"Đã xóa đề thi '{exam_code}' cùng với {session_count} phiên thi, {answer_count} câu trả lời và {item_count} câu hỏi.")
-            else:
-                messages.success(request, f"Đã xóa đề thi '{exam_code}' cùng với {item_count} câu hỏi.")
-            
-        except Exception as e:
-            messages.error(request, f"Lỗi khi xóa đề thi '{exam_code}': {str(e)}")
+        # Ẩn đề ngay lập tức; dữ liệu (phiên thi, câu trả lời, câu hỏi của đề) được xoá nền theo lô
+        archive = request.POST.get('archive') == 'on'
+        unsubmitted_count = sharding.sessions(exam.id).filter(exam=exam, is_submitted=False).count()
+        with transaction.atomic():
+            Exam.objects.filter(id=exam.id).update(deleted_at=timezone.now(), archive_on_delete=archive)
+            counters.incr(counters.EXAMS, -1)
+            counters.incr(counters.ACTIVE_ATTEMPTS, -unsubmitted_count)
+            purge_exam_in_background(exam.id, archive=archive)
+        invalidate_exam_paper(exam.id)
         
+        messages.success(request, f"Đã xóa đề thi '{exam.code}'. Dữ liệu liên quan đang được dọn dẹp ở chế độ nền.")
         return redirect('admin_home')
     
     # GET request - hiển thị trang xác nhận
-    session_count = StudentExamSession.objects.filter(exam=exam).count()
+    session_count = sharding.sessions(exam.id).filter(exam=exam).count()
     return render(request, 'exam_delete_confirm.html', {
         'exam': exam,
         'session_count': session_count
     })
 
+def exam_results_export(request, exam_id):
+    """Xuất bảng điểm của 1 đề (CSV/XLSX, stream), ?choices=1 thêm phương án đã chọn từng câu"""
+    exam = get_object_or_404(Exam.objects.visible().select_related('subject'), id=exam_id)
+    rows = exports.result_rows([exam], with_choices=request.GET.get('choices') == '1')
+    return _export_response(rows, f"ket_qua_{exam.code}", request.GET.get('format'))
+
+def subject_results_export(request, subject_id):
+    """Xuất bảng điểm mọi đề của 1 môn (CSV/XLSX, stream)"""
+    subject = get_object_or_404(Subject, id=subject_id)
+    exams = list(Exam.objects.visible().filter(subject=subject).select_related('subject').order_by('id'))
+    if not exams:
+        messages.error(request, f"Môn {subject.code} chưa có đề thi nào")
+        return redirect('admin_home')
+    return _export_response(exports.result_rows(exams), f"ket_qua_{subject.code}", request.GET.get('format'))
+
+def exam_papers_export(request, exam_id):
+    """Đề in cho phòng thi giấy: ZIP gồm các mã đề .docx (bố cục Template.docx) và đáp án"""
+    exam = get_object_or_404(Exam.objects.visible().select_related('subject'), id=exam_id)
+    try:
+        variants = min(max(int(request.GET.get('variants') or 1), 1), papers.MAX_VARIANTS)
+    except ValueError:
+        variants = 1
+    job = papers.prepare_job(exam, lecturer=request.user.username, print_copy=request.GET.get('print') == '1')
+    response = StreamingHttpResponse(papers.stream_papers_zip(job, variants), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="de_in_{exam.code}.zip"'
+    return response
+
+def exam_bundle_export(request, exam_id):
+    """Gói đề (đề, ảnh, checksum) để cài lên máy chủ điểm thi không có mạng - xem bundles.py"""
+    exam = get_object_or_404(Exam.objects.visible().select_related('subject'), id=exam_id)
+    response = HttpResponse(bundles.build_bundle(exam), content_type='application/zip')
+    response['Content-Disposition'] = f'attachment; filename="goi_de_{exam.code}.zip"'
+    return response
+
+def metrics_view(request):
+    """Số liệu cho Prometheus (baseapp/metrics.py): máy scrape dùng METRICS_TOKEN, người xem cần quyền admin"""
+    if not metrics.authorized(request):
+        return HttpResponseForbidden()
+    # Bộ đếm tính cả phiên bỏ dở đã hết giờ nhưng chưa nộp -> không gọi là "đang thi"
+    unsubmitted = counters.get_counters()[counters.ACTIVE_ATTEMPTS]
+    body = metrics.render(extra=[
+        ('exam_unsubmitted_sessions', 'gauge', 'Số phiên thi chưa nộp bài, kể cả phiên đã hết giờ (mọi worker)',
+         unsubmitted),
+    ])
+    return HttpResponse(body, content_type=metrics.CONTENT_TYPE)
+
+def _export_response(rows, filename, fmt):
+    if fmt == 'xlsx':
+        response = StreamingHttpResponse(exports.stream_xlsx(rows), content_type=exports.XLSX_CONTENT_TYPE)
+    else:
+        fmt = 'csv'
+        response = StreamingHttpResponse(exports.stream_csv(rows), content_type=exports.CSV_CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
+
+def exam_proctor(request, exam_id):
+    """Màn hình giám sát phòng thi"""
+    exam = get_object_or_404(Exam.objects.visible().select_related('subject'), id=exam_id)
+    return render(request, 'exam_proctor.html', {
+        'exam': exam,
+        'snapshot': proctoring.snapshot(exam.id),
+        'idle_minutes': proctoring.IDLE_SECONDS // 60,
+    })
+
+def exam_proctor_stats(request, exam_id):
+    """Số liệu giám sát (AJAX, màn hình giám sát gọi định kỳ)"""
+    return JsonResponse(proctoring.snapshot(exam_id))
+
 # ===== STUDENT VIEWS =====
-@login_required
+HISTORY_PAGE_SIZE = 20
+
+@use_replica
 def student_home(request):
     """Trang chủ học sinh - danh sách đề thi có thể làm"""
-    # Lấy các đề thi có thể làm (đang active và trong thời gian cho phép)
-    available_exams = []
-    taken_sessions = StudentExamSession.objects.filter(student=request.user).values_list('exam_id', flat=True)
-    
-    for exam in Exam.objects.filter(is_active=True).order_by('-created_at'):
-        if exam.id not in taken_sessions and exam.is_available_now():
-            available_exams.append(exam)
-    
-    # Session đang thi (chưa nộp bài và chưa hết giờ)
-    ongoing_sessions = StudentExamSession.objects.filter(
-        student=request.user,
-        is_submitted=False
-    ).select_related('exam', 'exam__subject').order_by('-start_time')
-    
-    # Lọc session còn thời gian
-    active_sessions = []
-    for session in ongoing_sessions:
-        if not session.is_time_up():
-            active_sessions.append(session)
-    
-    # Lịch sử thi
-    completed_sessions = StudentExamSession.objects.filter(
-        student=request.user, 
-        is_submitted=True
-    ).select_related('exam', 'exam__subject').order_by('-end_time')
+    now = timezone.now()
+    
+    # Đề thi có thể làm: đang mở và chưa làm (lọc hoàn toàn trong DB)
+    available_exams = (Exam.objects.available(now)
+                       .exclude(id__in=sharding.started_exam_ids(request.user))
+                       .select_related('subject').order_by('-created_at'))
+    
+    # Lịch sử thi - phân trang keyset theo (end_time, id) giảm dần
+    cursor = _decode_cursor(request.GET.get('before'))
+    history_filter = Q()
+    if cursor:
+        end_time, session_id = cursor
+        history_filter = Q(end_time__lt=end_time) | Q(end_time=end_time, id__lt=session_id)
+    
+    if sharding.enabled():
+        active_sessions, history = _sharded_student_sessions(request.user, now, history_filter)
+    else:
+        my_sessions = StudentExamSession.objects.filter(student=request.user)
+        # Session đang thi (chưa nộp bài và chưa hết giờ)
+        active_sessions = (my_sessions.running(now)
+                           .select_related('exam', 'exam__subject').order_by('-start_time'))
+        completed_sessions = (my_sessions.filter(history_filter, is_submitted=True, exam__deleted_at__isnull=True)
+                              .select_related('exam', 'exam__subject').order_by('-end_time', '-id'))
+        history = list(completed_sessions[:HISTORY_PAGE_SIZE + 1])
+    next_cursor = None
+    if len(history) > HISTORY_PAGE_SIZE:
+        last = history[HISTORY_PAGE_SIZE - 1]
+        next_cursor = _encode_cursor(last.end_time, last.id)
     
     return render(request, 'student_home.html', {
         'available_exams': available_exams,
         'active_sessions': active_sessions,
-        'completed_sessions': completed_sessions
+        'completed_sessions': history[:HISTORY_PAGE_SIZE],
+        'next_cursor': next_cursor,
+        'is_first_page': cursor is None,
     })
 
-@login_required
+def _sharded_student_sessions(student, now, history_filter):
+    """
+    student_home khi chia shard: danh bạ (primary) cho biết các đề chưa xoá của học sinh nằm ở shard nào,
+    mỗi shard truy vấn 1 lần cho phiên đang thi và 1 lần cho lịch sử, gộp lại theo thứ tự như khi không chia shard
+    """
+    entries = (SessionDirectory.objects.filter(student=student, exam__deleted_at__isnull=True)
+               .values_list('exam_id', 'shard', 'exam__end_time'))
+    by_shard, open_exam_ids = {}, set()
+    for exam_id, shard, exam_end in entries:
+        by_shard.setdefault(shard, []).append(exam_id)
+        if exam_end is None or exam_end > now:
+            open_exam_ids.add(exam_id)
+    
+    active, history = [], []
+    for alias, exam_ids in by_shard.items():
+        mine = StudentExamSession.objects.using(alias).filter(student=student, exam_id__in=exam_ids)
+        active.extend(mine.filter(is_submitted=False, expires_at__gt=now,
+                                  exam_id__in=[e for e in exam_ids if e in open_exam_ids]))
+        history.extend(mine.filter(history_filter, is_submitted=True)
+                       .order_by('-end_time', '-id')[:HISTORY_PAGE_SIZE + 1])
+    active.sort(key=lambda s: s.start_time, reverse=True)
+    history.sort(key=lambda s: (s.end_time, s.id), reverse=True)
+    history = history[:HISTORY_PAGE_SIZE + 1]
+    prefetch_related_objects(active + history, 'exam__subject')
+    return active, history
+
+def _student_session(request, session_id, *related):
+    """Phiên thi của học sinh đang đăng nhập, đọc ở đúng shard (không chia shard: theo router như cũ)"""
+    queryset = StudentExamSession.objects.using(sharding.session_alias(session_id))
+    return get_object_or_404(sharding.with_exam(queryset, *related), id=session_id, student=request.user)
+
+@metrics.timed(metrics.START)
 def exam_start(request, exam_id):
     """Bắt đầu làm bài thi"""
-    exam = get_object_or_404(Exam, id=exam_id)
+    exam = get_object_or_404(Exam.objects.visible(), id=exam_id)
     
     # Kiểm tra đề có thể làm không
     if not exam.is_available_now():
@@ -378,41 +596,48 @@ def exam_start(request, exam_id):
         return redirect('student_home')
     
     # Kiểm tra đã làm chưa
-    if StudentExamSession.objects.filter(student=request.user, exam=exam).exists():
+    if sharding.has_session(request.user, exam):
         messages.error(request, "Bạn đã làm đề thi này rồi")
         return redirect('student_home')
     
-    # Tạo session mới
-    session = StudentExamSession.objects.create(
+    # Tạo session mới (chế độ lưu gọn: mảng đáp án 1 byte/câu, khởi tạo toàn 0 = chưa trả lời)
+    answer_vector = None
+    if getattr(settings, 'EXAM_ANSWER_STORAGE', 'rows') == 'vector':
+        answer_vector = bytes(len(get_exam_paper(exam.id)['items']))
+    session = sharding.create_session(
         student=request.user,
-        exam=exam
+        exam=exam,
+        expires_at=timezone.now() + timezone.timedelta(minutes=exam.duration_minutes),
+        answer_vector=answer_vector
     )
+    counters.incr(counters.ACTIVE_ATTEMPTS, 1)
+    proctoring.session_started(session)
     
     return redirect('exam_taking', session_id=session.id)
 
-@login_required
 def exam_taking(request, session_id):
     """Trang làm bài thi"""
-    session = get_object_or_404(StudentExamSession, id=session_id, student=request.user)
+    session = _student_session(request, session_id, 'exam__subject')
     
     # Kiểm tra đã nộp bài chưa
     if session.is_submitted:
         return redirect('exam_result', session_id=session.id)
     
+    # Đề đã bị xoá
+    if session.exam.deleted_at:
+        messages.error(request, "Đề thi không còn tồn tại")
+        return redirect('student_home')
+    
     # Kiểm tra hết giờ chưa - tự động nộp bài
     if session.is_time_up():
         return redirect('exam_submit', session_id=session.id)
     
-    # Lấy câu hỏi và câu trả lời hiện tại
-    items = session.exam.items.select_related('question').prefetch_related('choices').order_by('order')
-    existing_answers = {
-        ans.exam_item_id: ans.selected_choice_id 
-        for ans in session.answers.select_related('selected_choice')
-    }
+    # Lấy câu hỏi từ đề đã cache, câu trả lời hiện tại từ mảng đáp án hoặc bảng StudentAnswer
+    paper = get_exam_paper(session.exam_id)
+    existing_answers = load_selected(session, paper)
     
     # Thêm thông tin selected_choice_id vào từng item để template dễ sử dụng
-    for item in items:
-        item.selected_choice_id = existing_answers.get(item.id)
+    items = [dict(item, selected_choice_id=existing_answers.get(item['id'])) for item in paper['items']]
     
     return render(request, 'exam_taking.html', {
         'session': session,
@@ -421,7 +646,7 @@ def exam_taking(request, session_id):
         'remaining_time': session.get_remaining_time()
     })
 
-@login_required
+@metrics.timed(metrics.SAVE_ANSWER, errors=metrics.SAVE_ANSWER_ERRORS)
 def save_answer(request):
     """Lưu câu trả lời (AJAX)"""
     if request.method != 'POST':
@@ -432,88 +657,97 @@ def save_answer(request):
     choice_id = request.POST.get('choice_id')
     
     try:
-        session = StudentExamSession.objects.get(id=session_id, student=request.user)
-        if session.is_submitted or session.is_time_up():
+        sessions = StudentExamSession.objects.using(sharding.session_alias(session_id))
+        session = sharding.with_exam(sessions, 'exam').get(id=session_id, student=request.user)
+        if session.is_submitted or session.is_time_up() or session.exam.deleted_at:
             return JsonResponse({'error': 'Exam is finished'}, status=400)
         
+        # Chế độ lưu gọn: tra vị trí câu/phương án trong đề đã cache, ghi 1 byte bằng 1 UPDATE
+        if session.answer_vector is not None:
+            paper = get_exam_paper(session.exam_id)
+            located = locate_choice(paper, int(item_id), int(choice_id) if choice_id else None)
+            if located is None:
+                return JsonResponse({'error': 'Invalid data'}, status=400)
+            if not save_vector_answer(session, paper, *located):
+                return JsonResponse({'error': 'Exam is finished'}, status=400)
+            proctoring.answer_saved(session)
+            return JsonResponse({'success': True})
+        
         item = ExamItem.objects.get(id=item_id, exam=session.exam)
         choice = ExamChoice.objects.get(id=choice_id, item=item) if choice_id else None
         
         # Lưu/cập nhật câu trả lời
-        answer, created = StudentAnswer.objects.get_or_create(
-            session=session,
+        answer, created = session.answers.get_or_create(
             exam_item=item,
             defaults={'selected_choice': choice}
         )
         if not created:
             answer.selected_choice = choice
             answer.save()
+        proctoring.answer_saved(session)
         
         return JsonResponse({'success': True})
         
-    except (StudentExamSession.DoesNotExist, ExamItem.DoesNotExist, ExamChoice.DoesNotExist):
+    except (StudentExamSession.DoesNotExist, ExamItem.DoesNotExist, ExamChoice.DoesNotExist, ValueError):
         return JsonResponse({'error': 'Invalid data'}, status=400)
 
-@login_required
+@metrics.timed(metrics.SUBMIT)
 def exam_submit(request, session_id):
     """Nộp bài thi"""
-    session = get_object_or_404(StudentExamSession, id=session_id, student=request.user)
+    session = _student_session(request, session_id, 'exam')
     
     if session.is_submitted:
         return redirect('exam_result', session_id=session.id)
     
-    # Tính điểm
-    total_marks = 0
-    earned_marks = 0
-    
-    for item in session.exam.items.select_related('question'):
-        total_marks += item.question.mark
-        
-        try:
-            answer = session.answers.get(exam_item=item)
-            if answer.selected_choice and answer.selected_choice.is_correct:
-                earned_marks += item.question.mark
-        except StudentAnswer.DoesNotExist:
-            pass  # Câu chưa trả lời = 0 điểm
-    
-    # Lưu kết quả
-    session.end_time = timezone.now()
-    session.is_submitted = True
-    session.score = earned_marks
-    session.total_marks = total_marks
-    session.save()
+    # Chấm điểm và lưu kết quả (đề lấy từ cache, câu trả lời lấy bằng 1 truy vấn)
+    submit_session(session)
     
     return redirect('exam_result', session_id=session.id)
 
-@login_required
+@use_replica
 def exam_result(request, session_id):
     """Xem kết quả thi"""
-    session = get_object_or_404(StudentExamSession, id=session_id, student=request.user)
+    session = _student_session(request, session_id, 'exam__subject')
     
     if not session.is_submitted:
         return redirect('exam_taking', session_id=session.id)
     
-    # Lấy chi tiết câu trả lời
-    answers = session.answers.select_related(
-        'exam_item__question', 'selected_choice'
-    ).order_by('exam_item__order')
-    
-    results = []
-    for answer in answers:
-        item = answer.exam_item
-        correct_choice = item.choices.filter(is_correct=True).first()
-        results.append({
-            'question': item.question,
-            'selected': answer.selected_choice,
-            'correct': correct_choice,
-            'is_correct': answer.selected_choice and answer.selected_choice.is_correct,
-            'marks': item.question.mark if (answer.selected_choice and answer.selected_choice.is_correct) else 0
-        })
+    # Kết quả từng câu lấy từ snapshot lúc nộp bài; phiên cũ chưa có snapshot thì chấm lại 1 lần và lưu
+    # (đề đã lưu trữ lạnh thì đọc bài làm từ kho lưu trữ, không ghi snapshot trở lại)
+    paper = get_exam_paper(session.exam_id)
+    snapshot = session.result_snapshot
+    if snapshot is None:
+        _, _, snapshot = grade_session(session)
+        if not session.exam.archived_at:
+            StudentExamSession.objects.using(sharding.write_alias(session.exam_id)).filter(
+                id=session.id).update(result_snapshot=snapshot)
+    results = build_results(paper, snapshot)
+    
+    # Thống kê chung của đề (đọc từ bảng tổng hợp, không quét các phiên thi)
+    cohort = None
+    stats = ExamStatistics.objects.filter(exam_id=session.exam_id).first()
+    if stats and stats.submitted_count:
+        histogram = stats.get_histogram()
+        peak = max(histogram) or 1
+        width = 100 // stats.HISTOGRAM_BUCKETS
+        cohort = {
+            'stats': stats,
+            'mean': round(stats.mean_percentage, 1),
+            'stddev': round(stats.stddev_percentage, 1),
+            'median': stats.median_percentage(histogram),
+            'rank': stats.rank_of(session),
+            'histogram': [
+                {'label': f"{i * width}-{(i + 1) * width}%", 'count': c, 'height': round(c / peak * 100),
+                 'mine': i == stats.bucket_of(session.get_percentage())}
+                for i, c in enumerate(histogram)
+            ],
+        }
     
     return render(request, 'exam_result.html', {
         'session': session,
         'results': results,
-        'percentage': round((session.score / session.total_marks) * 100, 1) if session.total_marks > 0 else 0
+        'percentage': session.get_percentage(),
+        'cohort': cohort,
     })
 
 # ===== HELPER FUNCTIONS (giữ nguyên) =====
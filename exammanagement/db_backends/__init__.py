@@ -0,0 +1,174 @@
+# db_backends
+# Pool connection dùng chung giữa các thread của 1 process cho MySQL (và SQLite để chạy thử/benchmark).
+# Django không có pool cho MySQL: CONN_MAX_AGE giữ 1 connection/thread, số connection = số thread.
+# Với pool, mỗi request mượn 1 connection khi truy vấn lần đầu và trả lại khi request kết thúc
+# (CONN_MAX_AGE = 0 -> Django "đóng" connection = trả về pool), nên nhiều thread dùng chung ít connection:
+#   DATABASES['default'] = {
+#       'ENGINE': 'exammanagement.db_backends.mysql',
+#       'CONN_MAX_AGE': 0,
+#       'POOL': {'MAX_SIZE': 20, 'TIMEOUT': 5, 'RECYCLE': 1800, 'PING_AFTER': 30},
+#       ...
+#   }
+# - MAX_SIZE: số connection tối đa mỗi process (tổng = số worker x MAX_SIZE, phải < max_connections của MySQL)
+# - TIMEOUT: hết connection thì request xếp hàng chờ tối đa TIMEOUT giây rồi báo OperationalError
+# - RECYCLE: connection mở quá RECYCLE giây thì đóng, mở lại (tránh wait_timeout của MySQL cắt ngang)
+# - PING_AFTER: connection nằm chờ trong pool quá PING_AFTER giây thì ping trước khi giao (health check)
+import os
+import threading
+import time
+
+from django.db.utils import OperationalError
+
+POOL_DEFAULTS = {'MAX_SIZE': 10, 'TIMEOUT': 10, 'RECYCLE': 1800, 'PING_AFTER': 30}
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class ConnectionPool:
+    """Pool connection DB-API: tối đa max_size connection đang mở (đang mượn + nằm chờ), LIFO"""
+
+    def __init__(self, alias, max_size, timeout, recycle, ping_after):
+        self.alias = alias
+        self.max_size = max_size
+        self.timeout = timeout
+        self.recycle = recycle
+        self.ping_after = ping_after
+        self.pid = os.getpid()
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._idle = []        # [(connection, thời điểm mở, thời điểm trả lại)]
+        self._opened_at = {}   # id(connection) -> thời điểm mở, của các connection đang mượn
+        self.stats = {'created': 0, 'reused': 0, 'waited': 0, 'timeouts': 0, 'discarded': 0}   # Sửa dưới _lock
+
+    def acquire(self, factory):
+        """Mượn 1 connection (mở mới bằng factory() khi pool trống); hết chỗ thì chờ tối đa timeout giây"""
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.stats['waited'] += 1
+            if not self._slots.acquire(timeout=self.timeout):
+                with self._lock:
+                    self.stats['timeouts'] += 1
+                raise OperationalError(
+                    f"Hết connection trong pool '{self.alias}' ({self.max_size}) sau {self.timeout} giây chờ"
+                )
+        try:
+            connection = self._checkout()
+            if connection is None:
+                connection = factory()
+                with self._lock:
+                    self.stats['created'] += 1
+                    self._opened_at[id(connection)] = time.monotonic()
+            return connection
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _checkout(self):
+        now = time.monotonic()
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, opened_at, returned_at = self._idle.pop()
+            if now - opened_at >= self.recycle or (now - returned_at >= self.ping_after and not _ping(connection)):
+                self._discard(connection)
+                continue
+            with self._lock:
+                self._opened_at[id(connection)] = opened_at
+                self.stats['reused'] += 1
+            return connection
+
+    def release(self, connection, reusable=True):
+        """Trả connection về pool; reusable=False (lỗi, còn transaction dở) thì đóng hẳn"""
+        with self._lock:
+            opened_at = self._opened_at.pop(id(connection), None)
+        try:
+            if reusable and opened_at is not None:
+                try:
+                    connection.rollback()   # Không để transaction/khoá dở dang cho request sau
+                except Exception:
+                    reusable = False
+            if reusable and opened_at is not None:
+                with self._lock:
+                    self._idle.append((connection, opened_at, time.monotonic()))
+            else:
+                self._discard(connection)
+        finally:
+            self._slots.release()
+
+    def _discard(self, connection):
+        with self._lock:
+            self.stats['discarded'] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def usage(self):
+        """Số connection đang mượn / đang nằm chờ trong pool"""
+        with self._lock:
+            return len(self._opened_at), len(self._idle)
+
+    def close_all(self):
+        """Đóng các connection đang nằm chờ (connection đang mượn sẽ đóng khi được trả lại)"""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection, _, _ in idle:
+            try:
+                connection.close()
+            except Exception:
+                pass
+
+
+def _ping(connection):
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+            cursor.fetchall()
+        finally:
+            cursor.close()
+        return True
+    except Exception:
+        return False
+
+
+def get_pool(alias, settings_dict):
+    """Pool của alias trong process hiện tại (process con sau fork tạo pool mới, không dùng lại socket của cha)"""
+    pid = os.getpid()
+    pool = _pools.get(alias)
+    if pool is None or pool.pid != pid:
+        with _pools_lock:
+            pool = _pools.get(alias)
+            if pool is None or pool.pid != pid:
+                options = {**POOL_DEFAULTS, **(settings_dict.get('POOL') or {})}
+                pool = _pools[alias] = ConnectionPool(
+                    alias, options['MAX_SIZE'], options['TIMEOUT'], options['RECYCLE'], options['PING_AFTER'],
+                )
+    return pool
+
+
+def pools():
+    """Các pool đã tạo trong process hiện tại"""
+    pid = os.getpid()
+    return [pool for pool in list(_pools.values()) if pool.pid == pid]
+
+
+class PooledDatabaseWrapperMixin:
+    """Đặt trước DatabaseWrapper của backend: mở connection = mượn từ pool, đóng connection = trả lại pool"""
+
+    def get_new_connection(self, conn_params):
+        return get_pool(self.alias, self.settings_dict).acquire(lambda: self._open_connection(conn_params))
+
+    def _open_connection(self, conn_params):
+        return super().get_new_connection(conn_params)
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # Đóng giữa atomic block, sau lỗi hoặc khi autocommit bị đổi -> không dùng lại connection này
+        reusable = (not self.in_atomic_block and not self.errors_occurred
+                    and self.get_autocommit() == self.settings_dict['AUTOCOMMIT'])
+        with self.wrap_database_errors:
+            get_pool(self.alias, self.settings_dict).release(self.connection, reusable)
@@ -0,0 +1,8 @@
+# MySQL có pool connection (xem exammanagement/db_backends/__init__.py)
+from django.db.backends.mysql.base import DatabaseWrapper as MySQLDatabaseWrapper
+
+from .. import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, MySQLDatabaseWrapper):
+    pass
@@ -0,0 +1,8 @@
+# SQLite có pool connection: chỉ để chạy thử/benchmark thay cho MySQL (xem exammanagement/db_backends/__init__.py)
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+
+from .. import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, SQLiteDatabaseWrapper):
+    pass
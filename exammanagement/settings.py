@@ -42,6 +42,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'baseapp.profiling.RequestProfilingMiddleware',   # Đầu tiên: đo cả thời gian của các middleware khác
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -49,6 +50,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'baseapp.routers.ReplicaStickinessMiddleware',
 ]
 
 ROOT_URLCONF = 'exammanagement.urls'
@@ -95,6 +97,87 @@ DATABASES = {
     }
 }
 
+# Replica chỉ đọc (tuỳ chọn): các view báo cáo/kết quả (đánh dấu @use_replica) đọc từ đây để không
+# tranh tài nguyên với các lượt lưu đáp án trên primary. Xem baseapp/routers.py.
+# DATABASES['replica'] = {**DATABASES['default'], 'HOST': '127.0.0.2'}
+DATABASE_ROUTERS = ['baseapp.routers.ShardRouter', 'baseapp.routers.PrimaryReplicaRouter']
+REPLICA_STICKY_SECONDS = 30   # Sau khi ghi, người dùng đọc từ primary trong 30 giây (chờ replica bắt kịp)
+
+# Chia shard bảng bài làm theo đề thi (tuỳ chọn, xem baseapp/sharding.py): liệt kê alias các DB shard.
+# Danh mục (môn, câu hỏi, đề, tài khoản) vẫn ở 'default'. Để trống = không chia shard.
+# DATABASES['shard0'] = {**DATABASES['default'], 'NAME': 'exammanagement_shard0'}
+# DATABASES['shard1'] = {**DATABASES['default'], 'NAME': 'exammanagement_shard1'}
+# EXAM_SHARDS = ['shard0', 'shard1']
+EXAM_SHARDS = []
+
+# Cache
+# Số liệu giám sát phòng thi (baseapp/proctoring.py) và đề thi đã dựng (baseapp/grading.py) nằm trong cache.
+# LocMemCache chỉ dùng được khi chạy 1 process; production nhiều worker cần cache dùng chung, ví dụ:
+#   'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'exammanagement',
+    },
+    # Phiên đăng nhập (SESSION_CACHE_ALIAS): tách khỏi 'default' để đề thi/số liệu giám sát không đẩy phiên ra khỏi
+    # cache (LocMemCache mặc định chỉ giữ 300 mục); đủ chỗ cho mọi học sinh đăng nhập cùng lúc
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'exammanagement-sessions',
+        'OPTIONS': {'MAX_ENTRIES': 50000},
+    },
+}
+
+# Phiên đăng nhập: cached_db đọc từ cache (không truy vấn django_session), ghi xuyên xuống DB khi phiên thay đổi
+# (chỉ lúc đăng nhập/đăng xuất) nên cache mất dữ liệu thì vẫn đọc lại được từ DB. Không lưu lại phiên ở request
+# chỉ đọc / lưu đáp án (SESSION_SAVE_EVERY_REQUEST = False, app không ghi gì vào request.session).
+# LocMemCache: mỗi worker giữ bản riêng, đăng xuất ở worker này thì worker khác vẫn nhận phiên đến khi hết hạn ->
+# chỉ dùng khi chạy 1 process; settings_production đặt cache 'sessions' lên Redis.
+# 'django.contrib.sessions.backends.signed_cookies': phiên nằm trong cookie đã ký, không cần DB/cache nhưng
+# không thu hồi được phiên khi đăng xuất. Đo số truy vấn từng cách: python manage.py benchmark_sessions
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+SESSION_SAVE_EVERY_REQUEST = False
+
+# Cách lưu câu trả lời của phiên thi mới:
+#   'rows'   - mỗi câu 1 dòng StudentAnswer (mặc định)
+#   'vector' - mỗi phiên 1 mảng byte (1 byte/câu) trên StudentExamSession.answer_vector, lưu bằng 1 UPDATE
+# Phiên đã bắt đầu giữ nguyên cách lưu lúc tạo. EXAM_ANSWER_AUDIT_LOG ghi thêm lịch sử chọn đáp án
+# (bảng StudentAnswerLog, chỉ INSERT) cho các phiên lưu dạng mảng.
+EXAM_ANSWER_STORAGE = 'rows'
+EXAM_ANSWER_AUDIT_LOG = False
+
+# Số process của pool dựng đề in dùng chung trong mỗi process web (baseapp/papers.py); None = số CPU
+PAPER_RENDER_WORKERS = None
+
+# Đo thời gian request (baseapp/profiling.py): tỉ lệ request được lấy mẫu (0 = tắt, 1 = mọi request) -
+# request lấy mẫu có header Server-Timing (DB, template, view). Request chậm hơn REQUEST_PROFILING_SLOW_MS
+# được ghi log JSON (logger 'baseapp.profiling'), kèm REQUEST_PROFILING_TOP_QUERIES truy vấn lâu nhất nếu có lấy mẫu.
+REQUEST_PROFILING_SAMPLE_RATE = 0.0
+REQUEST_PROFILING_SLOW_MS = 1000
+REQUEST_PROFILING_TOP_QUERIES = 5
+
+# Số liệu Prometheus (GET /metrics, baseapp/metrics.py). Chạy nhiều worker thì đặt METRICS_DIR (thư mục dùng
+# chung, xoá khi khởi động server) để cộng dồn số liệu các process. Máy scrape gửi header
+# 'Authorization: Bearer <METRICS_TOKEN>'; để trống thì chỉ tài khoản admin xem được.
+METRICS_DIR = None
+METRICS_TOKEN = ''
+
+# Xác thực (baseapp/access.py): User kèm UserProfile (role) được cache AUTH_USER_CACHE_TIMEOUT giây,
+# lưu User/UserProfile thì tự xoá cache. Cache phải dùng chung giữa các worker (xem CACHES) để việc xoá có hiệu lực.
+# ModelBackend giữ lại sau CachedModelBackend: phiên đăng nhập tạo trước khi đổi backend (ghi ModelBackend trong
+# session) vẫn dùng được, không đẩy học sinh đang thi ra ngoài lúc deploy. Đăng nhập mới luôn qua CachedModelBackend.
+AUTHENTICATION_BACKENDS = [
+    'baseapp.access.CachedModelBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+AUTH_USER_CACHE_TIMEOUT = 60 * 15
+# Cho phép cache User trong LocMemCache (mỗi process 1 bản): chỉ khi chạy 1 process (runserver khi DEBUG, test).
+# settings_production đặt False và dùng Redis cho cache 'default'.
+AUTH_USER_CACHE_LOCAL = DEBUG
+LOGIN_URL = 'login'
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
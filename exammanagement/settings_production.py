@@ -0,0 +1,48 @@
+# settings_production.py
+# Cấu hình connection DB khi chạy thật (gunicorn/uwsgi nhiều worker, nhiều thread).
+#gunicorn exammanagement.wsgi --env DJANGO_SETTINGS_MODULE=exammanagement.settings_production --workers 4 --threads 8
+# Mặc định Django (CONN_MAX_AGE = 0) mở rồi đóng 1 connection MySQL cho mỗi request (bắt tay TCP + xác thực),
+# lúc chuông vào thi hàng nghìn request cùng lúc thì thời gian mở connection chiếm phần lớn độ trễ.
+# So sánh các chế độ: python manage.py benchmark_db_connections --settings=exammanagement.settings_production
+import os
+
+from .settings import *  # noqa: F401,F403
+
+# Pool connection (exammanagement/db_backends): mỗi process giữ tối đa MAX_SIZE connection dùng chung cho
+# mọi thread, request mượn khi truy vấn lần đầu và trả lại khi kết thúc (CONN_MAX_AGE = 0 = trả về pool).
+# Hết connection -> request chờ tối đa TIMEOUT giây rồi báo lỗi, thay vì làm quá tải MySQL.
+# Tổng connection = số worker x MAX_SIZE (+ replica/shard nếu có), phải nhỏ hơn max_connections của MySQL.
+# RECYCLE nhỏ hơn wait_timeout của MySQL; PING_AFTER: connection nằm chờ lâu thì ping trước khi giao.
+DB_POOL = {'MAX_SIZE': 10, 'TIMEOUT': 5, 'RECYCLE': 1800, 'PING_AFTER': 30}
+
+for _db in DATABASES.values():
+    if _db['ENGINE'] == 'django.db.backends.mysql':
+        _db.update(ENGINE='exammanagement.db_backends.mysql', CONN_MAX_AGE=0, POOL=dict(DB_POOL))
+
+# Không dùng pool: giữ connection theo thread (1 connection/thread, tổng = worker x thread),
+# kiểm tra connection còn sống ở đầu mỗi request trước khi dùng lại:
+# for _db in DATABASES.values():
+#     _db.update(CONN_MAX_AGE=600, CONN_HEALTH_CHECKS=True)
+
+# Cache dùng chung cho mọi worker (Redis, cần gói redis): đề thi đã dựng, số liệu giám sát và cache đăng nhập
+# (baseapp/access.py) - đổi mật khẩu/khoá tài khoản ở 1 worker thì mọi worker đều thấy ngay.
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379')
+CACHES['default'] = {
+    'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    'LOCATION': f'{REDIS_URL}/1',
+}
+AUTH_USER_CACHE_LOCAL = False   # Cache 'default' còn là LocMemCache -> CachedModelBackend báo lỗi cấu hình
+# Phiên đăng nhập (cached_db): cùng Redis, DB riêng -> đăng xuất ở 1 worker thì phiên mất hiệu lực ở mọi worker.
+# Chưa có Redis: đổi sang SESSION_ENGINE = 'django.contrib.sessions.backends.db' thay vì để LocMemCache.
+CACHES['sessions'] = {
+    'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    'LOCATION': f'{REDIS_URL}/2',
+}
+
+# Lấy mẫu 1% request để đo DB/template/view (header Server-Timing, log request chậm - baseapp/profiling.py)
+REQUEST_PROFILING_SAMPLE_RATE = 0.01
+REQUEST_PROFILING_SLOW_MS = 800
+
+# Số liệu của các worker gunicorn cộng dồn qua file mmap trong METRICS_DIR (xoá thư mục trong on_starting)
+METRICS_DIR = os.environ.get('METRICS_DIR', '/tmp/exammanagement-metrics')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
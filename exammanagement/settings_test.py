@@ -0,0 +1,51 @@
+# settings_test.py
+# Cấu hình chạy test: SQLite (không cần MySQL), ảnh lưu thư mục tạm, băm mật khẩu nhanh.
+#python manage.py test baseapp --settings=exammanagement.settings_test
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+
+# 2 file SQLite đóng vai primary/replica; khi chạy test replica là bản soi (MIRROR) của default.
+# Chạy thử bằng tay (runserver): migrate rồi chép test_db.sqlite3 thành test_replica.sqlite3
+# (thay cho replication), dữ liệu ghi sau đó chỉ có ở primary -> thấy được độ trễ replica.
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_db.sqlite3',
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    },
+    # Shard bài làm (baseapp/sharding.py). Mặc định EXAM_SHARDS = [] nên chỉ test chia shard mới dùng tới.
+    # Chạy thử bằng tay: EXAM_SHARDS = ['shard0', 'shard1'] rồi
+    #   python manage.py migrate --settings=exammanagement.settings_test --database=shard0 (và shard1)
+    'shard0': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_shard0.sqlite3',
+    },
+    'shard1': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': BASE_DIR / 'test_shard1.sqlite3',
+    },
+}
+
+MEDIA_ROOT = tempfile.mkdtemp(prefix='exammanagement-media-')
+EXAM_ARCHIVE_DIR = tempfile.mkdtemp(prefix='exammanagement-archive-')
+
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'exammanagement-test',
+    },
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'exammanagement-test-sessions',
+    },
+}
+
+# Không chạy thread xoá nền trong test (DB test nằm trong transaction của TestCase)
+EXAM_PURGE_IN_BACKGROUND = False